@@ -2,12 +2,15 @@
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file
+from utils.output_sink import create_output_sink
 from utils.transformers import get_keys_to_books_dict, percentages_report
 
 if __name__ == '__main__':
     args = parse_args('Show percentages of types of book',
-                      'f')
+                      'flO')
     books = read_file(args=args)
     key_attribute = 'user_shelves'
     # key_attribute = 'rating'
-    percentages_report(books, key_attribute)
+    with create_output_sink(args.output_format) as output_function:
+        percentages_report(books, key_attribute, output_function,
+                           limit=args.limit)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Show average page count for a particular dimension
+Show average page count for a particular dimension.  Other aggregates of
+the page count (e.g. median, stddev) can be shown instead with -A.
 """
 
 from os.path import basename
@@ -9,8 +10,10 @@ import sys
 from collections import namedtuple
 
 from utils.export_reader import read_file, only_read_and_rated_books, only_read_books
-from utils.arguments import parse_args
-from utils.transformers import calculate_average_metric
+from utils.arguments import create_parser, validate_args
+from utils.group_by import AGGREGATES
+from utils.output_sink import create_output_sink, is_structured_output
+from utils.transformers import calculate_grouped_metric
 
 def sort_value_by_reverse_pagination(z):
     return -z[1]
@@ -52,17 +55,27 @@ if __name__ == '__main__':
         raise Exception('No attribute found in script name')
 
     # TODO: support enumeration/ranking (-e)
-    args = parse_args('Show average page count by %s,'
-                      ' by decade of publication, and rating' % key_attribute_name,
-                      supported_args='fl')
+    parser = create_parser('Show average page count by %s,'
+                           ' by decade of publication, and rating' % key_attribute_name,
+                           supported_args='flO')
+    parser.add_argument('-A', dest='aggregate', choices=AGGREGATES,
+                        default='mean',
+                        help='Aggregate of the page count to show, default=mean')
+    args = parser.parse_args()
+    validate_args(args)
 
     books = read_file(filter_funcs=config.filter_functions, args=args)
-    raw_data = calculate_average_metric(books, config.key_attribute, 'pagination',
-                                       include_missing_pagination=config.include_missing_pagination)
+    raw_data = calculate_grouped_metric(books, config.key_attribute, 'pagination',
+                                        args.aggregate,
+                                        include_missing_pagination=config.include_missing_pagination)
     data = sorted(raw_data, key=config.sort_function)
 
     if args.limit:
         data = data[:args.limit]
-    for k, v, c in data:
-        print('%-30s: %5d (%d)' % (k, v, c))
+    with create_output_sink(args.output_format) as output_function:
+        for stat in data:
+            if is_structured_output(output_function):
+                output_function(stat)
+            else:
+                output_function('%-30s: %5d (%d)' % stat)
 
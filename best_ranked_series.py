@@ -10,11 +10,14 @@ from functools import cmp_to_key
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file, only_read_books
+from utils.output_sink import create_output_sink
 from utils.transformers import best_ranked_report
 
 
 if __name__ == '__main__':
     args = parse_args('Show average rating of series, with a bar chart breaking down the rankings',
-                      supported_args='f')
+                      supported_args='fO')
     books = read_file(args=args, filter_funcs=[only_read_books])
-    best_ranked_report(books, 'series', ignore_single_book_groups=True)
+    with create_output_sink(args.output_format) as output_function:
+        best_ranked_report(books, 'series', output_function=output_function,
+                           ignore_single_book_groups=True)
@@ -8,7 +8,8 @@ This is intended for use with anthology/collections
 
 Reguirements:
 * isfdb_tools : https://github.com/JohnSmithDev/ISFDB-Tools
-* A locally running/accessible MySQL/MariaDB instance of the ISFDB database
+* A locally running/accessible MySQL/MariaDB instance of the ISFDB database,
+  or a snapshot of the relevant parts of it created by make_isfdb_snapshot.py
 
 TODO:
 * normalize authors: e.g. Allen M. Steele vs Allen Steele
@@ -18,15 +19,24 @@ TODO:
 
 """
 
-from collections import defaultdict, namedtuple, Counter
+from collections import defaultdict, deque, namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
+import os
 import pdb
 import sys
+import threading
 
 from utils.arguments import create_parser, validate_args
 from utils.basic_report import process_books, output_grouped_lists
 from utils.export_reader import read_file
 from utils.colorama_canvas import (ColoramaCanvas, Fore, Back, Style)
+from utils.isfdb_authors import AuthorResolver
+from utils.isfdb_cache import (cached_lookup, add_cache_arguments,
+                               create_cache_from_args)
+from utils.isfdb_queries import resolve_books_in_batches, MAX_IN_LIST_SIZE
+from utils.isfdb_snapshot import open_snapshot, add_snapshot_arguments
 
 # isfdb_tools
 from common import get_connection
@@ -56,6 +66,20 @@ HashableAuthor = namedtuple('HashableAuthor',
 HashableTitle = namedtuple('HashableTitle',
                            'title_id, title')
 
+# find_method is one of 'goodreads_id', 'isbn' (books with an ISBN, whether or
+# not batch mode is used), 'via_title' (books without one) or 'not_found' - in
+# the last case, the remaining fields are all None
+BookResolution = namedtuple('BookResolution',
+                            'book, find_method, title_id, title, contents')
+
+# How far the parallel lookups are allowed to get ahead of the consumer
+MAX_QUEUED_BOOKS_PER_WORKER = 4
+
+# Each distinct author name is only normalized once per run.  Only the
+# normalization is memoized - the (author, title) lookups are only memoized with
+# the -k cache.
+AUTHOR_RESOLVER = AuthorResolver(normalize_name)
+
 def do_nothing(*args, **kwargs):
     """Stub for functions that take an output_function argument"""
     pass
@@ -65,18 +89,17 @@ def isfdb_title_url(tid):
 
 
 
-def work_out_title_stuff(conn, book):
+def work_out_title_stuff(conn, book, cache=None):
     """
     Given a GR-sourced book object, return a list of **SOMETHING** or raise
     BookNotFoundError
 
     If no ISBN, try to work out what the book is based on author and title
+
+    cache is an optional utils.isfdb_cache.LookupCache
     """
-    author_guesses = [book.author]
-    normalized_author = normalize_name(book.author)
-    if normalized_author:
-        author_guesses.append(normalized_author)
-        # print(author_guesses)
+    author_guesses = AUTHOR_RESOLVER.author_guesses(book.author)
+    # print(author_guesses)
 
     for i, author in enumerate(author_guesses):
         # print('%d. Trying author %s and title %s' % (i, author, book.clean_title))
@@ -84,11 +107,13 @@ def work_out_title_stuff(conn, book):
             # TODO: better handling of multiple authors, although possibly we
             # won't need it as the ISFDB code should be able to work with just one
             # author
-            isfdb_id_list = find_book_for_author_and_title(conn, author,
-                                                           book.clean_title
-                                                           # title_types is not supported!?!
-                                                           # ,
-                                                           # title_types=TITLE_TYPES_OF_INTEREST
+            isfdb_id_list = cached_lookup(cache, 'author_title',
+                                          (author, book.clean_title),
+                                          find_book_for_author_and_title,
+                                          conn, author, book.clean_title
+                                          # title_types is not supported!?!
+                                          # ,
+                                          # title_types=TITLE_TYPES_OF_INTEREST
             )
             return isfdb_id_list
 
@@ -101,14 +126,16 @@ def work_out_title_stuff(conn, book):
     raise BookNotFoundError(f"Couldn't find {book} in ISFDB")
 
 
-def check_book_content(conn, book, output_function=print):
+def check_book_content(conn, book, output_function=print, cache=None):
     if book.isbn13 or book.isbn:
-        title_details = get_authors_and_title_for_isbn(conn, book.isbn13 or book.isbn)
+        isbn = book.isbn13 or book.isbn
+        title_details = cached_lookup(cache, 'isbn', isbn,
+                                      get_authors_and_title_for_isbn, conn, isbn)
         # output_function(title_details)
         return title_details
     else:
         try:
-            title_details = work_out_title_stuff(conn, book)
+            title_details = work_out_title_stuff(conn, book, cache=cache)
             # output_function(title_details)
             return title_details[0]
         except BookNotFoundError as err:
@@ -118,11 +145,146 @@ def check_book_content(conn, book, output_function=print):
     return None
 
 
-def process_books(conn, books, output_function=print):
+def add_contents(conn, resolution):
+    """
+    Given a BookResolution that has been identified (or not), return a copy
+    with the contents populated.
+    """
+    if resolution.find_method == 'not_found':
+        return resolution
+    title_ids = get_all_related_title_ids(conn, resolution.title_id,
+                                          only_same_languages=True)
+    contents = get_title_contents(conn, title_ids)
+    best_pub_id, best_contents = analyse_pub_contents(contents,
+                                                      output_function=do_nothing)
+    return resolution._replace(contents=best_contents)
+
+
+def resolve_book(conn, book, cache=None):
+    """
+    Do all the ISFDB lookups for a single book, returning a BookResolution.
+
+    This doesn't touch any shared state, so it is safe to call from multiple
+    threads, as long as each thread has its own connection.  cache is an
+    optional utils.isfdb_cache.LookupCache
+    """
+    try:
+        pub_title_stuff = cached_lookup(cache, 'goodreads_id', book.book_id,
+                                        get_ids_from_goodreads_id,
+                                        conn, book.book_id)
+        first_entry = pub_title_stuff[0]
+        title_id = first_entry['title_id']
+        title = first_entry['title_title']
+        find_method = 'goodreads_id'
+    except BookNotFoundError:
+        title_details = check_book_content(conn, book, cache=cache)
+        if not title_details:
+            return BookResolution(book, 'not_found', None, None, None)
+        title_id = title_details.title_id
+        try:
+            title = title_details.title
+        except AttributeError:
+            title = book.title
+        # check_book_content() only matches on author and title if there's
+        # no ISBN, as per identify_books_in_batches()
+        find_method = 'isbn' if (book.isbn13 or book.isbn) else 'via_title'
+
+    return add_contents(conn, BookResolution(book, find_method, title_id, title,
+                                             None))
+
+
+def identify_books_in_batches(conn, books, batch_size, cache=None):
+    """
+    Yield a BookResolution (without contents) for each book, in the same order
+    as books, resolving Goodreads ids and ISBNs with a handful of set-based
+    queries per batch_size books.  Only the leftovers that have no ISBN are
+    then matched one-by-one on author and title, as check_book_content() does.
+    """
+    for book, find_method, titles in resolve_books_in_batches(conn, books,
+                                                              batch_size):
+        if titles:
+            yield BookResolution(book, find_method, titles[0].title_id,
+                                 titles[0].title, None)
+            continue
+        if not (book.isbn13 or book.isbn):
+            try:
+                title_details = work_out_title_stuff(conn, book, cache=cache)[0]
+                title_id = title_details.title_id
+                try:
+                    title = title_details.title
+                except AttributeError:
+                    title = book.title
+                yield BookResolution(book, 'via_title', title_id, title, None)
+                continue
+            except BookNotFoundError:
+                logging.warning(f"No ISBNs for {book}, and couldn't work out ISFDB record")
+        yield BookResolution(book, 'not_found', None, None, None)
+
+
+def resolve_books(conn, books, workers=1, connection_factory=None, cache=None,
+                  batch_size=None):
+    """
+    Yield a BookResolution for each book, in the same order as books.
+
+    If workers is greater than 1, the lookups are done in a pool of that many
+    threads, each of which gets its own connection from connection_factory
+    (default: isfdb_tools' get_connection), as the connections aren't
+    thread-safe.  Only a bounded number of books are in flight at any one time,
+    so books can still be a generator over a large export.
+
+    If batch_size is specified, the books are identified in batches (see
+    identify_books_in_batches()), and only the fetching of the contents is
+    done per book (in parallel, if workers is greater than 1).
+    """
+    if batch_size:
+        items = identify_books_in_batches(conn, books, batch_size, cache=cache)
+        lookup_function = add_contents
+    else:
+        items = books
+        lookup_function = partial(resolve_book, cache=cache)
+
+    if workers <= 1:
+        for item in items:
+            yield lookup_function(conn, item)
+        return
+
+    if connection_factory is None:
+        connection_factory = get_connection
+    thread_data = threading.local()
+    worker_conns = []
+    conns_lock = threading.Lock()
+
+    def lookup_in_worker(item):
+        try:
+            worker_conn = thread_data.conn
+        except AttributeError:
+            worker_conn = thread_data.conn = connection_factory()
+            with conns_lock:
+                worker_conns.append(worker_conn)
+        return lookup_function(worker_conn, item)
+
+    in_flight = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for item in items:
+                in_flight.append(executor.submit(lookup_in_worker, item))
+                if len(in_flight) >= workers * MAX_QUEUED_BOOKS_PER_WORKER:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+    finally:
+        for worker_conn in worker_conns:
+            worker_conn.close()
+
+
+def process_books(conn, books, output_function=print, workers=1, cache=None,
+                  batch_size=None, connection_factory=None):
     """
     Return two defaultdicts:
     * Mapping of author to set of stories
     * Mapping of HashableStory to titles they appear in
+
+    See resolve_books() for the other arguments.
     """
     by_author = defaultdict(set) # maps author to stories
 
@@ -133,37 +295,21 @@ def process_books(conn, books, output_function=print):
 
     total = 0 # books is a generator, so can't do len() on it
     find_method_counts = Counter()
-    for book_num, book in enumerate(books):
+    resolutions = resolve_books(conn, books, workers,
+                                connection_factory=connection_factory,
+                                cache=cache, batch_size=batch_size)
+    for book_num, resolution in enumerate(resolutions):
         total += 1
-        preferred_pub_ids = None
-        try:
-            pub_title_stuff = get_ids_from_goodreads_id(conn, book.book_id)
-            first_entry = pub_title_stuff[0]
-            title_id = first_entry['title_id']
-            title = first_entry['title_title']
-            preferred_pub_ids = {z['pub_id'] for z in pub_title_stuff}
-            find_method_counts['goodreads_id'] += 1
-        except BookNotFoundError:
-            title_details = check_book_content(conn, book)
-            if not title_details:
-                # not_found_count += 1
-                not_found.append(book)
-                find_method_counts['not_found'] += 1
-                continue
-            title_id = title_details.title_id
-            try:
-                title = title_details.title
-            except AttributeError:
-                title = book.title
-            find_method_counts['via_title'] += 1
-
-        h_t = HashableTitle(title_id, title)
+        find_method_counts[resolution.find_method] += 1
+        if resolution.find_method == 'not_found':
+            # not_found_count += 1
+            not_found.append(resolution.book)
+            continue
+
+        title = resolution.title
+        h_t = HashableTitle(resolution.title_id, title)
         # output_function(h_t)
-        title_ids = get_all_related_title_ids(conn, title_id,
-                                              only_same_languages=True)
-        contents = get_title_contents(conn, title_ids)
-        best_pub_id, best_contents = analyse_pub_contents(contents,
-                                                          output_function=do_nothing)
+        best_contents = resolution.contents
         # render_pub(best_pub_id, best_contents)
         if best_contents:
             for story in best_contents:
@@ -243,14 +389,36 @@ if __name__ == '__main__':
     parser.add_argument('-t', dest='title_id', nargs='?', type=int, default=None,
                         help='Compare stories in collection with anthology/collection of given '
                         'ISFDB title_id')
+    parser.add_argument('-j', dest='workers', type=int, nargs='?', default=1,
+                        const=os.cpu_count() or 1,
+                        help='Do the ISFDB lookups in N (default: number of CPUs) '
+                        'parallel threads, each with its own database connection')
+    parser.add_argument('-b', dest='batch_size', type=int, nargs='?', default=None,
+                        const=MAX_IN_LIST_SIZE,
+                        help='Identify books in batches of N (default %d) using '
+                        'set-based queries, rather than one at a time' % (MAX_IN_LIST_SIZE))
+    add_cache_arguments(parser)
+    add_snapshot_arguments(parser)
     args = parser.parse_args()
     validate_args(args)
 
     books = read_file(args=args)
 
-    conn = get_connection()
-
-    by_author, story_to_pubs = process_books(conn, books)
+    if args.snapshot_file:
+        def connection_factory():
+            return open_snapshot(args.snapshot_file)
+    else:
+        connection_factory = get_connection
+    conn = connection_factory()
+    cache = create_cache_from_args(args, BookNotFoundError)
+
+    by_author, story_to_pubs = process_books(conn, books, workers=args.workers,
+                                             cache=cache, batch_size=args.batch_size,
+                                             connection_factory=connection_factory)
+    if cache:
+        cache.log_stats()
+        cache.close()
+    AUTHOR_RESOLVER.log_stats()
 
     if args.title_id is not None:
         # 36607
@@ -7,7 +7,8 @@ more pertinently, doesn't have - for that title.
 
 Reguirements:
 * isfdb_tools : https://github.com/JohnSmithDev/ISFDB-Tools
-* A locally running/accessible MySQL/MariaDB instance of the ISFDB database
+* A locally running/accessible MySQL/MariaDB instance of the ISFDB database,
+  or a snapshot of the relevant parts of it created by make_isfdb_snapshot.py
 """
 
 import logging
@@ -18,6 +19,10 @@ from utils.arguments import create_parser, validate_args
 # from utils.basic_report import process_books, output_grouped_lists
 from utils.export_reader import read_file
 from utils.colorama_canvas import Fore
+from utils.isfdb_authors import AuthorResolver
+from utils.isfdb_cache import (cached_lookup, add_cache_arguments,
+                               create_cache_from_args)
+from utils.isfdb_snapshot import open_snapshot, add_snapshot_arguments
 
 # isfdb_tools
 from common import get_connection
@@ -39,6 +44,11 @@ TITLE_TYPES_OF_INTEREST = ['NOVEL']
 
 LOW_TAG_COUNT_WARNING = 3
 
+# Each distinct author name is only normalized once per run.  Only the
+# normalization is memoized - the (author, title) lookups are only memoized with
+# the -k cache.
+AUTHOR_RESOLVER = AuthorResolver(normalize_name)
+
 def isfdb_title_url(tid):
     return 'http://www.isfdb.org/cgi-bin/title.cgi?%d' % (tid)
 
@@ -76,21 +86,22 @@ def output_found_details(book, title_id_tags_map, output_function=print):
                                 ))
 
 
-def check_tags_for_book(conn, book, output_function=print):
+def check_tags_for_book(conn, book, output_function=print, cache=None):
     """
     For a given book, output the ISFDB tags if it was found in that database.
 
     Returns True if book was found, else false
+
+    cache is an optional utils.isfdb_cache.LookupCache
     """
     if book.isbn13:
-        ret = get_authors_and_title_for_isbn(conn, book.isbn13 or book.isbn)
+        isbn = book.isbn13 or book.isbn
+        ret = cached_lookup(cache, 'isbn', isbn,
+                            get_authors_and_title_for_isbn, conn, isbn)
         output_function(ret)
 
-    author_guesses = [book.author]
-    normalized_author = normalize_name(book.author)
-    if normalized_author:
-        author_guesses.append(normalized_author)
-        # output_function(author_guesses)
+    author_guesses = AUTHOR_RESOLVER.author_guesses(book.author)
+    # output_function(author_guesses)
 
     for i, author in enumerate(author_guesses):
         # output_function('%d. Trying author %s and title %s' % (i, author, book.clean_title))
@@ -98,11 +109,13 @@ def check_tags_for_book(conn, book, output_function=print):
             # TODO: better handling of multiple authors, although possibly we
             # won't need it as the ISFDB code should be able to work with just one
             # author
-            isfdb_id_list = find_book_for_author_and_title(conn, author,
-                                                           book.clean_title
-                                                           # title_types is not supported!?!
-                                                           # ,
-                                                           # title_types=TITLE_TYPES_OF_INTEREST
+            isfdb_id_list = cached_lookup(cache, 'author_title',
+                                          (author, book.clean_title),
+                                          find_book_for_author_and_title,
+                                          conn, author, book.clean_title
+                                          # title_types is not supported!?!
+                                          # ,
+                                          # title_types=TITLE_TYPES_OF_INTEREST
             )
             title_id_and_tags = {z.title_id: get_title_tags(conn, z.title_id)
                                                     for z in isfdb_id_list}
@@ -126,20 +139,30 @@ if __name__ == '__main__':
     parser = create_parser('List all books matching filters, optionally ordered ' +
                            'and/or grouped.~',
                            supported_args='efs', report_on='book')
+    add_cache_arguments(parser)
+    add_snapshot_arguments(parser)
     args = parser.parse_args()
     validate_args(args)
 
     books = read_file(args=args)
 
-    mconn = get_connection()
+    if args.snapshot_file:
+        mconn = open_snapshot(args.snapshot_file)
+    else:
+        mconn = get_connection()
+    cache = create_cache_from_args(args, BookNotFoundError)
 
     not_found_count = 0
     total = 0 # books is a generator, so can't do len() on it
     for bk in books:
         total += 1
-        if check_tags_for_book(mconn, bk):
+        if check_tags_for_book(mconn, bk, cache=cache):
             pass
         else:
             not_found_count += 1
 
     print('%d of %d books not found' % (not_found_count, total))
+    if cache:
+        cache.log_stats()
+        cache.close()
+    AUTHOR_RESOLVER.log_stats()
@@ -8,8 +8,11 @@ from symlinked filename).
 from os.path import basename
 import sys
 
-from utils.arguments import parse_args
+from utils.arguments import create_parser, validate_args, valid_date_type
+from utils.as_of import AsOfIndex
+from utils.book import TODAY
 from utils.export_reader import read_file
+from utils.markup_canvas import add_canvas_arguments, canvas_class_from_args
 from utils.tsundoku import Tsundoku
 
 pattern_to_key = {
@@ -29,18 +32,57 @@ def determine_attributes(script_name=None):
         raise Exception('No attribute found in script name')
     return key_attribute_name, key_attribute
 
+def render_dated(t, canvas_class, canvas_format, dt):
+    """
+    Render a chart for one of several dates.  Coloured text output gets a
+    header line, whereas HTML and SVG documents get the date as a caption,
+    so that each one is self-contained.
+    """
+    if canvas_format == 'ansi':
+        print('== %s ==' % (dt))
+        t.render(canvas_class)
+    else:
+        t.render(canvas_class, caption=str(dt))
+
 if __name__ == '__main__':
     key_attribute_name, key_attribute = determine_attributes()
 
 
-    args = parse_args('Render a graphical representation of your to-be-read pile '
-                      'aka Mount Tsundoku, colour coded by %s' % (key_attribute_name),
-                      'cdfl')
+    parser = create_parser('Render a graphical representation of your to-be-read pile '
+                           'aka Mount Tsundoku, colour coded by %s' % (key_attribute_name),
+                           'cdDfl')
+    parser.add_argument('-t', dest='start_date', nargs='?',
+                        type=valid_date_type, default=None,
+                        help='Render the pile at the end of every month from the '
+                        'specified date until the -d date (or today)')
+    add_canvas_arguments(parser)
+    args = parser.parse_args()
+    validate_args(args)
+    canvas_class = canvas_class_from_args(args)
 
     col_cfg = args.colour_cfg.select_category(key_attribute_name)
     t = Tsundoku(col_cfg, key_attribute)
-    t.process(read_file(args=args))
-    t.postprocess(max_height=args.limit)
-    t.render()
-    t.output_colour_key() # Q: Or do this within .render() method?
-
+    if args.start_date:
+        # The books need to be read as they are now, rather than as of the
+        # end date, so that the add/read events can be replayed
+        end_date = args.date or TODAY
+        args.date = None
+        for frame_date in t.process_over_time(read_file(args=args),
+                                              args.start_date, end_date):
+            if not t.unread_shelves and not t.read_shelves:
+                continue
+            t.postprocess(max_height=args.limit)
+            render_dated(t, canvas_class, args.canvas_format, frame_date)
+    elif args.as_of_dates:
+        index = AsOfIndex(read_file(args=args))
+        for as_of_date in args.as_of_dates:
+            t = Tsundoku(col_cfg, key_attribute)
+            t.process(index.books_as_of(as_of_date))
+            t.postprocess(max_height=args.limit)
+            render_dated(t, canvas_class, args.canvas_format, as_of_date)
+    else:
+        t.process(read_file(args=args))
+        t.postprocess(max_height=args.limit)
+        t.render(canvas_class)
+    if args.canvas_format == 'ansi':
+        t.output_colour_key() # Q: Or do this within .render() method?
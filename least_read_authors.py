@@ -5,11 +5,14 @@ Show which authors are least read (in terms of books read/books owned)
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file
-from utils.transformers import ReadVsUnreadReport
+from utils.output_sink import create_output_sink
+from utils.transformers import read_vs_unread_report
 
 if __name__ == '__main__':
     args = parse_args('Show which authors are least read (in terms of books read/books owned)',
-                      'a')
+                      'aDO')
 
     books = read_file(args=args)
-    ReadVsUnreadReport(books, 'all_authors' if args.all_authors else 'author').process().render()
+    with create_output_sink(args.output_format) as output_function:
+        read_vs_unread_report(books, 'all_authors' if args.all_authors else 'author',
+                              args.as_of_dates, output_function=output_function)
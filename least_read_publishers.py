@@ -9,11 +9,15 @@ data.  (May be available via the API though - I haven't checked?)
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file
-from utils.transformers import ReadVsUnreadReport
+from utils.output_sink import create_output_sink
+from utils.transformers import read_vs_unread_report
 
 if __name__ == '__main__':
-    args = parse_args('Show which series are least read (in terms of books read/books owned)')
+    args = parse_args('Show which series are least read (in terms of books read/books owned)',
+                      'DO')
 
     books = read_file(args=args)
-    ReadVsUnreadReport(books, 'publisher',
-                       ignore_single_book_groups=True).process().render()
+    with create_output_sink(args.output_format) as output_function:
+        read_vs_unread_report(books, 'publisher', args.as_of_dates,
+                              output_function=output_function,
+                              ignore_single_book_groups=True)
@@ -5,10 +5,14 @@ Show which shelves are least read (in terms of books read/books owned)
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file
-from utils.transformers import ReadVsUnreadReport
+from utils.output_sink import create_output_sink
+from utils.transformers import read_vs_unread_report
 
 if __name__ == '__main__':
-    args = parse_args('Show which shelves are least read (in terms of books read/books owned)')
+    args = parse_args('Show which shelves are least read (in terms of books read/books owned)',
+                      'DO')
 
     books = read_file(args=args)
-    ReadVsUnreadReport(books, 'user_shelves').process().render()
+    with create_output_sink(args.output_format) as output_function:
+        read_vs_unread_report(books, 'user_shelves', args.as_of_dates,
+                              output_function=output_function)
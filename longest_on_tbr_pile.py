@@ -9,35 +9,68 @@ yet read (or are currently reading), which may well be many more than are listed
 here.
 """
 
-from functools import cmp_to_key
+import heapq
+from operator import itemgetter
 
 from utils.arguments import create_parser, validate_args
+from utils.as_of import AsOfIndex
 from utils.export_reader import read_file, only_read_books, \
     only_unread_books
+from utils.output_sink import create_output_sink
 
 MIN_PERIOD = 31
 
-def output_report(books, min_period=None, max_books=None, output_function=print):
-    for i, bk in enumerate(books):
-        if (min_period and bk.days_on_tbr_pile < min_period) or \
-           (max_books and i >= max_books):
-            break
-        output_function('%4d. %-60s - Days on TBR pile: %4d' %
-                        (i+1, bk.title[:58], bk.days_on_tbr_pile))
+def only_valid_dates(bk):
+    # This is mainly for the benefit of books that were read long ago and
+    # retroactively added to GoodReads
+    return bk.date_added and bk.date_read and (bk.date_read > bk.date_added)
+
+
+def partition_books(books):
+    """
+    Split books into read (with valid dates) and unread, returning two lists
+    of (days_on_tbr_pile, book) tuples, so that days_on_tbr_pile - which
+    involves a fair bit of date logic - is only calculated once per book.
+    """
+    read_books = []
+    unread_books = []
+    for bk in books:
+        if only_read_books(bk):
+            if only_valid_dates(bk):
+                read_books.append((bk.days_on_tbr_pile, bk))
+        elif only_unread_books(bk):
+            unread_books.append((bk.days_on_tbr_pile, bk))
+    return read_books, unread_books
+
+
+def longest_first(days_and_books, min_period=None, max_books=None):
+    """
+    Return the (days_on_tbr_pile, book) tuples with at least min_period days,
+    longest first.  Books with the same number of days stay in the order they
+    were read in.
+    """
+    if min_period:
+        days_and_books = [z for z in days_and_books if z[0] >= min_period]
+    if max_books:
+        return heapq.nlargest(max_books, days_and_books, key=itemgetter(0))
+    return sorted(days_and_books, key=itemgetter(0), reverse=True)
 
 
-def report(books, label, min_period, max_books, output_function=print):
-    def comparator(book_a, book_b):
-        return book_b.days_on_tbr_pile - book_a.days_on_tbr_pile
+def output_report(days_and_books, output_function=print):
+    for i, (days, bk) in enumerate(days_and_books):
+        output_function('%4d. %-60s - Days on TBR pile: %4d' %
+                        (i+1, bk.title[:58], days))
+
 
+def report(days_and_books, label, min_period, max_books, output_function=print):
     output_function('== %s ==' % (label))
-    sorted_books = sorted(books, key=cmp_to_key(comparator))
-    output_report(sorted_books, min_period, max_books, output_function)
+    output_report(longest_first(days_and_books, min_period, max_books),
+                  output_function)
 
 
 if __name__ == '__main__':
     parser = create_parser('Show which books have languished the longest on the TBR pile',
-                      supported_args='dfl')
+                      supported_args='dDflO')
     parser.add_argument('-p', dest='min_period', type=int, nargs='?',
                         default=31, help='Minimum period to report in (in days)')
     args = parser.parse_args()
@@ -48,16 +81,20 @@ if __name__ == '__main__':
     else:
         shelves_label = ''
 
-    def only_valid_dates(bk):
-        # This is mainly for the benefit of books that were read long ago and
-        # retroactively added to GoodReads
-        return bk.date_added and bk.date_read and (bk.date_read > bk.date_added)
-
-    report(read_file(args=args, filter_funcs=[only_read_books, only_valid_dates]),
-           'Read %sbooks' % (shelves_label), args.min_period, args.limit)
-
-    print()
+    if args.as_of_dates:
+        index = AsOfIndex(read_file(args=args))
+        labels_and_books = ((' as of %s' % (z), index.books_as_of(z))
+                            for z in args.as_of_dates)
+    else:
+        labels_and_books = [('', read_file(args=args))]
 
-    report(read_file(args=args, filter_funcs=[only_unread_books]),
-                     'Unread %sbooks' % (shelves_label),
-           args.min_period, args.limit)
+    with create_output_sink(args.output_format) as output_function:
+        for i, (as_of_label, books) in enumerate(labels_and_books):
+            if i > 0:
+                output_function()
+            read_books, unread_books = partition_books(books)
+            report(read_books, 'Read %sbooks%s' % (shelves_label, as_of_label),
+                   args.min_period, args.limit, output_function)
+            output_function()
+            report(unread_books, 'Unread %sbooks%s' % (shelves_label, as_of_label),
+                   args.min_period, args.limit, output_function)
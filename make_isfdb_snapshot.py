@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Extract the parts of ISFDB that are relevant to the books in a Goodreads CSV
+export into a compact SQLite file, which check_isfdb_content.py and
+check_isfdb_tags.py can then use (via their -x option) instead of a
+MySQL/MariaDB server.
+
+See utils/isfdb_snapshot.py for what gets extracted.  Re-run this after loading
+a new ISFDB dump, or after adding a significant number of books.
+
+Reguirements:
+* isfdb_tools : https://github.com/JohnSmithDev/ISFDB-Tools
+* A locally running/accessible MySQL/MariaDB instance of the ISFDB database
+"""
+
+import logging
+import sys
+
+from utils.arguments import create_parser, validate_args
+from utils.export_reader import read_file
+from utils.isfdb_authors import AuthorResolver
+from utils.isfdb_snapshot import extract_snapshot, add_snapshot_arguments
+
+# isfdb_tools
+from common import get_connection
+from normalize_author_name import normalize_name
+
+
+if __name__ == '__main__':
+    parser = create_parser('Extract the parts of ISFDB relevant to your books into '
+                           'an SQLite file',
+                           supported_args='f', report_on='book')
+    add_snapshot_arguments(parser)
+    args = parser.parse_args()
+    validate_args(args)
+    if not args.snapshot_file:
+        logging.error('Must specify a snapshot file (-x) or set GR_ISFDB_SNAPSHOT')
+        sys.exit(1)
+
+    books = read_file(args=args)
+    conn = get_connection()
+
+    # Include the normalized author names that the check_isfdb_*.py scripts
+    # also try
+    row_counts = extract_snapshot(conn, args.snapshot_file, books,
+                                  AuthorResolver(normalize_name))
+    for table, qty in sorted(row_counts.items()):
+        print('%-20s : %8d rows' % (table, qty))
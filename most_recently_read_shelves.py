@@ -6,10 +6,13 @@ read.
 
 from utils.arguments import parse_args
 from utils.export_reader import read_file
+from utils.output_sink import create_output_sink
 from utils.transformers import LastReadReport
 
 if __name__ == '__main__':
-    args = parse_args('Display when a book from all shelves was most recently read')
+    args = parse_args('Display when a book from all shelves was most recently read',
+                      'O')
     books = read_file(args=args)
     lrr = LastReadReport(books, 'user_shelves')
-    lrr.process().render()
+    with create_output_sink(args.output_format) as output_function:
+        lrr.process().render(output_function)
@@ -10,11 +10,12 @@ least based on the books I own.
 
 from utils.arguments import create_parser, validate_args
 from utils.export_reader import read_file
+from utils.output_sink import create_output_sink
 
 
 if __name__ == '__main__':
     parser = create_parser('Output list of books ordered by publication year.',
-                           supported_args='f')
+                           supported_args='fO')
     parser.add_argument('-s', dest='space_between_years', action='store_true',
                         help='Output blank line between years')
     args = parser.parse_args()
@@ -23,11 +24,13 @@ if __name__ == '__main__':
     books_in_pub_date_order = sorted(read_file(args=args),
                                      key=lambda z: z.year or 9999)
     prev_year = None
-    for b in books_in_pub_date_order:
-        if args.space_between_years and prev_year is not None and b.year != prev_year:
-            print()
-        print('%s %-5s : %s' % (b.year or '????',
-                              b.rating * '*' if b.rating else '',
-                              b))
-        prev_year = b.year
+    with create_output_sink(args.output_format) as output_function:
+        for b in books_in_pub_date_order:
+            if args.space_between_years and prev_year is not None and \
+               b.year != prev_year:
+                output_function()
+            output_function('%s %-5s : %s' % (b.year or '????',
+                                              b.rating * '*' if b.rating else '',
+                                              b))
+            prev_year = b.year
 
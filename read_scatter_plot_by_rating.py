@@ -12,9 +12,11 @@ following notable differences:
 
 import pdb
 
-from utils.arguments import parse_args
+from utils.arguments import create_parser, validate_args
+from utils.colorama_canvas import default_output_stream, SparseColoramaCanvas
 from utils.colour_coding import rating_to_colours
 from utils.export_reader import read_file, only_read_books
+from utils.markup_canvas import add_canvas_arguments, canvas_class_from_args
 from utils.read_scatter_plot import ScatterPlot
 
 def only_books_with_publication_year(bk):
@@ -24,8 +26,12 @@ def only_books_with_read_date(bk):
     return bk.date_read is not None
 
 if __name__ == '__main__':
-    args = parse_args('Draw a scatter plot of all books read',
-                      'fw')
+    parser = create_parser('Draw a scatter plot of all books read', 'fw')
+    parser.add_argument('-n', dest='show_density', action='store_true',
+                        help='Show the number of books in cells that have more than one')
+    add_canvas_arguments(parser)
+    args = parser.parse_args()
+    validate_args(args)
 
     books = read_file(args=args, filter_funcs=[only_read_books,
                                                only_books_with_read_date,
@@ -33,4 +39,6 @@ if __name__ == '__main__':
     sp = ScatterPlot(books)
     sp.process()
 
-    sp.render(colour_function=rating_to_colours, render_width=args.width)
+    sp.render(colour_function=rating_to_colours, render_width=args.width,
+              stream=default_output_stream(), show_density=args.show_density,
+              canvas_class=canvas_class_from_args(args, SparseColoramaCanvas))
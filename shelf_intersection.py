@@ -20,17 +20,24 @@ import sys
 from utils.arguments import create_parser, validate_args
 from utils.basic_report import process_books, output_grouped_lists
 from utils.export_reader import read_file
+from utils.external_sort import DEFAULT_CHUNK_SIZE
+from utils.output_sink import create_output_sink
 
 if __name__ == '__main__':
     parser = create_parser('List all books matching filters, optionally ordered ' +
                            'and/or grouped.~',
-                           supported_args='efs', report_on='book')
+                           supported_args='efOs', report_on='book')
     parser.add_argument('-i', dest='inline_separator', nargs='?',
                         help='Output results inline, separated by supplied value"')
     parser.add_argument('-I', dest='inline_separator_with_breaks', nargs='?',
                         help='As -i, but do line breaks when sort value (-s changes)"')
     parser.add_argument('-m', dest='format', nargs='?',
                         help='Custom output format e.g. "{title} by {author}"')
+    parser.add_argument('-M', dest='sort_chunk_size', type=int, nargs='?',
+                        const=DEFAULT_CHUNK_SIZE,
+                        help='When sorting, only hold this many books (default '
+                        '%d) in memory at once, using temporary files for the '
+                        'rest' % (DEFAULT_CHUNK_SIZE))
     parser.add_argument('-p', dest='properties', action='append', default=[],
                         help='List value of property/properties')
     parser.add_argument('-P', dest='property_names', action='store_true',
@@ -42,19 +49,20 @@ if __name__ == '__main__':
         logging.error("Must specify sort properties (-s) when using -I")
         sys.exit(1)
 
-    if args.inline_separator or args.inline_separator_with_breaks:
-        separator = args.inline_separator or args.inline_separator_with_breaks
-        output_bits = []
-        def output_function(txt):
-            output_bits.append(txt)
-    else:
-        output_function = print
-        separator = None
+    with create_output_sink(args.output_format) as sink:
+        if args.inline_separator or args.inline_separator_with_breaks:
+            separator = args.inline_separator or args.inline_separator_with_breaks
+            output_bits = []
+            def output_function(txt):
+                output_bits.append(txt)
+        else:
+            output_function = sink
+            separator = None
 
-    process_books(read_file(args=args), args, output_function)
+        process_books(read_file(args=args), args, output_function)
 
-    if separator:
-        if args.inline_separator:
-            print(separator.join(output_bits))
-        else:
-            output_grouped_lists(output_bits, separator)
+        if separator:
+            if args.inline_separator:
+                sink(separator.join(output_bits))
+            else:
+                output_grouped_lists(output_bits, separator, sink)
@@ -7,18 +7,25 @@ Opinion: Currently this isn't particularly appealing visually, and the solid
          circles might be better rendered in 2-character columns.
 """
 
-from utils.arguments import parse_args
+from utils.arguments import create_parser, validate_args
 #from utils.colorama_canvas import (ColoramaCanvas, Fore, Back, Style,
 # FG_RAINBOW, ColourTextObject)
+from utils.colorama_canvas import default_output_stream
 from utils.colour_coding import rating_to_colours
 from utils.export_reader import read_file
+from utils.markup_canvas import add_canvas_arguments, canvas_class_from_args
 from utils.timeline_chart import TimelineChart
 
 
 if __name__ == '__main__':
-    args = parse_args('Draw a timeline of when books were added and read',
-                      'cdf')
+    parser = create_parser('Draw a timeline of when books were added and read',
+                           'cdf')
+    add_canvas_arguments(parser)
+    args = parser.parse_args()
+    validate_args(args)
 
     books = read_file(args=args)
     tl = TimelineChart(books)
-    tl.process().render(colour_function=rating_to_colours)
+    tl.process().render(colour_function=rating_to_colours,
+                        stream=default_output_stream(),
+                        canvas_class=canvas_class_from_args(args))
@@ -5,10 +5,12 @@ they have been read.  Colour coding - if available - indicates how long it took
 for them to be read.
 """
 
-from utils.arguments import parse_args
+from utils.arguments import create_parser, validate_args
 from utils.colorama_canvas import (ColoramaCanvas, Fore, Back, Style,
-                                   FG_RAINBOW, ColourTextObject)
+                                   FG_RAINBOW, ColourTextObject,
+                                   default_output_stream)
 from utils.export_reader import read_file
+from utils.markup_canvas import add_canvas_arguments, canvas_class_from_args
 from utils.timeline_chart import TimelineChart
 
 # Special shelves are those where there are external factors indicating how
@@ -50,12 +52,17 @@ def time_on_tbr_pile_to_colours(bk):
     return ColourTextObject(fg, bg, Style.RESET_ALL, txt)
 
 if __name__ == '__main__':
-    args = parse_args('Draw a timeline of when books were added and read',
-                      'cdf')
+    parser = create_parser('Draw a timeline of when books were added and read',
+                           'cdf')
+    add_canvas_arguments(parser)
+    args = parser.parse_args()
+    validate_args(args)
 
     books = read_file(args=args)
     tl = TimelineChart(books)
-    tl.process().render(colour_function=time_on_tbr_pile_to_colours)
+    tl.process().render(colour_function=time_on_tbr_pile_to_colours,
+                        stream=default_output_stream(),
+                        canvas_class=canvas_class_from_args(args))
 
 
 
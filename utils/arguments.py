@@ -9,6 +9,7 @@ import pdb
 
 from utils.book import date_from_string
 from utils.display import ColourConfig
+from utils.output_sink import OUTPUT_SINKS
 
 class ArgumentError(Exception):
     pass
@@ -44,6 +45,12 @@ def create_parser(description, supported_args='', report_on='item'):
                             type=valid_date_type, default=None, required=False,
                             help='Output as if today was specified date')
 
+    if 'D' in supported_args:
+        parser.add_argument('-D', dest='as_of_dates', action='append',
+                            type=valid_date_type, default=[],
+                            help='Output as if today was each of the specified '
+                            'dates in turn (can be used multiple times)')
+
     if 'e' in supported_args:
         parser.add_argument('-e', dest='enumerate_output', action='store_true',
                             help='Enumerate (i.e. prepend a counter to) each %s' % (report_on))
@@ -58,6 +65,11 @@ def create_parser(description, supported_args='', report_on='item'):
         parser.add_argument('-l', dest='limit', type=int, nargs='?',
                             help='Limit to N results or N characters in a row/column')
 
+    if 'O' in supported_args:
+        parser.add_argument('-O', dest='output_format', choices=sorted(OUTPUT_SINKS),
+                            default='text',
+                            help='Output format, default=text')
+
     if 'w' in supported_args:
         parser.add_argument('-w', dest='width', type=int, nargs='?',
                             help='Render to specified number of characters wide')
@@ -77,6 +89,8 @@ def validate_args(args):
         # Q: Can this be specified within create_parser? This SO link implies not:
         # https://stackoverflow.com/questions/10551117/setting-options-from-environment-variables-when-using-argparse
         raise ArgumentError('Must specify a CSV file, or set GR_CSV_FILE environment variable')
+    if getattr(args, 'date', None) and getattr(args, 'as_of_dates', None):
+        raise ArgumentError('-d and -D cannot be used together')
 
     try:
         with open(args.colour_cfg_file) as json_data:
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Evaluate which books were owned, read and unread as of any number of dates,
+from a single read of the CSV file.
+
+The -d option bakes a single as-of date into every Book when the file is
+read, so reporting on several dates would mean re-reading it for each one.
+Instead, read the books without -d, then either:
+* use AsOfIndex.books_as_of() to get BookAsOf proxies that behave like the
+  Books would have had they been read with -d, which can be passed to
+  anything that takes books (Tsundoku, ReadVsUnreadReport, etc)
+* use AsOfIndex.counts() if only the number of books in each state is
+  needed, which is a binary search per date rather than a pass over the
+  books
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+
+AsOfCounts = namedtuple('AsOfCounts', 'date, owned, read, unread')
+
+
+class BookAsOf(object):
+    """
+    Proxy for a Book that was read without an as-of date, with the
+    properties that depend on the as-of date evaluated for as_of_date.
+    Anything else is passed through to the Book.
+
+    As with a Book read with -d, is_unread is purely based on the book's
+    current status, so a book that was read after the as-of date is neither
+    read nor unread as of then.  Likewise, it's only on the "read" shelf if
+    it had been read by then.
+    """
+
+    def __init__(self, book, as_of_date):
+        self._book = book
+        self._as_of_date = as_of_date
+
+    def __getattr__(self, name):
+        return getattr(self._book, name)
+
+    def __str__(self):
+        return str(self._book)
+
+    def __repr__(self):
+        return 'BookAsOf(%r, %s)' % (self._book, self._as_of_date)
+
+    @property
+    def is_read(self):
+        if self._book.date_read:
+            return self._book.date_read <= self._as_of_date
+        return self._book.is_read
+
+    @property
+    def shelves(self):
+        return self._book._calculate_shelves(self.is_read)
+
+    @property
+    def days_on_tbr_pile(self):
+        return self._book._calculate_days_on_tbr_pile(self._as_of_date)
+
+
+class AsOfIndex(object):
+    """
+    Books sorted by when they were added and when they became read, so that
+    the state as of a date can be found by binary search, or updated from
+    one date to the next.  Books without a date_added are ignored, as it
+    can't be known when they were owned.
+    """
+
+    def __init__(self, books):
+        self.books = list(books)
+        added_order = sorted((bk.date_added, i) for i, bk in enumerate(self.books)
+                             if bk.date_added)
+        self._added_dates = [z[0] for z in added_order]
+        self._added_indices = [z[1] for z in added_order]
+
+        # Books with a read date count as read once they've been both added
+        # and read; those without go by their status, as do unread books
+        dated_read = []
+        undated_read = []
+        unread = []
+        for added, i in added_order:
+            bk = self.books[i]
+            if bk.date_read:
+                dated_read.append((max(added, bk.date_read), i))
+            elif bk.is_read:
+                undated_read.append(added)
+            if bk.is_unread:
+                unread.append(added)
+        dated_read.sort()
+        self._dated_read = [z[0] for z in dated_read]
+        self._dated_read_indices = [z[1] for z in dated_read]
+        self._undated_read = undated_read # Already sorted, as is unread
+        self._unread = unread
+
+    def books_as_of(self, as_of_date):
+        """
+        Return a list of BookAsOf for the books owned as of the date, in the
+        order they were originally read in
+        """
+        num_owned = bisect_right(self._added_dates, as_of_date)
+        return [BookAsOf(self.books[i], as_of_date)
+                for i in sorted(self._added_indices[:num_owned])]
+
+    def counts_at(self, as_of_date):
+        """
+        Return an AsOfCounts with the number of books owned, read and unread
+        as of the date, as per BookAsOf.is_read/is_unread.  (owned can be more
+        than read + unread, as books that are neither e.g. currently-reading
+        or read after the date are only in owned.)
+        """
+        return AsOfCounts(
+            as_of_date,
+            bisect_right(self._added_dates, as_of_date),
+            bisect_right(self._dated_read, as_of_date) +
+            bisect_right(self._undated_read, as_of_date),
+            bisect_right(self._unread, as_of_date))
+
+    def counts(self, dates):
+        """Return a list of AsOfCounts, one for each of dates"""
+        return [self.counts_at(z) for z in dates]
+
+    def changes(self, dates):
+        """
+        Generator that yields (date, added, newly_read) for each of dates,
+        which must be in ascending order, where added is a list of the
+        books added since the previous date (or ever, for the first one),
+        and newly_read a list of the books with a read date that became
+        read since then.  A book that was both added and read in the same
+        period is in both lists.  (Books without a read date are read or not
+        from when they were added, as per their status.)
+
+        This allows the state as of a series of dates to be updated
+        incrementally, rather than being worked out from scratch each time.
+        """
+        num_added = 0
+        num_read = 0
+        for dt in dates:
+            prev_added, num_added = num_added, bisect_right(self._added_dates, dt)
+            prev_read, num_read = num_read, bisect_right(self._dated_read, dt)
+            yield (dt,
+                   [self.books[i] for i in self._added_indices[prev_added:num_added]],
+                   [self.books[i] for i in self._dated_read_indices[prev_read:num_read]])
@@ -7,36 +7,96 @@ It provides basic sorting and grouping of books, but no real aggregation,
 analysis or display functionality.
 """
 
+from datetime import date
+from functools import lru_cache
+from operator import attrgetter
 import sys
 
+from utils.book import book_property, compile_custom_format
+from utils.external_sort import ExternalSorter
 from utils.helpers import generate_enumeration_prefix_format
 
 GROUP_SEPARATOR = '---'
 
+# Values used instead of None when sorting, so that sorted() doesn't blow up
+NON_NUMERIC_PROPERTIES = {
+    'author': '<Unknown author>',
+    'title': '<Untitled book'
+}
+NULL_VALUES_FOR_TYPES = {
+    str: '',
+    date: date.min
+}
+
+
+@lru_cache(maxsize=None)
+def _sort_value_function(prop_name):
+    """
+    Return a function that takes a book and returns the value of the named
+    property in a form that won't blow up sorted(), using the Book property
+    registry to work out the appropriate substitute for None, and whether a
+    substitute is needed at all.
+    """
+    details = book_property(prop_name)
+    getter = attrgetter(prop_name)
+    if prop_name in NON_NUMERIC_PROPERTIES:
+        null_value = NON_NUMERIC_PROPERTIES[prop_name]
+    elif details is None:
+        null_value = 0 # Mock book or unknown property, so play it safe
+    elif details.multi_valued:
+        def multi_valued_sort_value(bk):
+            val = getter(bk)
+            # Sets only have a partial ordering, so sort them into a list
+            if isinstance(val, (set, frozenset)):
+                return sorted(val)
+            return val if val is not None else []
+        return multi_valued_sort_value
+    elif not details.nullable:
+        return getter
+    else:
+        null_value = NULL_VALUES_FOR_TYPES.get(details.type, 0)
+
+    def sort_value(bk):
+        val = getter(bk)
+        if val is None:
+            return null_value
+        else:
+            return val
+    return sort_value
+
+
 def safe_property(bk, prop_name):
     """
     Return the attribute/property value in a form that won't blow up sorted()
     """
-    NON_NUMERIC_PROPERTIES = {
-        'author': '<Unknown author>',
-        'title': '<Untitled book'
-        # TODO: more I suspect
-    }
-    val = getattr(bk, prop_name)
-    if val is None:
-        return NON_NUMERIC_PROPERTIES.get(prop_name, 0)
-    else:
-        return val
+    return _sort_value_function(prop_name)(bk)
+
+
+def create_sort_key(property_names):
+    """
+    Return a function suitable for use as a key for sorted() that sorts books
+    by the named properties
+    """
+    sort_value_functions = [_sort_value_function(z) for z in property_names]
+    def sort_key(bk):
+        return [fn(bk) for fn in sort_value_functions]
+    return sort_key
+
 
 def process_books(books, args, output_function=print):
     prefix_format = '%d. '
     if args.sort_properties:
         # TODO: support reverse sort (by prefixing prop name with ~?)
         #       Q: how would be do strings?  Have to go into cmp etc?
-        def custom_sort_key(z):
-            return [safe_property(z, prop) for prop in args.sort_properties]
-        b = sorted(books, key=custom_sort_key)
-        books = b
+        custom_sort_key = create_sort_key(args.sort_properties)
+        sort_chunk_size = getattr(args, 'sort_chunk_size', None)
+        if sort_chunk_size:
+            # Too many books to hold in memory - note that this is a one-shot
+            # iterable, but supports len() for the enumeration below
+            books = ExternalSorter(books, custom_sort_key, sort_chunk_size)
+        else:
+            b = sorted(books, key=custom_sort_key)
+            books = b
     else:
         def custom_sort_key(z): # Dummy function to simplify later code
             return None
@@ -49,6 +109,9 @@ def process_books(books, args, output_function=print):
     if args.enumerate_output:
         prefix_format = generate_enumeration_prefix_format(books)
 
+    if args.format:
+        # Parse the format once, rather than for every book
+        custom_formatter = compile_custom_format(args.format)
 
     prefix = ''
     prev_sort_value = None
@@ -60,15 +123,14 @@ def process_books(books, args, output_function=print):
             output_function('/'.join([str(z) for z in sort_value]))
         prev_sort_value = sort_value
         if args.property_names:
-            try:
-                output_function('\n'.join(book._properties()))
-                sys.exit(1)
-            except ValueError:
-                continue
+            # The names come from the class's property registry, so this
+            # doesn't depend on the book, other than its class
+            output_function('\n'.join(book._properties()))
+            sys.exit(1)
         if args.enumerate_output:
             prefix = prefix_format % (i + 1)
         if args.format:
-            output_function('%s%s' % (prefix, book.custom_format(args.format)))
+            output_function('%s%s' % (prefix, custom_formatter(book)))
         else:
             output_function('%s%s' % (prefix, book))
 
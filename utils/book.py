@@ -9,11 +9,16 @@ except ImportError:
     # Moved in Python 3.7
     # https://github.com/chainer/chainer/issues/5097
     from collections.abc import Sequence
+from collections import namedtuple
 from datetime import date
 from decimal import Decimal
+from functools import lru_cache
 import logging
+from operator import attrgetter
 import pdb
 import re
+from string import Formatter
+from types import MappingProxyType
 
 from utils.book_helpers import (date_from_string, formatted_month,
                                 remove_excess_whitespace, sanitise_publisher,
@@ -58,6 +63,112 @@ def clean_isbn(s):
     else:
         return val
 
+
+# The leading attribute name of a replacement field in a custom format,
+# with any trailing attribute/index lookups e.g. 'title', 'shelves[0]'
+FIELD_NAME_REGEX = re.compile(r'^([A-Za-z_]\w*)(.*)$', re.DOTALL)
+
+
+@lru_cache(maxsize=32)
+def compile_custom_format(fmt):
+    """
+    Return a function that takes a book and returns it formatted as per
+    fmt - see Book.custom_format() - with the format string only being
+    parsed once, rather than for every book.
+
+    This works by rewriting fmt into a positional template e.g.
+    '{title} by {author}' => '{0} by {1}', which is filled in from a single
+    attrgetter() call, so that the per-book work is all done in C.
+    """
+    template_bits = []
+    attribute_indices = {}
+    for literal, field_name, format_spec, conversion in Formatter().parse(fmt):
+        template_bits.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field_name is None:
+            continue
+        match = FIELD_NAME_REGEX.match(field_name)
+        if not match or '{' in format_spec:
+            # Nested format specs, or fields that aren't attributes - the old
+            # str.format() approach copes with (or fails on) these in the same
+            # way as it always has
+            return fmt.replace('{', '{0.').format
+        attribute, lookups = match.groups()
+        i = attribute_indices.setdefault(attribute, len(attribute_indices))
+        template_bits.append('{%d%s%s%s}' % (i, lookups,
+                                             '!' + conversion if conversion else '',
+                                             ':' + format_spec if format_spec else ''))
+
+    template = ''.join(template_bits)
+    if not attribute_indices:
+        return lambda bk: template.format()
+    getter = attrgetter(*attribute_indices)
+    if len(attribute_indices) == 1:
+        return lambda bk: template.format(getter(bk))
+    else:
+        return lambda bk: template.format(*getter(bk))
+
+
+# Cost classes for BookProperty.cost - how much work it takes to get the value:
+# * STORED - a plain attribute set when the book is created
+# * COMPUTED - a property that does a small amount of work
+# * EXPENSIVE - a property that does regex matching, date arithmetic etc, and
+#   in some cases may raise an exception
+STORED = 'stored'
+COMPUTED = 'computed'
+EXPENSIVE = 'expensive'
+
+# type is that of the individual values for multi-valued properties, and None
+# if unknown
+BookProperty = namedtuple('BookProperty', 'name, type, multi_valued, nullable, cost')
+
+# (name, type, multi_valued, nullable, cost) for every public property of Book,
+# including those set as plain attributes in the constructor, which can't be
+# discovered from the class.  Book.property_registry() checks this against
+# the @properties that the class actually has.
+BOOK_PROPERTY_DETAILS = [
+    ('title', str, False, False, STORED),
+    ('author', str, False, False, STORED),
+    ('originally_published_year', int, False, True, STORED),
+    ('raw_publisher', str, False, False, STORED),
+    ('publisher', str, False, False, STORED),
+    ('year_published', int, False, True, STORED),
+    ('isbn', str, False, True, STORED),
+    ('isbn13', str, False, True, STORED),
+    ('pagination', int, False, True, STORED),
+    ('format', str, False, False, STORED),
+    ('average_rating', Decimal, False, False, STORED),
+    ('book_id', int, False, False, STORED),
+    ('status', str, False, False, STORED),
+    ('rating', int, False, True, STORED),
+    ('date_added', date, False, True, STORED),
+    ('date_read', date, False, True, STORED),
+    ('read_count', int, False, False, STORED),
+
+    ('is_read', bool, False, False, COMPUTED),
+    ('is_unread', bool, False, False, COMPUTED),
+    ('year_read', int, False, True, COMPUTED),
+    ('month_read', str, False, True, COMPUTED),
+    ('year_added', int, False, False, COMPUTED),
+    ('month_added', str, False, False, COMPUTED),
+    ('clean_title', str, False, False, EXPENSIVE),
+    ('series', str, False, True, EXPENSIVE),
+    ('volume_number', str, False, True, EXPENSIVE),
+    ('pagination_range', str, False, True, COMPUTED),
+    ('year', int, False, True, COMPUTED),
+    ('decade', str, False, False, COMPUTED),
+    ('rating_as_stars', str, False, False, COMPUTED),
+    ('padded_rating_as_stars', str, False, False, COMPUTED),
+    ('rating_difference_from_average', Decimal, False, True, COMPUTED),
+    ('days_on_tbr_pile', int, False, False, EXPENSIVE),
+    ('additional_authors', str, True, False, EXPENSIVE),
+    ('all_authors', str, True, False, EXPENSIVE),
+    ('shelves', str, True, False, EXPENSIVE),
+    ('user_shelves', str, True, False, EXPENSIVE),
+    ('goodreads_url', str, False, False, COMPUTED),
+    ('markdown', str, False, False, EXPENSIVE)
+]
+
+
 class NotOwnedAtSpecifiedDateError(Exception):
     pass
 
@@ -379,8 +490,7 @@ class Book(object):
         ret.extend(self.additional_authors)
         return ret
 
-    @property
-    def shelves(self):
+    def _calculate_shelves(self, is_read):
         s = []
         if not self._raw_shelves:
             self._warn('%s is not shelved anywhere' % (self.title))
@@ -390,10 +500,14 @@ class Book(object):
         # There seems to be a bug in the exported data, whereby 'to-read'
         # and 'currently-reading' are in the shelves column, but 'read'
         # isn't - so we patch it here
-        if self.is_read and 'read' not in s:
+        if is_read and 'read' not in s:
             s.append('read')
         return s
 
+    @property
+    def shelves(self):
+        return self._calculate_shelves(self.is_read)
+
     @property
     def user_shelves(self):
         """
@@ -429,10 +543,28 @@ class Book(object):
         # Use of sorted() is for normalization
         return tuple(sorted(self.property_as_sequence(property_name)))
 
-    def _properties(self):
-        public_prop_names = [z for z in dir(self) if not z.startswith('_')]
-        public_props = [(z, getattr(self, z)) for z in public_prop_names]
-        return [z[0] for z in public_props if not hasattr(z[1], '__call__')]
+    @classmethod
+    @lru_cache(maxsize=None)
+    def property_registry(cls):
+        """
+        Return a read-only dict mapping the names of the public properties of
+        the class to BookProperty details, in alphabetical order.  This is
+        only worked out once, and doesn't require an instance of the class, or
+        evaluate any properties.
+        """
+        registry = dict((z[0], BookProperty(*z)) for z in BOOK_PROPERTY_DETAILS)
+        for klass in cls.__mro__:
+            for name, val in vars(klass).items():
+                if isinstance(val, property) and not name.startswith('_') and \
+                   name not in registry:
+                    # Presumably added without updating BOOK_PROPERTY_DETAILS
+                    registry[name] = BookProperty(name, None, False, True,
+                                                  EXPENSIVE)
+        return MappingProxyType(dict((z, registry[z]) for z in sorted(registry)))
+
+    @classmethod
+    def _properties(cls):
+        return list(cls.property_registry())
 
 
     def patch(self, patchset):
@@ -466,14 +598,20 @@ class Book(object):
                                         self.status)
 
     def custom_format(self, format):
-        # This rewriting of tokens is ugly, but I don't know a better way
-        # (Can't use .format_map(vars(self)) as that doesn't support calculated
-        #  @properties)
-        fmt = format.replace('{', '{0.')
-        return fmt.format(self)
+        # Can't use .format_map(vars(self)) as that doesn't support calculated
+        # @properties, hence the tokens are compiled into attribute lookups
+        return compile_custom_format(format)(self)
 
     @property
     def markdown(self):
         # Convenience property to save typing on custom_format() etc
         return '%s - [%s](%s)' % (self.author, self.clean_title,
                                   self.goodreads_url)
+
+
+def book_property(property_name):
+    """
+    Return the BookProperty details for the named property of Book, or None
+    if there is no such property (e.g. when working with mock books)
+    """
+    return Book.property_registry().get(property_name)
@@ -6,8 +6,10 @@ Library to output colo(u)rized text at any point across a canvas.
 in ~20 years...)
 """
 
-from collections import namedtuple
+from array import array
+from collections import namedtuple, defaultdict
 import logging
+import sys
 
 try:
     from colorama import Fore, Back, Style
@@ -22,6 +24,10 @@ except ImportError:
 
 COLORAMA_RESET = Fore.RESET + Back.RESET + Style.RESET_ALL
 
+# When rendering to a stream, rows are accumulated until they amount to at
+# least this many bytes, and then written in one go
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+
 # roygbiv-ish
 FG_RAINBOW = [Fore.LIGHTRED_EX, Fore.RED, Fore.LIGHTYELLOW_EX,
               Fore.LIGHTGREEN_EX, Fore.LIGHTCYAN_EX, Fore.BLUE,
@@ -36,7 +42,13 @@ ColourTextObject = namedtuple('ColourTextObject', 'fg, bg, style, text')
 class ColoramaCanvas(object):
 
     def __init__(self, width, height, x_padding=0, y_padding=0,
-                 output_function=print):
+                 output_function=print, stream=None,
+                 stream_chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        """
+        If stream (a binary file-like object e.g. sys.stdout.buffer) is
+        specified, render() writes UTF-8 encoded chunks of rows to that,
+        rather than calling output_function for every row.
+        """
 
         self.width = width
         self.height = height
@@ -45,6 +57,8 @@ class ColoramaCanvas(object):
         self.y_padding = y_padding
 
         self.output_function = output_function
+        self.stream = stream
+        self.stream_chunk_size = stream_chunk_size
 
         self.create_empty_canvas()
         self.move_to(0, 0)
@@ -55,42 +69,92 @@ class ColoramaCanvas(object):
 
 
     def create_empty_canvas(self):
-        # Note that the 2-d arrays are stored in order (y, x) rather than
-        # (x, y) - this is a fairly arbitrary decision, based on simplicity
-        # of render() method
-        self.chars = [ [' ' for x in range(self.width)]
-                              for y in range(self.height)]
-        self.fg = [ [None for x in range(self.width)]
-                              for y in range(self.height)]
-        self.bg = [ [None for x in range(self.width)]
-                              for y in range(self.height)]
-        self.style = [ [Style.RESET_ALL for x in range(self.width)]
-                              for y in range(self.height)]
+        # The canvas is stored as two flat, preallocated buffers in row order
+        # (i.e. cell (x, y) is at index (y * width) + x):
+        # * chars - one character per cell
+        # * attrs - one small integer per cell, which is an index into
+        #   self.palette, a list of the distinct (style, fg, bg) tuples used
+        #   on this canvas
+        # This is much cheaper to allocate than a list-of-lists for each
+        # attribute, and means that printing a string is a slice assignment.
+        self.palette = []
+        self._palette_ids = {}
+        blank_attr_id = self._intern_attrs((Style.RESET_ALL, None, None))
+        self.chars = [' '] * (self.width * self.height)
+        self.attrs = array('H', [blank_attr_id]) * (self.width * self.height)
+
+    def _intern_attrs(self, attrs):
+        """Return the palette index for a (style, fg, bg) tuple"""
+        try:
+            return self._palette_ids[attrs]
+        except KeyError:
+            self.palette.append(attrs)
+            attr_id = len(self.palette) - 1
+            self._palette_ids[attrs] = attr_id
+            return attr_id
+
+    def get_cell(self, x, y):
+        """Return (char, style, fg, bg) for a cell - mainly for testing/debugging"""
+        i = (y * self.width) + x
+        return (self.chars[i],) + self.palette[self.attrs[i]]
 
     def reset_style(self):
         self.current_fg = Fore.RESET
         self.current_bg = Back.RESET
         self.current_style = Style.RESET_ALL
 
-    def _output(self, text, x=None, y=None):
+    def _start_index(self, text, x=None, y=None):
+        """
+        Return the index into the flat buffers at which text should be output,
+        raising an IndexError if it wouldn't fit
+        """
         if x is None:
             x = self.cursor_x
         if y is None:
             y = self.cursor_y
 
-        for i, ch in enumerate(text):
-            try:
-                self.chars[y][x + i] = ch
-            except IndexError as err:
-                logging.error('Cannot print "%s" at (%d,%d) in %dx%d canvas' %
-                              (ch, x, y, self.width, self.height))
-                raise(err)
-            if self.current_fg:
-                self.fg[y][x + i] = self.current_fg
-            if self.current_bg:
-                self.bg[y][x + i] = self.current_bg
-            if self.current_style:
-                self.style[y][x + i] = self.current_style
+        if y < 0:
+            y += self.height # Same as the old list-of-lists indexing
+        if x < 0 or x + len(text) > self.width or not 0 <= y < self.height:
+            logging.error('Cannot print "%s" at (%d,%d) in %dx%d canvas' %
+                          (text, x, y, self.width, self.height))
+            raise IndexError('(%d,%d) is outside %dx%d canvas' %
+                             (x, y, self.width, self.height))
+        return (y * self.width) + x
+
+    def _merged_attr_id(self, old_id, remapped_ids):
+        """
+        Return the palette index for the attributes at old_id overlaid with
+        whichever of the current ones are set.  remapped_ids is a dict used
+        to memoize this over a single output.
+        """
+        try:
+            return remapped_ids[old_id]
+        except KeyError:
+            style, fg, bg = self.palette[old_id]
+            new_id = self._intern_attrs((self.current_style or style,
+                                         self.current_fg or fg,
+                                         self.current_bg or bg))
+            remapped_ids[old_id] = new_id
+            return new_id
+
+    def _output(self, text, x=None, y=None):
+        start = self._start_index(text, x, y)
+        end = start + len(text)
+        self.chars[start:end] = text
+
+        if self.current_style and self.current_fg and self.current_bg:
+            # Fast path - every attribute is being set, so the existing ones
+            # are irrelevant
+            attr_id = self._intern_attrs((self.current_style, self.current_fg,
+                                          self.current_bg))
+            self.attrs[start:end] = array('H', [attr_id]) * len(text)
+        elif self.current_style or self.current_fg or self.current_bg:
+            # Only overwrite the attributes that are set, keeping the others
+            # from whatever was there before
+            remapped_ids = {}
+            for i in range(start, end):
+                self.attrs[i] = self._merged_attr_id(self.attrs[i], remapped_ids)
 
 
     def print_at(self, x, y, text):
@@ -113,20 +177,73 @@ class ColoramaCanvas(object):
         self.cursor_x = x
         self.cursor_y = y
 
+    def _escape_codes(self):
+        """Return a list of the escape codes for each entry in the palette"""
+        return ['%s%s%s' % (style or Style.RESET_ALL, fg or '', bg or '')
+                for style, fg, bg in self.palette]
+
+    def _runs(self, y):
+        """
+        Yield (palette index, text) tuples for the runs of characters in row y
+        that share the same attributes
+        """
+        start = y * self.width
+        end = start + self.width
+        attrs = self.attrs
+        run_start = start
+        for i in range(start + 1, end + 1):
+            if i == end or attrs[i] != attrs[run_start]:
+                yield attrs[run_start], ''.join(self.chars[run_start:i])
+                run_start = i
+
+    def _render_line(self, y, escape_codes=None):
+        """
+        Return row y of the canvas as a string.  Escape codes are only output
+        when the attributes change from the previous character, rather than
+        for every character, which makes a big difference to the size of the
+        output on large, mostly blank or mostly uniform, canvases.  Note that
+        all 3 attributes are output on any change, as Style.RESET_ALL resets
+        the colours as well.
+        """
+        if escape_codes is None:
+            escape_codes = self._escape_codes()
+        return ''.join('%s%s' % (escape_codes[attr_id], text)
+                       for attr_id, text in self._runs(y))
+
+    def _write_lines_to_stream(self, lines):
+        """
+        Write lines to self.stream, batching them up so that there is one
+        write() per chunk of rows rather than one per row
+        """
+        sys.stdout.flush() # In case anything has been print()ed already
+        chunk = []
+        chunk_size = 0
+        for line in lines:
+            encoded = line.encode('utf-8') + b'\n'
+            chunk.append(encoded)
+            chunk_size += len(encoded)
+            if chunk_size >= self.stream_chunk_size:
+                self.stream.write(b''.join(chunk))
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            self.stream.write(b''.join(chunk))
+
+    def _padded_lines(self):
+        escape_codes = self._escape_codes()
+        for y in range(self.height):
+            yield '%s%s%s' % (' ' * self.x_padding,
+                              self._render_line(y, escape_codes),
+                              ' ' * self.x_padding)
+
     def render(self):
         for _ in range(self.y_padding):
             self.print_reset()
-        for y in range(self.height):
-            bits = []
-            for x in range(self.width):
-                fg = self.fg[y][x] or ''
-                bg = self.bg[y][x] or ''
-                style = self.style[y][x] or Style.RESET_ALL
-                bits.append('%s%s%s%s' % (style, fg, bg, self.chars[y][x]))
-            line = '%s%s%s' % (' ' * self.x_padding,
-                               ''.join(bits),
-                               ' ' * self.x_padding)
-            self.output_function(line)
+        if self.stream is not None:
+            self._write_lines_to_stream(self._padded_lines())
+        else:
+            for line in self._padded_lines():
+                self.output_function(line)
         self.reset_style()
         for _ in range(self.y_padding):
             self.print_reset()
@@ -138,7 +255,82 @@ class ColoramaCanvas(object):
         self.output_function(chr(27) + '[2J')
 
     def finish(self):
-        print(COLORAMA_RESET)
+        if self.stream is not None:
+            self.stream.write(COLORAMA_RESET.encode('utf-8') + b'\n')
+            self.stream.flush()
+        else:
+            print(COLORAMA_RESET)
+
+
+class SparseColoramaCanvas(ColoramaCanvas):
+    """
+    A canvas that only stores the cells that have been printed to, for
+    charts such as scatter plots where most of the canvas is blank.
+    Memory use is proportional to the amount of text printed, rather than
+    to width * height.
+
+    Cells are held in self.rows, a dict mapping y to a dict mapping x to
+    (char, palette index).
+    """
+
+    def create_empty_canvas(self):
+        self.palette = []
+        self._palette_ids = {}
+        self.blank_attr_id = self._intern_attrs((Style.RESET_ALL, None, None))
+        self.rows = defaultdict(dict)
+
+    def get_cell(self, x, y):
+        ch, attr_id = self.rows.get(y, {}).get(x, (' ', self.blank_attr_id))
+        return (ch,) + self.palette[attr_id]
+
+    def _output(self, text, x=None, y=None):
+        y, x = divmod(self._start_index(text, x, y), self.width)
+        row = self.rows[y]
+
+        remapped_ids = {}
+        for x, ch in enumerate(text, x):
+            _, old_id = row.get(x, (' ', self.blank_attr_id))
+            attr_id = self._merged_attr_id(old_id, remapped_ids)
+            if ch == ' ' and attr_id == self.blank_attr_id:
+                row.pop(x, None)
+            else:
+                row[x] = (ch, attr_id)
+
+    def _runs(self, y):
+        row = self.rows.get(y, {})
+        run_attr_id = None
+        run_text = []
+        next_x = 0
+        for x in sorted(row) + [self.width]:
+            if x > next_x:
+                # A gap of blank cells
+                if run_attr_id != self.blank_attr_id:
+                    if run_text:
+                        yield run_attr_id, ''.join(run_text)
+                    run_attr_id, run_text = self.blank_attr_id, []
+                run_text.append(' ' * (x - next_x))
+            if x < self.width:
+                ch, attr_id = row[x]
+                if attr_id != run_attr_id:
+                    if run_text:
+                        yield run_attr_id, ''.join(run_text)
+                    run_attr_id, run_text = attr_id, []
+                run_text.append(ch)
+            next_x = x + 1
+        if run_text:
+            yield run_attr_id, ''.join(run_text)
+
+
+def default_output_stream():
+    """
+    Return the stream that canvases should render to: stdout's underlying
+    binary buffer if the output is being piped or redirected (where the
+    chunked writes are considerably faster for large charts), or None,
+    meaning render line-by-line via print(), for an interactive terminal.
+    """
+    if sys.stdout.isatty():
+        return None
+    return getattr(sys.stdout, 'buffer', None)
 
 
 if __name__ == '__main__':
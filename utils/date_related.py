@@ -3,6 +3,9 @@
 Date helper functions
 """
 
+from calendar import monthrange
+from datetime import date
+
 #MONTH_LETTERS = [None,'J', 'F', 'M', 'A', 'M', 'J',
 #                 'J', 'A', 'S', 'O', 'N', 'D']
 MONTH_ABBREVIATIONS = [None,
@@ -51,3 +54,17 @@ def pad_month_list_as_tuples(months):
 
 def pad_month_list_as_strings(months):
     return pad_month_list(months, formatter=monthstring)
+
+def month_end_dates(start_date, end_date):
+    """
+    Yield the date of the last day of each month from that of start_date
+    up to (but not including) that of end_date, followed by end_date itself
+    """
+    y, m = start_date.year, start_date.month
+    while (y, m) < (end_date.year, end_date.month):
+        yield date(y, m, monthrange(y, m)[1])
+        if m == 12:
+            y, m = y + 1, 1
+        else:
+            m += 1
+    yield end_date
@@ -1,81 +1,71 @@
 #!/usr/bin/env python3
 
+from collections import defaultdict
+from functools import lru_cache
 import json
 
 from utils.colorama_canvas import Fore, Back, Style
 
 DEFAULT_BAR_WIDTH = 50
+
+# https://en.wikipedia.org/wiki/Block_Elements
+UNICODE_BAR_CHARS = (None,    # 0 is not valid
+                     u'\u2582', # Lower one quarter block
+                     u'\u2583', # Lower three eighths block
+                     u'\u2584', # Lower half block
+                     u'\u2585', # Lower five eights block
+                     u'\u2586') # Lower three quarters block
+ASCII_BAR_CHARS = (None, '1', '2', '3', '4', '5')
+BAR_COLOURS = (None,    # 0 is not a valid rating
+               Fore.LIGHTYELLOW_EX,
+               Fore.LIGHTGREEN_EX,
+               Fore.LIGHTCYAN_EX,
+               Fore.LIGHTBLUE_EX,
+               Fore.LIGHTMAGENTA_EX)
+
+# (use_unicode, use_colour) => tuple of (colour on, char, colour off) for
+# each rating
+BAR_SEGMENT_TABLES = dict(
+    ((use_unicode, use_colour),
+     tuple((BAR_COLOURS[i] if use_colour else '',
+            (UNICODE_BAR_CHARS if use_unicode else ASCII_BAR_CHARS)[i],
+            Style.RESET_ALL if use_colour else '') for i in range(1, 6)))
+    for use_unicode in (False, True) for use_colour in (False, True))
+
 def render_ratings_as_bar(ratings, width=DEFAULT_BAR_WIDTH,
                           use_unicode=True, use_colour=True):
     """
     Given a list of star-rating counts, return a string of desired length
     representing the distribution of ratings.
-    """
-
-    def unicode_bar_mapper(num):
-        # https://en.wikipedia.org/wiki/Block_Elements
-        # https://en.wikipedia.org/wiki/Block_Elements
-        return [None,    # 0 is not valid
-                u'\u2582', # Lower one quarter block
-                u'\u2583', # Lower three eighths block
-                u'\u2584', # Lower half block
-                u'\u2585', # Lower five eights block
-                u'\u2586'][num] # Lower three quarters block
-
-    char_mapper = unicode_bar_mapper if use_unicode else str
-
-    def colour_mapper(num):
-        if use_colour:
-            return ([None,    # 0 is not a valid rating
-                     Fore.LIGHTYELLOW_EX,
-                     Fore.LIGHTGREEN_EX,
-                     Fore.LIGHTCYAN_EX,
-                     Fore.LIGHTBLUE_EX,
-                     Fore.LIGHTMAGENTA_EX][num], Style.RESET_ALL)
-        else:
-            return ('', '')
 
-    # Note: this feels somewhat overdone - I'd not be in the least bit
-    #       surprised if there's a far simpler implementation.
-
-    total = sum(ratings[1:]) # Skip 0th item as we don't have 0 scores
-
-    def calculate_bar_width_for_rating(rating):
-        return ratings[rating] * (width/total)
-
-    bar_vals = [calculate_bar_width_for_rating(z) for z in range(1,6)]
-
-    # Note from this point onwards we switch to 5 element arrays, element 0
-    # is for 1-star, etc
+    The bars are cached, as reports such as BestRankedReport tend to render
+    many identical ones.
+    """
+    return _render_ratings_as_bar(tuple(ratings[1:6]), width,
+                                  use_unicode, use_colour)
 
-    # Get the fractional part of the bars
-    bar_scores = [(i, z - int(z)) for i, z in enumerate(bar_vals)]
+@lru_cache(maxsize=4096)
+def _render_ratings_as_bar(ratings, width, use_unicode, use_colour):
+    # Note that unlike in the public function, ratings is 5 elements, element
+    # 0 is for 1-star, etc
 
-    # Work out the priority of which elements  we should increment to reach
-    # the target width
-    sorted_bar_scores = sorted(bar_scores, key=lambda z: -z[1])
+    total = sum(ratings)
+    bar_vals = [z * (width/total) for z in ratings]
 
+    # Work out the priority of which elements we should increment to reach
+    # the target width, biggest fractional part first (sorted() is stable,
+    # so equal fractions are in rating order)
+    increment_order = sorted(range(5), key=lambda i: int(bar_vals[i]) - bar_vals[i])
 
-    # Regenerate the "base" integer values
+    # Regenerate the "base" integer values, then increment the priority
+    # elements to reach the target width
     bar_vals = [int(z) for z in bar_vals]
+    for i in increment_order[:width - sum(bar_vals)]:
+        bar_vals[i] += 1
 
-    # Now increment the priority elements to reach the target width
-    for i in range(width - sum(bar_vals)):
-        bar_vals[ sorted_bar_scores[i][0] ] += 1
-
-
-    def stringbit2(rating, qty):
-        col_on, col_off = colour_mapper(rating)
-        return '%s%s%s' % (col_on, char_mapper(rating) * qty, col_off)
-
-    # Note the increment-by-1 here, because the colour and character lists
-    # have a "dummy" 0-th element
-    bits = [stringbit2(i+1, z) for i, z in enumerate(bar_vals)]
-
-    return ''.join(bits)
-
-
-
+    segments = BAR_SEGMENT_TABLES[(use_unicode, use_colour)]
+    return ''.join(['%s%s%s' % (col_on, ch * qty, col_off)
+                    for (col_on, ch, col_off), qty in zip(segments, bar_vals)])
 
 
 COLOUR_MAPPINGS = {
@@ -130,6 +120,12 @@ class ColourConfig(object):
 
     def select_category(self, category):
         self.category = category
+        # The rules for the category are only compiled when first needed, as
+        # the category isn't known when this object is created from the
+        # command-line arguments
+        self._rules = None
+        self._rule_indices = None
+        self._cached_colour_bits = lru_cache(maxsize=1024)(self._resolve_colour_bits)
         return self
 
     @property
@@ -137,34 +133,67 @@ class ColourConfig(object):
         cfg = self.colour_cfg['categories'][self.category]
         return cfg['width']
 
-    def get_colour_bits(self, shelf_tuple):
+    def _compile_rules(self):
+        """
+        Translate the mappings for the current category into colorama codes
+        once, and index them by shelf (or whatever the rule matches on), so
+        that resolving the colours for a book only has to look at the rules
+        that are relevant to it.
+        """
         cfg = self.colour_cfg['categories'][self.category]
-
-        fore = Fore.WHITE
-        back = Back.LIGHTBLACK_EX
-        style = ''
-        ch = DEFAULT_CHAR * self.item_width
+        self._rules = []
+        self._rule_indices = defaultdict(list)
+        for i, (colour_rule, values) in enumerate(cfg['mappings']):
+            translated = {}
+            if 'fg' in values:
+                translated['fg'] = translate_colour(values['fg'], Fore)
+            if 'bg' in values:
+                translated['bg'] = translate_colour(values['bg'], Back)
+            if 'st' in values:
+                # Historically the presence of 'st' triggered use of the value
+                # of 'style'; accept the value being in either
+                translated['st'] = translate_style(values.get('style', values['st']))
+            if 'ch' in values:
+                translated['ch'] = translate_char(values['ch'])
+            self._rules.append((colour_rule, translated))
+            self._rule_indices[colour_rule].append(i)
+
+    def _resolve_colour_bits(self, shelf_tuple):
+        """
+        Return a tuple of ((fore, back, style, ch), colour guide key, blob)
+        """
+        if self._rules is None:
+            self._compile_rules()
+
+        bits = {
+            'fg': Fore.WHITE,
+            'bg': Back.LIGHTBLACK_EX,
+            'st': '',
+            'ch': DEFAULT_CHAR * self.item_width
+        }
         used_bits = {}
-        for colour_rule, values in cfg['mappings'][::-1]:
-            if colour_rule in shelf_tuple:
-                if 'fg' in values:
-                    fore = translate_colour(values['fg'], Fore)
-                    used_bits['fg'] = colour_rule
-                if 'bg' in values:
-                    back = translate_colour(values['bg'], Back)
-                    used_bits['bg'] = colour_rule
-                if 'st' in values:
-                    style = translate_style(values['style'])
-                    used_bits['st'] = colour_rule
-                if 'ch' in values:
-                    ch = translate_char(values['ch'])
-                    used_bits['ch'] = colour_rule
-        blob_bits = (fore, back, style, ch)
-        blob = self._blobbify(blob_bits)
-
+        matching_indices = set()
+        for shelf in shelf_tuple:
+            matching_indices.update(self._rule_indices.get(shelf, []))
+        # Rules earlier in the config take priority, so apply them last
+        for i in sorted(matching_indices, reverse=True):
+            colour_rule, translated = self._rules[i]
+            for bit_name, val in translated.items():
+                bits[bit_name] = val
+                used_bits[bit_name] = colour_rule
+
+        blob_bits = (bits['fg'], bits['bg'], bits['st'], bits['ch'])
         relevant_shelves = sorted(set(used_bits.values()))
-        self.colour_guide[' / '.join(relevant_shelves)] = blob
+        return blob_bits, ' / '.join(relevant_shelves), self._blobbify(blob_bits)
 
+    def get_colour_bits(self, shelf_tuple):
+        """
+        Return a (fore, back, style, ch) tuple for shelf_tuple (which should
+        be a tuple, as the results are cached on it), noting the colours used
+        in self.colour_guide
+        """
+        blob_bits, guide_key, blob = self._cached_colour_bits(shelf_tuple)
+        self.colour_guide[guide_key] = blob
         return blob_bits
 
     def _blobbify(self, blob_bits):
@@ -11,7 +11,8 @@ import pdb
 import re
 import sys
 
-from utils.book import Book, date_from_string, NotOwnedAtSpecifiedDateError
+from utils.book import Book, book_property, date_from_string, \
+    NotOwnedAtSpecifiedDateError
 from utils.patches import load_patches
 
 # Q: Does this affect logging behaviour in other modules?  (I tried setting
@@ -46,27 +47,42 @@ def create_shelf_filter(filter_string):
 
     return fltr
 
+def _cast_filter_value(type_to_cast_to, string_value):
+    # TODO: something similar for boolean properties, although
+    # we also need to change the comparisons below from = to is...
+    if type_to_cast_to == date:
+        return date_from_string(string_value)
+    else:
+        return type_to_cast_to(string_value)
+
 def create_comparison_filter(property, comparison, string_value):
     # Note that we don't support value/comparison/property order for filter
     # command line arguments
 
+    # If this is a known Book property, the value can be converted to the
+    # appropriate type up front, rather than inferring the type from the value
+    # of every book
+    details = book_property(property)
+    if details and details.type:
+        known_value = _cast_filter_value(details.type, string_value)
+    else:
+        known_value = None
+
     def fltr(bk):
-        actual_val = getattr(bk, property)
         # Strictly speaking the "plural" vals version is unnecessary here,
         # because the only property that can have multiple values is shelves,
         # and that is supported by create_shelf_filter() and omitting any
         # property name and comparison operator.  However, it may be more user
         # friendly to support '-f user_shelves = non-fiction'?
         actual_vals = bk.property_as_sequence(property)
+        # Not [0], as multi-valued properties can be sets e.g. user_shelves
+        first_val = next(iter(actual_vals), None)
 
-        if actual_vals and actual_vals[0]:
-            type_to_cast_to = type(actual_vals[0])
-            # TODO: something similar for boolean properties, although
-            # we also need to change the comparisons below from = to is...
-            if type_to_cast_to == date:
-                value = date_from_string(string_value)
+        if first_val:
+            if known_value is not None:
+                value = known_value
             else:
-                value = type_to_cast_to(string_value)
+                value = _cast_filter_value(type(first_val), string_value)
         else:
             # Typically this will be on books where the relevant  property is None
             # e.g. missing pagination in the data export, rating or read_date on
@@ -74,7 +90,7 @@ def create_comparison_filter(property, comparison, string_value):
             # TODO (probably): downgrade to warning
             logging.error("Unable to compare %s %s %s %s for %s - ignoring" %
                             (property, string_value, comparison,
-                             actual_val, bk.title))
+                             getattr(bk, property), bk.title))
             return False
 
         if comparison in ('=', '=='):
@@ -91,7 +107,9 @@ def create_comparison_filter(property, comparison, string_value):
                 if re.search(value, av, re.IGNORECASE):
                     return False
             return True
-        elif comparison == '>':
+
+        actual_val = getattr(bk, property)
+        if comparison == '>':
             return actual_val > value
         elif comparison in ('>=', '=>'):
             return actual_val >= value
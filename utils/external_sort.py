@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Sort more items than can comfortably be held in memory, by sorting them in
+chunks, spilling each sorted chunk ("run") to a temporary file, and then
+doing a k-way merge of the runs.
+
+This is intended for very large exports - e.g. several users' exports merged
+together - where holding every Book object, plus its sort key, in memory for
+sorted() is a problem.  For anything else, plain sorted() is faster.
+"""
+
+from heapq import merge
+import pickle
+from tempfile import TemporaryFile
+
+DEFAULT_CHUNK_SIZE = 100000
+
+# Items are pickled in batches of this many, rather than individually, as
+# the per-pickle overhead is considerable
+PICKLE_BATCH_SIZE = 1000
+
+
+def _write_run(sorted_records, batch_size=PICKLE_BATCH_SIZE):
+    """
+    Write a sorted list of records to a new temporary file, returning the
+    (open, rewound) file
+    """
+    run_file = TemporaryFile()
+    for i in range(0, len(sorted_records), batch_size):
+        pickle.dump(sorted_records[i:i + batch_size], run_file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0)
+    return run_file
+
+
+def _read_run(run_file):
+    """Yield the records from a file created by _write_run(), then close it"""
+    try:
+        while True:
+            try:
+                batch = pickle.load(run_file)
+            except EOFError:
+                break
+            yield from batch
+    finally:
+        run_file.close()
+
+
+class ExternalSorter(object):
+    """
+    Equivalent to sorted(items, key=key), except that at most chunk_size
+    items are held in memory at once while sorting, and the items are
+    iterated over from the merge of the runs, rather than being returned as
+    a list.  As with sorted(), the sort is stable.
+
+    Items and the keys must be picklable.  The items are consumed when the
+    object is created, and it can only be iterated over once.  len() is the
+    number of items, which is available before iterating.
+    """
+
+    def __init__(self, items, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.key = key
+        self.chunk_size = chunk_size
+        self.run_files = []
+        self.count = 0
+        self._final_run = self._spill_runs(items)
+
+    def _spill_runs(self, items):
+        """
+        Sort items in chunks, writing each full chunk to a temporary file,
+        and returning the sorted final (possibly partial) chunk
+        """
+        chunk = []
+        for item in items:
+            # The sequence number keeps the sort stable, and means that items
+            # with equal keys never get compared themselves
+            chunk.append((self.key(item), self.count, item))
+            self.count += 1
+            if len(chunk) >= self.chunk_size:
+                chunk.sort()
+                self.run_files.append(_write_run(chunk))
+                chunk = []
+        chunk.sort()
+        return chunk
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        runs = [_read_run(z) for z in self.run_files]
+        runs.append(self._final_run)
+        self.run_files = []
+        self._final_run = []
+        for _, _, item in merge(*runs):
+            yield item
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Engine for grouping books by some key, and aggregating one or more metrics
+for each group e.g. the average page count by decade, or the number, total
+and distribution of ratings by author.
+
+Keys and metrics can either be the name of a Book property, or a function
+that takes a Book and returns the value.  Keys can be scalar (e.g. decade) or
+multi-valued (e.g. shelves), in which case the book's metrics are added to
+the group for each of the values.  How to get the key(s) and metrics from a
+book is worked out once, when the GroupBy is created, rather than for every
+book.
+"""
+
+from collections import Counter
+from collections.abc import Hashable
+import math
+from operator import attrgetter
+
+from utils.book import book_property
+
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'stddev', 'median')
+
+
+class MetricAccumulator(object):
+    """
+    Running aggregates of the values of a single metric for a single group.
+    Medians need the distribution of values i.e. how many times each value
+    occurred, which is only kept if track_distribution is set.
+    """
+
+    __slots__ = ('count', 'sum', 'min', 'max', '_mean', '_m2', 'value_counts')
+
+    def __init__(self, track_distribution=False):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        # For Welford's algorithm, which gives a numerically stable standard
+        # deviation in a single pass
+        self._mean = 0
+        self._m2 = 0
+        self.value_counts = Counter() if track_distribution else None
+
+    def add(self, val):
+        self.count += 1
+        self.sum += val
+        if self.min is None or val < self.min:
+            self.min = val
+        if self.max is None or val > self.max:
+            self.max = val
+        delta = val - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (val - self._mean)
+        if self.value_counts is not None:
+            self.value_counts[val] += 1
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    @property
+    def stddev(self):
+        """The population standard deviation"""
+        if not self.count:
+            return None
+        return math.sqrt(self._m2 / self.count)
+
+    @property
+    def median(self):
+        if self.value_counts is None:
+            raise ValueError('Median requires the distribution to be tracked')
+        if not self.count:
+            return None
+        # Find the middle value(s) by walking through the distinct values in
+        # order, which is much less work than sorting all the values for
+        # metrics with only a few possible values, such as ratings
+        lower_index = (self.count - 1) // 2
+        upper_index = self.count // 2
+        lower = None
+        seen = 0
+        for val, qty in sorted(self.value_counts.items()):
+            seen += qty
+            if lower is None and seen > lower_index:
+                lower = val
+            if seen > upper_index:
+                return (lower + val) / 2 if lower != val else val
+
+    def aggregate(self, name):
+        if name not in AGGREGATES:
+            raise ValueError('Unknown aggregate "%s"' % (name))
+        return getattr(self, name)
+
+
+def _metric_name(metric):
+    return metric if isinstance(metric, str) else metric.__name__
+
+
+def _key_function(key, multi_valued):
+    """
+    Return a function that takes a book and returns an iterable of its
+    key(s).  If multi_valued is None, it's taken from the Book property
+    registry, or failing that (e.g. for functions), decided for each book on
+    the basis of whether the value can be a dict key or not.
+    """
+    getter = key if callable(key) else attrgetter(key)
+    if multi_valued is None and not callable(key):
+        details = book_property(key)
+        if details:
+            multi_valued = details.multi_valued
+
+    if multi_valued:
+        return getter
+    elif multi_valued is not None:
+        return lambda book: (getter(book),)
+
+    def keys_for_book(book):
+        keys = getter(book)
+        # Anything that can't be a dict key (e.g. a list of shelves) is
+        # assumed to be a collection of keys
+        return (keys,) if isinstance(keys, Hashable) else keys
+    return keys_for_book
+
+
+class GroupBy(object):
+    """
+    Group books by key, accumulating the values of each of metrics.
+
+    The first of metrics is the primary one: books where that is None are
+    skipped, or, if missing_value_key is specified, counted with a value of
+    zero in that group instead, regardless of their key(s).  Books where
+    the other metrics are None are still counted for the primary metric.
+
+    Metrics named in distributions have the distribution of their values
+    tracked, which is needed for medians.
+    """
+
+    def __init__(self, key, metrics, multi_valued=None,
+                 ignore_undefined_keys=False, missing_value_key=None,
+                 distributions=()):
+        self.key_function = _key_function(key, multi_valued)
+        self.metric_names = [_metric_name(z) for z in metrics]
+        self.metric_getters = [z if callable(z) else attrgetter(z) for z in metrics]
+        self.tracked = [z in distributions for z in self.metric_names]
+        self.ignore_undefined_keys = ignore_undefined_keys
+        self.missing_value_key = missing_value_key
+        self.groups = {} # key => list of MetricAccumulator, one per metric
+
+    def _group(self, key):
+        try:
+            return self.groups[key]
+        except KeyError:
+            accumulators = [MetricAccumulator(z) for z in self.tracked]
+            self.groups[key] = accumulators
+            return accumulators
+
+    def add(self, book):
+        vals = [fn(book) for fn in self.metric_getters]
+        if vals[0] is None:
+            if self.missing_value_key is not None:
+                self._group(self.missing_value_key)[0].add(0)
+            return
+        for key in self.key_function(book):
+            if key or not self.ignore_undefined_keys:
+                for acc, val in zip(self._group(key), vals):
+                    if val is not None:
+                        acc.add(val)
+
+    def add_all(self, books):
+        for book in books:
+            self.add(book)
+        return self # For method chaining
+
+    def accumulators(self, metric=None):
+        """
+        Return a dict mapping each key to the MetricAccumulator for the
+        named metric (default: the primary one), in the order the keys
+        were first seen
+        """
+        i = self.metric_names.index(metric) if metric else 0
+        return dict((k, v[i]) for k, v in self.groups.items())
+
+    def aggregate(self, aggregate='mean', metric=None):
+        """Return a dict mapping each key to an aggregate of a metric"""
+        return dict((k, v.aggregate(aggregate))
+                    for k, v in self.accumulators(metric).items())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Memoized author name handling for the check_isfdb_*.py scripts.
+
+Both scripts try to find a book in ISFDB by author and title, trying the
+author name as it appears in Goodreads and then a normalized version of it
+(e.g. "Allen M. Steele" vs "Allen Steele").  Many books share authors, so
+the normalization is done once per distinct name per run, rather than once
+per book.
+
+The normalization function comes from isfdb_tools, which this module doesn't
+import, so it has to be passed to the constructor.
+
+Only the name normalization is memoized.  Resolving authors to ISFDB author
+ids is out of scope, as isfdb_tools' find_book_for_author_and_title() does
+that itself for every lookup.  The (author, title) lookups are only memoized
+if the -k lookup cache (utils.isfdb_cache) is used.
+"""
+
+from collections import Counter
+import logging
+import threading
+
+
+class AuthorResolver(object):
+    """
+    Memoizes normalize_function for each distinct author name.  Despite the
+    name, this doesn't resolve authors to ISFDB ids - see above.
+
+    Hits and misses are tracked in self.stats, a Counter keyed on
+    ('normalize', 'hit'|'miss').
+
+    This is safe to share between the threads of check_isfdb_content.py's
+    parallel mode.
+    """
+
+    def __init__(self, normalize_function):
+        self.normalize_function = normalize_function
+        self.stats = Counter()
+        self._normalized = {}
+        self._lock = threading.Lock()
+
+    def _memoized(self, memo, stat_label, key, func, *args):
+        with self._lock:
+            if key in memo:
+                self.stats[(stat_label, 'hit')] += 1
+                return memo[key]
+            self.stats[(stat_label, 'miss')] += 1
+        # Don't hold the lock whilst doing the (possibly slow) work - the
+        # worst that can happen is that two threads both do it
+        val = func(*args)
+        with self._lock:
+            memo[key] = val
+        return val
+
+    def normalize(self, name):
+        """Return the normalized version of name, or None if there isn't one"""
+        return self._memoized(self._normalized, 'normalize', name,
+                              self.normalize_function, name)
+
+    def author_guesses(self, name):
+        """
+        Return a tuple of the distinct names worth trying for an author in
+        ISFDB lookups, in order of preference i.e. the name as supplied then
+        its normalized version, if that's different
+        """
+        guesses = [name]
+        normalized_name = self.normalize(name)
+        if normalized_name and normalized_name != name:
+            guesses.append(normalized_name)
+        return tuple(guesses)
+
+    def log_stats(self, level=logging.INFO):
+        for (what, outcome), qty in sorted(self.stats.items()):
+            logging.log(level, 'Author %s %s: %d' % (what, outcome, qty))
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Persistent (SQLite-backed) cache of ISFDB lookup results, for use by the
+check_isfdb_*.py scripts.
+
+The ISFDB dump only changes every so often, so there's no point re-querying
+MySQL for the same Goodreads ids, ISBNs or author/title pairs every time those
+scripts are run.  Entries are keyed on an ISFDB dump version as well as the
+lookup itself, so loading a new dump (and passing its version) effectively
+starts a fresh cache.
+
+Negative results - either the lookup function raising the "not found"
+exception, or returning None/an empty value - are cached too, but only for
+negative_ttl seconds, as a book you've just added to ISFDB (or fixed the
+details of on Goodreads) shouldn't stay not-found forever.
+
+This module deliberately doesn't import isfdb_tools, so the "not found"
+exception class has to be passed to the constructor.
+"""
+
+from collections import Counter
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+DEFAULT_NEGATIVE_TTL = 30 * 24 * 60 * 60 # 30 days, in seconds
+
+# Commit after this many writes, rather than after every one
+COMMIT_INTERVAL = 100
+
+# Values for the outcome column
+FOUND = 'found'
+EMPTY = 'empty' # lookup returned None or an empty value
+NOT_FOUND = 'not_found' # lookup raised the not-found exception
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    namespace TEXT NOT NULL,
+    lookup_key TEXT NOT NULL,
+    dump_version TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    value BLOB,
+    cached_at REAL NOT NULL,
+    PRIMARY KEY (namespace, lookup_key, dump_version)
+)
+"""
+
+
+class LookupCache(object):
+    """
+    Wrap lookup functions with cached_call() to have their results cached.
+
+    hits/misses/expired are tracked in self.stats, a Counter keyed on
+    (namespace, 'hit'|'miss'|'expired').
+
+    The underlying SQLite connection is shared between threads (with a lock),
+    so this can be used from the parallel lookup mode of check_isfdb_content.py
+    """
+
+    def __init__(self, filename, not_found_exception, dump_version=None,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.filename = filename
+        self.not_found_exception = not_found_exception
+        self.dump_version = dump_version or ''
+        self.negative_ttl = negative_ttl
+
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    @staticmethod
+    def _key_to_text(key):
+        # Keys are ints, strings or tuples thereof, for which repr() is
+        # deterministic and unambiguous
+        return repr(key)
+
+    def _get(self, namespace, key):
+        """
+        Return (outcome, value) or None if there isn't a current entry
+        """
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT outcome, value, cached_at FROM lookups '
+                'WHERE namespace = ? AND lookup_key = ? AND dump_version = ?',
+                (namespace, self._key_to_text(key), self.dump_version)).fetchone()
+            if row is None:
+                self.stats[(namespace, 'miss')] += 1
+                return None
+            outcome, raw_value, cached_at = row
+            if outcome != FOUND and cached_at + self.negative_ttl < time.time():
+                self.stats[(namespace, 'expired')] += 1
+                return None
+            self.stats[(namespace, 'hit')] += 1
+        return outcome, pickle.loads(raw_value)
+
+    def _put(self, namespace, key, outcome, value):
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO lookups '
+                '(namespace, lookup_key, dump_version, outcome, value, cached_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (namespace, self._key_to_text(key), self.dump_version, outcome,
+                 pickle.dumps(value), time.time()))
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_INTERVAL:
+                self.conn.commit()
+                self._uncommitted = 0
+
+    def cached_call(self, namespace, key, func, *args, **kwargs):
+        """
+        Return func(*args, **kwargs), or the cached result of a previous call
+        with the same namespace and key.  If func raised the not-found
+        exception, then a cached call will raise (a new instance of) it again.
+        """
+        cached = self._get(namespace, key)
+        if cached:
+            outcome, value = cached
+            if outcome == NOT_FOUND:
+                raise self.not_found_exception(value)
+            return value
+
+        try:
+            value = func(*args, **kwargs)
+        except self.not_found_exception as err:
+            self._put(namespace, key, NOT_FOUND, str(err))
+            raise
+        self._put(namespace, key, FOUND if value else EMPTY, value)
+        return value
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def log_stats(self, level=logging.INFO):
+        for (namespace, what), qty in sorted(self.stats.items()):
+            logging.log(level, 'Lookup cache %s %s: %d' % (namespace, what, qty))
+
+
+def cached_lookup(cache, namespace, key, func, *args, **kwargs):
+    """
+    Convenience wrapper so that callers don't have to care whether caching is
+    enabled (cache is a LookupCache) or not (cache is None).
+    """
+    if cache is None:
+        return func(*args, **kwargs)
+    return cache.cached_call(namespace, key, func, *args, **kwargs)
+
+
+def add_cache_arguments(parser):
+    """
+    Add the command-line options for the lookup cache to an ArgumentParser
+    """
+    parser.add_argument('-k', dest='cache_file',
+                        default=os.environ.get('GR_ISFDB_CACHE'),
+                        help='Cache ISFDB lookups in named SQLite file, '
+                        'default=GR_ISFDB_CACHE')
+    parser.add_argument('-K', dest='dump_version',
+                        default=os.environ.get('GR_ISFDB_DUMP_VERSION'),
+                        help='Version (e.g. date) of the ISFDB dump, so that cached '
+                        'lookups from other dumps are ignored, '
+                        'default=GR_ISFDB_DUMP_VERSION')
+
+
+def create_cache_from_args(args, not_found_exception):
+    """
+    Return a LookupCache as configured by add_cache_arguments() options, or
+    None if caching wasn't asked for.
+    """
+    if not args.cache_file:
+        return None
+    return LookupCache(args.cache_file, not_found_exception,
+                       dump_version=args.dump_version)
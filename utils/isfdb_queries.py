@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Set-based ("batch") queries against the ISFDB database, for the
+check_isfdb_*.py scripts.
+
+isfdb_tools has functions to look up a single Goodreads id, ISBN or
+author/title, which is fine for a handful of books, but means thousands of
+tiny queries for a whole library.  The functions here resolve many Goodreads
+ids or ISBNs at once, using IN-lists of a bounded size.
+
+The SQL only uses the core ISFDB tables (identifiers, identifier_types, pubs,
+pub_content, titles) in a vanilla way, so it runs against MySQL/MariaDB (via
+an SQLAlchemy connection, as returned by isfdb_tools' get_connection()) or
+SQLite (via a plain sqlite3 connection), the latter being handy for testing.
+"""
+
+from collections import defaultdict, namedtuple
+import sqlite3
+
+try:
+    from sqlalchemy.sql import text
+except ImportError:
+    # Only needed for MySQL connections, which come via isfdb_tools, which in
+    # turn needs SQLAlchemy
+    text = None
+
+# Keep this comfortably below SQLite's (older) default limit of 999 variables
+MAX_IN_LIST_SIZE = 500
+
+GOODREADS_IDENTIFIER_TYPE = 'Goodreads'
+
+# Fields are the same as (the interesting bits of) what isfdb_tools' single
+# book lookup functions return
+ResolvedTitle = namedtuple('ResolvedTitle', 'title_id, title, pub_id')
+
+
+def fetch_rows(conn, sql, params=None):
+    """
+    Run a query that uses :name style parameters, returning a tuple of
+    (list of column names, list of row tuples).
+    """
+    if params is None:
+        params = {}
+    if isinstance(conn, sqlite3.Connection):
+        cursor = conn.execute(sql, params)
+        columns = [z[0] for z in cursor.description]
+    else:
+        cursor = conn.execute(text(sql), params)
+        columns = list(cursor.keys())
+    return columns, [tuple(z) for z in cursor.fetchall()]
+
+
+def fetch_dicts(conn, sql, params=None):
+    """
+    As fetch_rows(), but return a list of dicts mapping column names to values.
+    """
+    columns, rows = fetch_rows(conn, sql, params)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def chunked(values, chunk_size=MAX_IN_LIST_SIZE):
+    """Yield lists of at most chunk_size of values, in the original order"""
+    chunk = []
+    for v in values:
+        chunk.append(v)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def in_list_params(values, prefix='v'):
+    """
+    Return (sql_fragment, params) for an IN-list of the supplied values e.g.
+    ('(:v0, :v1)', {'v0': 'foo', 'v1': 'bar'})
+    """
+    params = {'%s%d' % (prefix, i): v for i, v in enumerate(values)}
+    fragment = '(%s)' % (', '.join([':%s%d' % (prefix, i)
+                                    for i in range(len(values))]))
+    return fragment, params
+
+
+# In both of the following, the "main" title of a publication is the one whose
+# type matches the publication type e.g. the NOVEL title of a NOVEL pub, rather
+# than the COVERART, INTERIORART etc titles that are also part of its contents.
+
+GOODREADS_IDS_QUERY = """
+SELECT i.identifier_value AS goodreads_id, t.title_id, t.title_title, p.pub_id
+  FROM identifiers i
+  JOIN identifier_types it ON it.identifier_type_id = i.identifier_type_id
+  JOIN pubs p ON p.pub_id = i.pub_id
+  JOIN pub_content pc ON pc.pub_id = p.pub_id
+  JOIN titles t ON t.title_id = pc.title_id
+ WHERE it.identifier_type_name = :identifier_type
+   AND t.title_ttype = p.pub_ctype
+   AND i.identifier_value IN %s
+ ORDER BY i.identifier_value, p.pub_id, t.title_id
+"""
+
+ISBNS_QUERY = """
+SELECT p.pub_isbn AS isbn, t.title_id, t.title_title, p.pub_id
+  FROM pubs p
+  JOIN pub_content pc ON pc.pub_id = p.pub_id
+  JOIN titles t ON t.title_id = pc.title_id
+ WHERE t.title_ttype = p.pub_ctype
+   AND p.pub_isbn IN %s
+ ORDER BY p.pub_isbn, p.pub_id, t.title_id
+"""
+
+
+def batch_titles_for_goodreads_ids(conn, goodreads_ids):
+    """
+    Return a dict mapping each (int) Goodreads id that is known to ISFDB to a
+    list of ResolvedTitles.  Ids that aren't known are not in the dict.
+    """
+    ret = defaultdict(list)
+    for chunk in chunked(sorted(set(goodreads_ids))):
+        fragment, params = in_list_params([str(z) for z in chunk])
+        params['identifier_type'] = GOODREADS_IDENTIFIER_TYPE
+        for row in fetch_dicts(conn, GOODREADS_IDS_QUERY % (fragment), params):
+            ret[int(row['goodreads_id'])].append(
+                ResolvedTitle(row['title_id'], row['title_title'], row['pub_id']))
+    return dict(ret)
+
+
+def isbn10_from_isbn13(isbn13):
+    """
+    Return the ISBN-10 equivalent of a 978-prefixed ISBN-13, or None if there
+    isn't one.  (ISFDB stores whichever one was printed in the book, which for
+    older books will be the ISBN-10.)
+    """
+    if not isbn13 or len(isbn13) != 13 or not isbn13.startswith('978'):
+        return None
+    core = isbn13[3:12]
+    if not core.isdigit():
+        return None
+    total = sum((10 - i) * int(d) for i, d in enumerate(core))
+    check = (11 - (total % 11)) % 11
+    return core + ('X' if check == 10 else str(check))
+
+
+def isbn_variants(book):
+    """
+    Return a list of the ISBNs that a book might be listed under in ISFDB, in
+    order of preference.
+    """
+    ret = []
+    for isbn in (book.isbn13, book.isbn, isbn10_from_isbn13(book.isbn13)):
+        if isbn and isbn not in ret:
+            ret.append(isbn)
+    return ret
+
+
+def batch_titles_for_isbns(conn, isbns):
+    """
+    Return a dict mapping each ISBN that is known to ISFDB to a list of
+    ResolvedTitles.  ISBNs that aren't known are not in the dict.
+    """
+    ret = defaultdict(list)
+    for chunk in chunked(sorted(set(isbns))):
+        fragment, params = in_list_params(chunk)
+        for row in fetch_dicts(conn, ISBNS_QUERY % (fragment), params):
+            ret[row['isbn']].append(
+                ResolvedTitle(row['title_id'], row['title_title'], row['pub_id']))
+    return dict(ret)
+
+
+def resolve_book_batch(conn, books):
+    """
+    Given a list of Books, return a list of the same length, each element of
+    which is a tuple (find_method, [ResolvedTitle, ...]), where find_method is
+    'goodreads_id', 'isbn' or None (in which case the list is empty).  The
+    latter are the leftovers that the caller can try to match on author and
+    title.
+
+    This does (len(books) / MAX_IN_LIST_SIZE) * 2 queries at most, whatever
+    the number of books.
+    """
+    by_goodreads_id = batch_titles_for_goodreads_ids(conn,
+                                                     [z.book_id for z in books])
+
+    isbns_to_try = []
+    for book in books:
+        if book.book_id not in by_goodreads_id:
+            isbns_to_try.extend(isbn_variants(book))
+    by_isbn = batch_titles_for_isbns(conn, isbns_to_try)
+
+    ret = []
+    for book in books:
+        if book.book_id in by_goodreads_id:
+            ret.append(('goodreads_id', by_goodreads_id[book.book_id]))
+            continue
+        for isbn in isbn_variants(book):
+            if isbn in by_isbn:
+                ret.append(('isbn', by_isbn[isbn]))
+                break
+        else:
+            ret.append((None, []))
+    return ret
+
+
+def resolve_books_in_batches(conn, books, batch_size=MAX_IN_LIST_SIZE):
+    """
+    Generator wrapper around resolve_book_batch() that takes any iterable of
+    Books, and yields (book, find_method, [ResolvedTitle, ...]) in the same
+    order, whilst only holding batch_size books in memory at a time.
+    """
+    for batch in chunked(books, batch_size):
+        for book, (find_method, titles) in zip(batch,
+                                                resolve_book_batch(conn, batch)):
+            yield book, find_method, titles
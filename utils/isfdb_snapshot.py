@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Extract the subset of ISFDB that is relevant to a Goodreads library into a
+compact SQLite file, so that the check_isfdb_*.py scripts can be run without
+a MySQL/MariaDB server (and with much lower latency per lookup).
+
+"Relevant" means:
+* the titles that the books resolve to (by Goodreads id or ISBN), plus
+  every title by the authors of the books (or their pseudonyms), so that
+  author/title matching still works for books that don't resolve directly
+* the parent and variant titles of those titles
+* every publication containing those titles, and everything else that is
+  in those publications (i.e. the stories in an anthology)
+* the authors, pseudonyms, identifiers and tags of all the above
+
+The tables are copied wholesale (i.e. every column, with the same names as in
+ISFDB), so the snapshot can be queried by the same SQL as the full database.
+See make_isfdb_snapshot.py for the command-line tool that creates one, and
+open_snapshot() for how to use one in place of isfdb_tools' get_connection().
+"""
+
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+import logging
+import os
+import re
+import sqlite3
+
+try:
+    from sqlalchemy import create_engine, event
+except ImportError:
+    create_engine = None
+
+from utils.isfdb_queries import (fetch_rows, chunked, in_list_params,
+                                 resolve_books_in_batches)
+
+# key_column is what the rows to copy are selected on (None means copy the
+# whole table); indexed_columns are what the check_isfdb_*.py scripts (or
+# rather isfdb_tools) look rows up by.
+SnapshotTable = namedtuple('SnapshotTable', 'name, key_column, indexed_columns')
+
+SNAPSHOT_TABLES = {
+    'titles': SnapshotTable('titles', 'title_id', ['title_id', 'title_parent',
+                                                   'title_title']),
+    'pubs': SnapshotTable('pubs', 'pub_id', ['pub_id', 'pub_isbn']),
+    'pub_content': SnapshotTable('pub_content', 'pub_id', ['pub_id', 'title_id']),
+    'canonical_author': SnapshotTable('canonical_author', 'title_id',
+                                      ['title_id', 'author_id']),
+    'pub_authors': SnapshotTable('pub_authors', 'pub_id', ['pub_id', 'author_id']),
+    'authors': SnapshotTable('authors', 'author_id', ['author_id',
+                                                      'author_canonical']),
+    'pseudonyms': SnapshotTable('pseudonyms', 'author_id', ['author_id',
+                                                            'pseudonym']),
+    'identifiers': SnapshotTable('identifiers', 'pub_id', ['pub_id',
+                                                           'identifier_value']),
+    'identifier_types': SnapshotTable('identifier_types', None,
+                                      ['identifier_type_id']),
+    'tag_mapping': SnapshotTable('tag_mapping', 'title_id', ['title_id', 'tag_id']),
+    'tags': SnapshotTable('tags', 'tag_id', ['tag_id']),
+}
+
+
+def _select_ids(conn, select_column, table, key_column, key_ids):
+    """
+    Return the set of (non-null, non-zero) values of select_column from rows
+    of table whose key_column is in key_ids.
+    """
+    ret = set()
+    for chunk in chunked(sorted(key_ids)):
+        fragment, params = in_list_params(chunk)
+        _, rows = fetch_rows(conn, 'SELECT DISTINCT %s FROM %s WHERE %s IN %s' %
+                             (select_column, table, key_column, fragment), params)
+        ret.update(z[0] for z in rows if z[0])
+    return ret
+
+
+def _expand_pseudonyms(conn, author_ids):
+    """
+    Return the ids of the pseudonyms of, and the authors behind, author_ids
+    """
+    return _select_ids(conn, 'pseudonym', 'pseudonyms', 'author_id', author_ids) | \
+        _select_ids(conn, 'author_id', 'pseudonyms', 'pseudonym', author_ids)
+
+
+def find_reachable_ids(conn, books, author_resolver=None):
+    """
+    Return a dict mapping key column names to the set of values of the rows
+    that should go in the snapshot for the supplied books.
+
+    author_resolver is an optional utils.isfdb_authors.AuthorResolver, which
+    should be given the same normalization function as the check_isfdb_*.py
+    scripts use, so that authors they would find by a normalized name are
+    in the snapshot too.
+    """
+    title_ids = set()
+    author_names = set()
+    for book, find_method, titles in resolve_books_in_batches(conn, books):
+        title_ids.update(z.title_id for z in titles)
+        if author_resolver:
+            for author in book.all_authors:
+                author_names.update(author_resolver.author_guesses(author))
+        else:
+            author_names.update(book.all_authors)
+
+    author_ids = _select_ids(conn, 'author_id', 'authors', 'author_canonical',
+                             author_names)
+    author_ids |= _expand_pseudonyms(conn, author_ids)
+    title_ids |= _select_ids(conn, 'title_id', 'canonical_author', 'author_id',
+                             author_ids)
+
+    # Parents and variants (translations, retitlings etc)
+    title_ids |= _select_ids(conn, 'title_parent', 'titles', 'title_id', title_ids)
+    title_ids |= _select_ids(conn, 'title_id', 'titles', 'title_parent', title_ids)
+
+    # Publications those titles appear in, and everything else in them
+    pub_ids = _select_ids(conn, 'pub_id', 'pub_content', 'title_id', title_ids)
+    title_ids |= _select_ids(conn, 'title_id', 'pub_content', 'pub_id', pub_ids)
+
+    author_ids |= _select_ids(conn, 'author_id', 'canonical_author', 'title_id',
+                              title_ids)
+    author_ids |= _select_ids(conn, 'author_id', 'pub_authors', 'pub_id', pub_ids)
+    author_ids |= _expand_pseudonyms(conn, author_ids)
+
+    tag_ids = _select_ids(conn, 'tag_id', 'tag_mapping', 'title_id', title_ids)
+
+    return {
+        'title_id': title_ids,
+        'pub_id': pub_ids,
+        'author_id': author_ids,
+        'tag_id': tag_ids
+    }
+
+
+def _sqlite_value(val):
+    """Convert MySQL-ish values to something sqlite3 can store natively"""
+    if isinstance(val, Decimal):
+        return float(val)
+    elif isinstance(val, (date, datetime)):
+        return val.isoformat()
+    return val
+
+
+def _copy_table(src_conn, dest_conn, table, key_ids):
+    """
+    Create table in dest_conn with the same columns as in src_conn, and copy
+    over the rows whose key column is in key_ids.  Returns the number of rows
+    copied.
+    """
+    if table.key_column is None:
+        queries = [('SELECT * FROM %s' % (table.name), {})]
+    else:
+        queries = []
+        for chunk in chunked(sorted(key_ids)):
+            fragment, params = in_list_params(chunk)
+            queries.append(('SELECT * FROM %s WHERE %s IN %s' %
+                            (table.name, table.key_column, fragment), params))
+        if not queries:
+            # Still need the column names to create an empty table
+            queries = [('SELECT * FROM %s WHERE 1 = 0' % (table.name), {})]
+
+    created = False
+    row_count = 0
+    for sql, params in queries:
+        columns, rows = fetch_rows(src_conn, sql, params)
+        if not created:
+            dest_conn.execute('CREATE TABLE %s (%s)' % (table.name,
+                                                        ', '.join(columns)))
+            created = True
+        dest_conn.executemany('INSERT INTO %s VALUES (%s)' %
+                              (table.name, ', '.join(['?'] * len(columns))),
+                              [[_sqlite_value(z) for z in row] for row in rows])
+        row_count += len(rows)
+
+    for column in table.indexed_columns:
+        dest_conn.execute('CREATE INDEX %s_%s_idx ON %s (%s)' %
+                          (table.name, column, table.name, column))
+    return row_count
+
+
+def extract_snapshot(src_conn, filename, books, author_resolver=None):
+    """
+    Write a snapshot of the parts of ISFDB (read via src_conn) that are
+    relevant to books to a new SQLite file.  Returns a dict mapping table names
+    to the number of rows copied.  author_resolver is as per
+    find_reachable_ids().
+    """
+    if os.path.exists(filename):
+        os.remove(filename)
+    reachable = find_reachable_ids(src_conn, books, author_resolver)
+    row_counts = {}
+    dest_conn = sqlite3.connect(filename)
+    try:
+        for table in SNAPSHOT_TABLES.values():
+            row_counts[table.name] = _copy_table(src_conn, dest_conn, table,
+                                                 reachable.get(table.key_column))
+            logging.info('Copied %d rows of %s' % (row_counts[table.name],
+                                                   table.name))
+        dest_conn.commit()
+        dest_conn.execute('VACUUM')
+    finally:
+        dest_conn.close()
+    return row_counts
+
+
+def _regexp(pattern, val):
+    if val is None:
+        return False
+    return re.search(pattern, val, re.IGNORECASE) is not None
+
+
+def _concat(*vals):
+    if None in vals:
+        return None
+    return ''.join(str(z) for z in vals)
+
+
+def _add_mysql_compatibility_functions(dbapi_conn, connection_record=None):
+    """
+    SQLite lacks a few functions that the isfdb_tools SQL relies on
+    """
+    dbapi_conn.create_function('REGEXP', 2, _regexp)
+    dbapi_conn.create_function('CONCAT', -1, _concat)
+
+
+def open_snapshot(filename):
+    """
+    Return an (SQLAlchemy) connection to a snapshot file created by
+    extract_snapshot(), which can be used in place of isfdb_tools'
+    get_connection() - including from a different thread to the one that
+    opened it.
+    """
+    if not os.path.exists(filename):
+        # Otherwise SQLite will happily create an empty database
+        raise FileNotFoundError('ISFDB snapshot %s does not exist' % (filename))
+    if create_engine is None:
+        raise ImportError('SQLAlchemy is required to use an ISFDB snapshot')
+    engine = create_engine('sqlite:///%s' % (filename),
+                           connect_args={'check_same_thread': False})
+    event.listen(engine, 'connect', _add_mysql_compatibility_functions)
+    return engine.connect()
+
+
+def add_snapshot_arguments(parser):
+    """
+    Add the command-line option for using/creating a snapshot to an
+    ArgumentParser
+    """
+    parser.add_argument('-x', dest='snapshot_file',
+                        default=os.environ.get('GR_ISFDB_SNAPSHOT'),
+                        help='SQLite ISFDB snapshot file (as created by '
+                        'make_isfdb_snapshot.py), default=GR_ISFDB_SNAPSHOT')
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Canvases that render to HTML or SVG rather than ANSI escape codes, for
+embedding charts in web pages.
+
+These are drop-in replacements for ColoramaCanvas - they accept the same
+print_at()/current_fg/etc calls, with the colorama codes being mapped back
+to the name of the Fore/Back/Style attribute they came from, and from there
+to CSS.  Pass one as the canvas_class argument to Tsundoku.render(),
+TimelineChart.render() or ScatterPlot.render(), or use
+add_canvas_arguments() and canvas_class_from_args() to let the user choose.
+
+Note that if colorama isn't installed, there's no way of telling the colours
+apart, so everything will be rendered in the default colours.
+"""
+
+from abc import ABCMeta, abstractmethod
+from html import escape
+import sys
+
+from utils.colorama_canvas import ColoramaCanvas, Fore, Back, Style
+
+# Approximately the xterm palette
+CSS_COLOURS = {
+    'BLACK': '#000000',
+    'RED': '#cd0000',
+    'GREEN': '#00cd00',
+    'YELLOW': '#cdcd00',
+    'BLUE': '#0000ee',
+    'MAGENTA': '#cd00cd',
+    'CYAN': '#00cdcd',
+    'WHITE': '#e5e5e5',
+    'LIGHTBLACK_EX': '#7f7f7f',
+    'LIGHTRED_EX': '#ff0000',
+    'LIGHTGREEN_EX': '#00ff00',
+    'LIGHTYELLOW_EX': '#ffff00',
+    'LIGHTBLUE_EX': '#5c5cff',
+    'LIGHTMAGENTA_EX': '#ff00ff',
+    'LIGHTCYAN_EX': '#00ffff',
+    'LIGHTWHITE_EX': '#ffffff'
+}
+
+# Style name => (CSS property, value)
+CSS_STYLES = {
+    'BRIGHT': ('font-weight', 'bold'),
+    'DIM': ('opacity', '0.6')
+}
+
+
+def _codes_to_names(colorama_object, names):
+    """
+    Return a dict mapping the escape codes of the named attributes of a
+    colorama object (e.g. Fore) to those names
+    """
+    # Dummy objects (i.e. no colorama) return '' for everything, which can't
+    # be mapped to anything meaningful
+    return dict((getattr(colorama_object, z), z) for z in names
+                if getattr(colorama_object, z))
+
+FG_NAMES = _codes_to_names(Fore, CSS_COLOURS)
+BG_NAMES = _codes_to_names(Back, CSS_COLOURS)
+STYLE_NAMES = _codes_to_names(Style, CSS_STYLES)
+
+
+def css_properties(style, fg, bg):
+    """
+    Return a list of (property, value) tuples for the CSS equivalent of a
+    (style, fg, bg) tuple of colorama codes.  Unknown codes (including the
+    RESET ones) are treated as the default.
+    """
+    props = []
+    if fg in FG_NAMES:
+        props.append(('color', CSS_COLOURS[FG_NAMES[fg]]))
+    if bg in BG_NAMES:
+        props.append(('background-color', CSS_COLOURS[BG_NAMES[bg]]))
+    if style in STYLE_NAMES:
+        props.append(CSS_STYLES[STYLE_NAMES[style]])
+    return props
+
+
+class MarkupCanvas(ColoramaCanvas, metaclass=ABCMeta):
+    """
+    Base class for the canvases below.  Subclasses need to implement
+    to_string(), which should return the complete document, including the
+    caption (e.g. the date of the chart) if one was specified.
+    """
+
+    def __init__(self, *args, caption=None, **kwargs):
+        self.caption = caption
+        super().__init__(*args, **kwargs)
+
+    @abstractmethod
+    def to_string(self):
+        pass
+
+    def render(self):
+        doc = self.to_string()
+        if self.stream is not None:
+            sys.stdout.flush()
+            self.stream.write(doc.encode('utf-8'))
+            self.stream.flush()
+        else:
+            self.output_function(doc)
+        self.reset_style()
+
+
+class HtmlCanvas(MarkupCanvas):
+    """
+    Renders as a <pre> element, with a <span> for every run of characters
+    that has non-default attributes.  If there's a caption, the <pre> is
+    wrapped in a <figure> with a <figcaption>.
+    """
+
+    def __init__(self, *args, css_class='gr-chart', **kwargs):
+        self.css_class = css_class
+        super().__init__(*args, **kwargs)
+
+    def _style_attributes(self):
+        ret = []
+        for attrs in self.palette:
+            props = css_properties(*attrs)
+            if props:
+                ret.append(' style="%s"' % (';'.join('%s:%s' % z for z in props)))
+            else:
+                ret.append(None)
+        return ret
+
+    def to_string(self):
+        style_attributes = self._style_attributes()
+        lines = []
+        for y in range(self.height):
+            bits = []
+            for attr_id, text in self._runs(y):
+                if style_attributes[attr_id]:
+                    bits.append('<span%s>%s</span>' % (style_attributes[attr_id],
+                                                       escape(text)))
+                else:
+                    bits.append(escape(text))
+            lines.append(''.join(bits))
+        pre = '<pre class="%s">\n%s\n</pre>\n' % (escape(self.css_class),
+                                                 '\n'.join(lines))
+        if self.caption is None:
+            return pre
+        return '<figure>\n<figcaption>%s</figcaption>\n%s</figure>\n' % (
+            escape(self.caption), pre)
+
+
+class SvgCanvas(MarkupCanvas):
+    """
+    Renders as a standalone SVG image, with each run of characters
+    positioned explicitly, so that the layout doesn't depend on the font
+    metrics matching the cell size exactly.  If there's a caption, it's
+    used as the <title> of the image, and drawn in an extra row above the
+    chart.
+    """
+
+    def __init__(self, *args, font_size=14, cell_width=8.4, cell_height=17,
+                 **kwargs):
+        self.font_size = font_size
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        super().__init__(*args, **kwargs)
+
+    def _run_elements(self, x, y, text, props):
+        """
+        Return a list of the SVG elements for a run of text starting at cell
+        (x, y)
+        """
+        ret = []
+        text_attributes = []
+        for prop, val in props:
+            if prop == 'background-color':
+                ret.append('<rect x="%g" y="%g" width="%g" height="%g" fill="%s"/>' %
+                           (x * self.cell_width, y * self.cell_height,
+                            len(text) * self.cell_width, self.cell_height, val))
+            elif prop == 'color':
+                text_attributes.append(' fill="%s"' % (val))
+            else:
+                text_attributes.append(' %s="%s"' % (prop, val))
+        if text.strip():
+            ret.append('<text x="%g" y="%g"%s>%s</text>' %
+                       (x * self.cell_width, (y + 0.8) * self.cell_height,
+                        ''.join(text_attributes), escape(text.rstrip())))
+        return ret
+
+    def to_string(self):
+        props_for_attrs = [css_properties(*z) for z in self.palette]
+        elements = []
+        for y in range(self.height):
+            x = 0
+            for attr_id, text in self._runs(y):
+                elements.extend(self._run_elements(x, y, text,
+                                                   props_for_attrs[attr_id]))
+                x += len(text)
+        height = self.height
+        if self.caption is not None:
+            height += 1
+            elements = (['<title>%s</title>' % (escape(self.caption)),
+                         '<text x="0" y="%g">%s</text>' % (0.8 * self.cell_height,
+                                                           escape(self.caption)),
+                         '<g transform="translate(0,%g)">' % (self.cell_height)] +
+                        elements + ['</g>'])
+        return ('<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" '
+                'font-family="monospace" font-size="%g" xml:space="preserve">\n'
+                '%s\n</svg>\n' % (self.width * self.cell_width,
+                                  height * self.cell_height,
+                                  self.font_size, '\n'.join(elements)))
+
+
+CANVAS_CLASSES = {
+    'ansi': ColoramaCanvas,
+    'html': HtmlCanvas,
+    'svg': SvgCanvas
+}
+
+
+def add_canvas_arguments(parser):
+    """
+    Add the command-line option for choosing how to render charts to an
+    ArgumentParser
+    """
+    parser.add_argument('-g', dest='canvas_format', choices=sorted(CANVAS_CLASSES),
+                        default='ansi',
+                        help='Render the chart as coloured text, or as HTML or SVG '
+                        'for embedding in web pages, default=ansi')
+
+
+def canvas_class_from_args(args, ansi_class=ColoramaCanvas):
+    """
+    Return the canvas class for the add_canvas_arguments() option.  Charts
+    that use a different ColoramaCanvas-compatible class for terminal output
+    (e.g. SparseColoramaCanvas) can pass it as ansi_class.
+    """
+    if args.canvas_format == 'ansi':
+        return ansi_class
+    return CANVAS_CLASSES[args.canvas_format]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Buffered destinations for report output.
+
+An OutputSink can be passed as the output_function argument that most of the
+reports take, in place of print.  Rather than writing every line as it is
+output, the lines are batched up and written in bulk, which makes a big
+difference when piping tens of thousands of lines to another program.  If
+that program exits early - e.g. piping to head - the BrokenPipeError is
+dealt with quietly, rather than spewing a traceback.
+
+As well as plain text, the output can be JSON Lines, CSV or an Arrow IPC
+file (if pyarrow is installed).  These sinks have a true "structured"
+attribute, which tells the reports that support it to output records i.e.
+dicts or namedtuples of the underlying stats, rather than formatted text.
+Any text lines that are output anyway are put in a single "text" field.
+
+Usage:
+    with create_output_sink(args.output_format) as output_function:
+        some_report(books, output_function=output_function)
+"""
+
+from abc import ABCMeta, abstractmethod
+import csv
+from datetime import date
+from decimal import Decimal
+import io
+import json
+import os
+import sys
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+TEXT_FIELD = 'text'
+
+
+def record_to_dict(item):
+    """
+    Convert a record - a dict, namedtuple or text line - into a dict
+    """
+    if isinstance(item, dict):
+        return item
+    try:
+        return item._asdict()
+    except AttributeError:
+        return {TEXT_FIELD: str(item)}
+
+
+def json_default(obj):
+    """Serialize the non-JSON types that crop up in Book properties and stats"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, date):
+        return obj.isoformat()
+    elif isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return str(obj)
+
+
+def is_structured_output(output_function):
+    """
+    Return whether output_function wants records rather than text lines
+    """
+    return getattr(output_function, 'structured', False)
+
+
+def csv_value(val):
+    """Flatten multi-valued properties e.g. shelves into a single CSV value"""
+    if isinstance(val, (set, frozenset)):
+        val = sorted(val)
+    if isinstance(val, (list, tuple)):
+        return ', '.join(str(z) for z in val)
+    return val
+
+
+class OutputSink(object, metaclass=ABCMeta):
+    """
+    Base class for the sinks below, which need to implement format_item(),
+    returning the text (including any line terminator) for a line or record.
+    """
+
+    structured = False
+
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.stream = stream if stream is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered_size = 0
+
+    @abstractmethod
+    def format_item(self, item):
+        pass
+
+    def __call__(self, item=''):
+        text = self.format_item(item)
+        if text:
+            self._buffer.append(text)
+            self._buffered_size += len(text)
+            if self._buffered_size >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered_size = 0
+        try:
+            if data:
+                self.stream.write(data)
+            self.stream.flush()
+        except BrokenPipeError:
+            self._handle_broken_pipe()
+
+    def _handle_broken_pipe(self):
+        """
+        The reader has gone away.  Point the stream at /dev/null, so that the
+        interpreter doesn't complain when it tries to flush it on exit, as per
+        https://docs.python.org/3/library/signal.html#note-on-sigpipe
+        """
+        try:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.stream.fileno())
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass # Not a real file, so nothing to clean up
+        sys.exit(1)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TextSink(OutputSink):
+    """Plain text, as print() would have output"""
+
+    def format_item(self, item):
+        return '%s\n' % (item,)
+
+
+class JsonLinesSink(OutputSink):
+    """One JSON object per line.  Blank lines are dropped."""
+
+    structured = True
+
+    def format_item(self, item):
+        if item == '':
+            return None
+        return json.dumps(record_to_dict(item), default=json_default) + '\n'
+
+
+class CsvSink(OutputSink):
+    """
+    CSV, with a header row taken from the fields of the first item.  Blank
+    lines are dropped.
+    """
+
+    structured = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._row_buffer = io.StringIO()
+        self._writer = None
+
+    def format_item(self, item):
+        if item == '':
+            return None
+        row = record_to_dict(item)
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._row_buffer, fieldnames=list(row),
+                                          extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow(dict((k, csv_value(v)) for k, v in row.items()))
+        text = self._row_buffer.getvalue()
+        self._row_buffer.seek(0)
+        self._row_buffer.truncate()
+        return text
+
+
+class ArrowSink(OutputSink):
+    """
+    An Arrow IPC file, written to a binary stream (stdout's underlying
+    buffer by default) when the sink is closed, as the schema can't be known
+    until all the records have been seen.  Blank lines are dropped.
+
+    pyarrow is only imported when one of these is created, as it's slow to
+    import, and every report imports this module.
+    """
+
+    structured = True
+
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ImportError('pyarrow is required for Arrow output')
+        self._pyarrow = pyarrow
+        if stream is None:
+            stream = sys.stdout.buffer
+        super().__init__(stream, buffer_size)
+        self.rows = []
+
+    def format_item(self, item):
+        """
+        Return the item as a row dict for the table, rather than as text
+        """
+        if item == '':
+            return None
+        return dict((k, sorted(v) if isinstance(v, (set, frozenset)) else v)
+                    for k, v in record_to_dict(item).items())
+
+    def __call__(self, item=''):
+        row = self.format_item(item)
+        if row is not None:
+            self.rows.append(row)
+
+    def close(self):
+        table = self._pyarrow.Table.from_pylist(self.rows)
+        try:
+            with self._pyarrow.ipc.new_file(self.stream, table.schema) as writer:
+                writer.write_table(table)
+            self.stream.flush()
+        except BrokenPipeError:
+            self._handle_broken_pipe()
+
+
+OUTPUT_SINKS = {
+    'text': TextSink,
+    'jsonl': JsonLinesSink,
+    'csv': CsvSink,
+    'arrow': ArrowSink
+}
+
+
+def create_output_sink(output_format='text', stream=None,
+                       buffer_size=DEFAULT_BUFFER_SIZE):
+    return OUTPUT_SINKS[output_format](stream=stream, buffer_size=buffer_size)
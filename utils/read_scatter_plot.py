@@ -10,13 +10,16 @@ following notable differences:
 * The "dots" for each book are coloured in some meaningful way
 """
 
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import defaultdict, namedtuple, Counter
 from datetime import date
+from functools import lru_cache
 import pdb
 from shutil import get_terminal_size
 
 from utils.arguments import parse_args
-from utils.colorama_canvas import (ColoramaCanvas, Fore, Back, Style,
+from utils.colorama_canvas import (SparseColoramaCanvas, Fore, Back, Style,
                                    ColourTextObject)
 #from utils.colour_coding import rating_to_colours
 from utils.date_related import MONTH_LETTERS, MONTH_ABBREVIATIONS
@@ -28,6 +31,14 @@ SPACE_FOR_READ_DATE_LABELS = 2 # lines for year and month
 BAND_HEIGHT = 5 # in characters
 YEAR_WIDTHS = (4,6,12,24,36,48,60,72) # in characters
 
+# Used to show how many books are in a cell, when density is being displayed
+DENSITY_CHARS = '123456789'
+DENSITY_OVERFLOW_CHAR = '+'
+
+# Positions of each book (in the same order as ScatterPlot.books) on the
+# canvas, and a Counter mapping (x, y) to the number of books in that cell
+ScatterLayout = namedtuple('ScatterLayout', 'x_positions, y_positions, cell_counts')
+
 # There is no point having a grouping value smaller than BAND_HEIGHT, as
 # the export only has publication year, not publication date
 PUBLICATION_YEAR_GROUPINGS = (5, 10, 50, 100)
@@ -40,7 +51,137 @@ def year_to_group_of_years(y, g):
     start = year_to_grouping_start(y, g)
     return range(start, start + g)
 
-def merge_years(year_counts, max_in_group, year_groupings=None):
+class _YearPrefixSums(object):
+    """
+    Cumulative counts of a year histogram, so that the total for any range of
+    years can be obtained in constant time
+    """
+
+    def __init__(self, sorted_years_and_counts):
+        self.min_year = sorted_years_and_counts[0][0]
+        self.max_year = sorted_years_and_counts[-1][0]
+        counts = dict(sorted_years_and_counts)
+        self.sums = [0]
+        for year in range(self.min_year, self.max_year + 1):
+            self.sums.append(self.sums[-1] + counts.get(year, 0))
+
+    def total(self, start_year, end_year):
+        """Return the total of the counts for the inclusive range of years"""
+        start = max(start_year, self.min_year) - self.min_year
+        end = min(end_year, self.max_year) - self.min_year + 1
+        if end <= start:
+            return 0
+        return self.sums[end] - self.sums[start]
+
+
+def _greedy_banding(years, prefix_sums, max_in_group, year_groupings):
+    """
+    Working upwards through the years, use the largest grouping containing
+    the earliest year not yet in a band, that doesn't exceed max_in_group or
+    overlap the previous band.  Returns a list of (start_year, end_year).
+    """
+    ranges = []
+    dont_go_earlier_than = None
+    for year in years:
+        if dont_go_earlier_than is not None and year <= dont_go_earlier_than:
+            # Already in the previous band
+            continue
+        start = year_to_grouping_start(year, year_groupings[0])
+        best_so_far = (start, start + year_groupings[0] - 1)
+        for grouping in year_groupings[1:]:
+            start = year_to_grouping_start(year, grouping)
+            end = start + grouping - 1
+            if (dont_go_earlier_than is not None and start <= dont_go_earlier_than) or \
+               prefix_sums.total(start, end) > max_in_group:
+                break
+            best_so_far = (start, end)
+        ranges.append(best_so_far)
+        dont_go_earlier_than = best_so_far[1]
+    return ranges
+
+
+def _candidate_bands(year, previous_end, prefix_sums, max_in_group,
+                     year_groupings):
+    """
+    Yield (grouping, start_year, end_year) for each band that could contain
+    year, given that the previous band ended at previous_end.  A band of the
+    smallest grouping is always possible, even if it exceeds max_in_group,
+    but is trimmed so as not to overlap the previous band.
+    """
+    start = year_to_grouping_start(year, year_groupings[0])
+    end = start + year_groupings[0] - 1
+    if previous_end is not None:
+        start = max(start, previous_end + 1)
+    yield year_groupings[0], start, end
+    for grouping in year_groupings[1:]:
+        start = year_to_grouping_start(year, grouping)
+        end = start + grouping - 1
+        # Groupings needn't be multiples of each other, so a larger grouping
+        # being unusable doesn't rule out the ones after it
+        if (previous_end is not None and start <= previous_end) or \
+           prefix_sums.total(start, end) > max_in_group:
+            continue
+        yield grouping, start, end
+
+
+def _optimal_banding(years, prefix_sums, max_in_group, year_groupings):
+    """
+    As _greedy_banding(), but uses dynamic programming to find the banding
+    with the fewest bands.  (Where there are several, the one with the
+    larger bands towards the start is used.)
+    """
+    # Which bands are possible depends on where the previous band ended, so
+    # the state is (index of the first year not yet in a band, end year of
+    # the previous band).  Find all the reachable states working forwards...
+    num_years = len(years)
+    previous_ends = [set() for _ in range(num_years + 1)]
+    previous_ends[0].add(None)
+    transitions = {}
+    for i in range(num_years):
+        for previous_end in previous_ends[i]:
+            moves = []
+            for grouping, start, end in _candidate_bands(years[i], previous_end,
+                                                         prefix_sums, max_in_group,
+                                                         year_groupings):
+                next_i = bisect_right(years, end, lo=i)
+                previous_ends[next_i].add(end)
+                moves.append((grouping, (start, end), next_i))
+            transitions[(i, previous_end)] = moves
+
+    # ... then the fewest bands from each of them, working backwards
+    best = dict(((num_years, z), (0, None, None)) for z in previous_ends[num_years])
+    for i in range(num_years - 1, -1, -1):
+        for previous_end in previous_ends[i]:
+            num_bands, _, band, next_state = min(
+                (best[(next_i, band[1])][0] + 1, -grouping, band, (next_i, band[1]))
+                for grouping, band, next_i in transitions[(i, previous_end)])
+            best[(i, previous_end)] = (num_bands, band, next_state)
+
+    ranges = []
+    state = (0, None)
+    while state[0] < num_years:
+        _, band, state = best[state]
+        ranges.append(band)
+    return ranges
+
+
+@lru_cache(maxsize=32)
+def _merge_years(years_and_counts, max_in_group, year_groupings, optimal):
+    ranges = []
+    year_to_ranges = {}
+    if not years_and_counts:
+        return ranges, year_to_ranges
+    prefix_sums = _YearPrefixSums(years_and_counts)
+    years = [z[0] for z in years_and_counts]
+    banding_function = _optimal_banding if optimal else _greedy_banding
+    ranges = banding_function(years, prefix_sums, max_in_group, year_groupings)
+    for i, (start, end) in enumerate(ranges):
+        for y in range(start, end + 1):
+            year_to_ranges[y] = (i, start, end - start + 1)
+    return ranges, year_to_ranges
+
+
+def merge_years(year_counts, max_in_group, year_groupings=None, optimal=False):
     """
     Given a dict mapping years to quantities, return a tuple containing:
     * list of (start_year, end_year) tuples, where the specified inclusive
@@ -50,40 +191,22 @@ def merge_years(year_counts, max_in_group, year_groupings=None):
      the list)
 
     year_groupings defines the granularity of ranges that can be merged to
-    e.g. 5 years, 10 years, etc
+    e.g. 5 years, 10 years, etc.  A range of the smallest granularity is
+    used even if it has more than max_in_group elements.
 
-    This is a crude implementation that destroys year_counts; I'm sure it
-    could be done much better with a bit of extra thinking.
-    """
+    By default, ranges are chosen greedily from the earliest year upwards;
+    if optimal is True, the fewest possible ranges are used.
 
+    year_counts is not modified.  Results are cached on the contents of
+    year_counts, so repeated calls for the same histogram are cheap.
+    """
     if year_groupings is None:
         year_groupings = PUBLICATION_YEAR_GROUPINGS
-    ranges = []
-    year_to_ranges = {}
-    years_and_counts = sorted(year_counts.items())
-    dont_go_earlier_than = None
-    for year, count in years_and_counts:
-        if year not in year_counts:
-            # Assume it has already been merged
-            # print('Skipping %d' % (year))
-            continue
-        # best_so_far = [year]
-        best_so_far = year_to_group_of_years(year, year_groupings[0])
-        for grouping in year_groupings[1:]:
-            years = year_to_group_of_years(year, grouping)
-            total = sum(year_counts[z] for z in years)
-            if total > max_in_group or dont_go_earlier_than in years:
-                break
-            best_so_far = years
-        r = (min(best_so_far), max(best_so_far))
-        ranges.append(r)
-        for y in best_so_far:
-            year_to_ranges[y] = (len(ranges)-1, r[0], r[1]-r[0]+1 )
-            del year_counts[y]
-        dont_go_earlier_than = max(best_so_far)
-
-    # print(year_to_ranges)
-    return ranges, year_to_ranges
+    years_and_counts = tuple(sorted(year_counts.items()))
+    ranges, year_to_ranges = _merge_years(years_and_counts, max_in_group,
+                                          tuple(year_groupings), optimal)
+    # Copies, so that callers can't corrupt the cache
+    return list(ranges), dict(year_to_ranges)
 
 
 class ScatterPlot(object):
@@ -91,16 +214,24 @@ class ScatterPlot(object):
     def __init__(self, books):
         self.books = list(books)
 
-        # TODO (maybe): do this as one big 'manual' loop
-        self.min_year = min([z.year for z in self.books])
-        self.max_year = max([z.year for z in self.books])
-        self.min_read_date = min([z.date_read for z in self.books])
-        self.max_read_date = max([z.date_read for z in self.books])
+        # One pass, rather than a min() and max() for each property
+        bk = self.books[0]
+        self.min_year = self.max_year = bk.year
+        self.min_read_date = self.max_read_date = bk.date_read
+        for bk in self.books:
+            if bk.year < self.min_year:
+                self.min_year = bk.year
+            elif bk.year > self.max_year:
+                self.max_year = bk.year
+            if bk.date_read < self.min_read_date:
+                self.min_read_date = bk.date_read
+            elif bk.date_read > self.max_read_date:
+                self.max_read_date = bk.date_read
 
         self.min_chart_date = date(self.min_read_date.year, 1, 1)
         self.max_chart_date = date(self.max_read_date.year, 12, 31)
 
-    def process(self, max_items_in_year_banding=None):
+    def process(self, max_items_in_year_banding=None, optimal_banding=False):
         if max_items_in_year_banding is None:
             # This seems to produce reasonable results
             max_items_in_year_banding = len(self.books) // 6
@@ -109,9 +240,42 @@ class ScatterPlot(object):
         for bk in self.books:
             time_groups[bk.year] += 1
 
-        self.ranges, self.year_factors = merge_years(time_groups, max_items_in_year_banding)
+        self.ranges, self.year_factors = merge_years(time_groups,
+                                                     max_items_in_year_banding,
+                                                     optimal=optimal_banding)
+        self.height = (len(self.ranges) * BAND_HEIGHT) + SPACE_FOR_READ_DATE_LABELS
+
+        # These don't depend on the width being rendered to, so are worked out
+        # once here, then scaled by layout() for each width
+        self.day_offsets = array('l')
+        self.y_positions = array('l')
+        for bk in self.books:
+            self.day_offsets.append((bk.date_read - self.min_chart_date).days)
+            band_number, starting_year, year_range = self.year_factors[bk.year]
+            offset_within_band = (bk.year - starting_year) / year_range
+            self.y_positions.append(self.height - 1 -
+                                    int((band_number + offset_within_band) * BAND_HEIGHT))
+        self._layouts = {}
         return self
 
+    def layout(self, chars_per_year):
+        """
+        Return a ScatterLayout for the books at the specified horizontal
+        scale.  These are cached, so rendering the same plot at different
+        widths only calculates each layout once.
+        """
+        try:
+            return self._layouts[chars_per_year]
+        except KeyError:
+            pass
+        day_scale = chars_per_year / 365 # TODO: Account for leap years
+        x_positions = array('l', [SPACE_FOR_PUBLICATION_YEAR_LABELS + int(z * day_scale)
+                                  for z in self.day_offsets])
+        cell_counts = Counter(zip(x_positions, self.y_positions))
+        self._layouts[chars_per_year] = ScatterLayout(x_positions, self.y_positions,
+                                                      cell_counts)
+        return self._layouts[chars_per_year]
+
     def _calculate_chart_x_scale(self, max_width=200):
         num_years = self.max_read_date.year - self.min_read_date.year + 1
         best_year_width = YEAR_WIDTHS[0]
@@ -161,7 +325,18 @@ class ScatterPlot(object):
 
 
     def render(self, colour_function=generic_colour_function,
-               render_width=None, render_height=None):
+               render_width=None, render_height=None, stream=None,
+               canvas_class=SparseColoramaCanvas, show_density=False):
+        """
+        stream is an optional binary stream for the canvas to write to - see
+        ColoramaCanvas.  canvas_class can be any ColoramaCanvas-compatible
+        class, e.g. one of those in utils.markup_canvas.  The default only
+        stores what's drawn, as most of a scatter plot is empty space.
+
+        If show_density is True, cells containing more than one book show
+        the number of books (in the colours of the last one), rather than
+        just whichever book was drawn last.
+        """
         if render_width is None or render_height is None:
             x, y = get_terminal_size((80, 40))
             if render_width is None:
@@ -181,22 +356,20 @@ class ScatterPlot(object):
                       self.chars_per_year
 
         width = CHART_WIDTH + 2 + SPACE_FOR_PUBLICATION_YEAR_LABELS
-        height = (len(self.ranges) * BAND_HEIGHT) + SPACE_FOR_READ_DATE_LABELS
+        height = self.height
 
-        cc = ColoramaCanvas(width, height)
+        cc = canvas_class(width, height, stream=stream)
         self._render_read_date_labels(cc, SPACE_FOR_PUBLICATION_YEAR_LABELS, 0)
         self._render_publication_date_labels(cc, CHART_WIDTH, height)
 
-        for bk in self.books:
-            x_pos = int((bk.date_read - self.min_chart_date).days * self.day_scale)
-            # y_pos = (self.max_chart_year - bk.year) // 2
-            band_number, starting_year, year_range = self.year_factors[bk.year]
-            offset_within_band = (bk.year - starting_year) / year_range
-            y_pos = height - int((band_number + offset_within_band)* BAND_HEIGHT) -1
-
+        layout = self.layout(self.chars_per_year)
+        for bk, x_pos, y_pos in zip(self.books, layout.x_positions,
+                                    layout.y_positions):
             cc.current_fg, cc.current_bg, cc.current_style, txt = colour_function(bk)
-
-            cc.print_at(SPACE_FOR_PUBLICATION_YEAR_LABELS + x_pos, y_pos, txt)
+            if show_density:
+                count = layout.cell_counts[(x_pos, y_pos)]
+                if count > 1:
+                    txt = DENSITY_CHARS[count - 1] if count <= len(DENSITY_CHARS) \
+                          else DENSITY_OVERFLOW_CHAR
+            cc.print_at(x_pos, y_pos, txt)
         cc.render()
-
-
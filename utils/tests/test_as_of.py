@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+from datetime import date, timedelta
+import unittest
+
+from ..as_of import AsOfIndex, AsOfCounts, BookAsOf
+from ..book import Book, NotOwnedAtSpecifiedDateError
+from ..transformers import ReadVsUnreadReport, read_vs_unread_report
+
+
+class MockBookForAsOf(object):
+    def __init__(self, title, shelf, date_added, date_read=None, status='to-read'):
+        self.title = title
+        self.shelf = shelf
+        self.date_added = date_added
+        self.date_read = date_read
+        self.status = status
+
+    @property
+    def is_read(self):
+        return self.status == 'read'
+
+    @property
+    def is_unread(self):
+        return self.status == 'to-read'
+
+    def property_as_sequence(self, property_name):
+        return [getattr(self, property_name)]
+
+    def _calculate_days_on_tbr_pile(self, effective_date):
+        if self.date_read and self.date_read <= effective_date:
+            return (self.date_read - self.date_added).days
+        return (effective_date - self.date_added).days
+
+
+MOCK_BOOKS = [
+    MockBookForAsOf('A', 'sf', date(2019, 1, 10), date(2019, 6, 1), 'read'),
+    MockBookForAsOf('B', 'sf', date(2019, 3, 1)),
+    MockBookForAsOf('C', 'fantasy', date(2018, 12, 1), date(2018, 11, 1), 'read'),
+    MockBookForAsOf('D', 'fantasy', date(2019, 2, 1), None, 'read'),
+    MockBookForAsOf('E', 'fantasy', date(2019, 4, 1), None, 'currently-reading'),
+    MockBookForAsOf('F', 'sf', None) # Never counted
+]
+
+
+class TestAsOfIndex(unittest.TestCase):
+    def test_books_as_of(self):
+        index = AsOfIndex(MOCK_BOOKS)
+        books = index.books_as_of(date(2019, 3, 1))
+        self.assertEqual(['A', 'B', 'C', 'D'], [z.title for z in books])
+        self.assertEqual([False, False, True, True], [z.is_read for z in books])
+        # A was read after the date, so is neither read nor unread, as with -d
+        self.assertEqual([False, True, False, False], [z.is_unread for z in books])
+        self.assertEqual([50, 0], [z.days_on_tbr_pile for z in books[:2]])
+        self.assertEqual([], index.books_as_of(date(2000, 1, 1)))
+
+    def test_counts(self):
+        index = AsOfIndex(MOCK_BOOKS)
+        self.assertEqual([AsOfCounts(date(2018, 12, 31), 1, 1, 0),
+                          AsOfCounts(date(2019, 3, 1), 4, 2, 1),
+                          AsOfCounts(date(2019, 12, 31), 5, 3, 1)],
+                         index.counts([date(2018, 12, 31), date(2019, 3, 1),
+                                       date(2019, 12, 31)]))
+
+    def test_counts_match_proxies(self):
+        index = AsOfIndex(MOCK_BOOKS)
+        dt = date(2018, 10, 1)
+        while dt < date(2019, 8, 1):
+            books = index.books_as_of(dt)
+            self.assertEqual(AsOfCounts(dt, len(books),
+                                        len([z for z in books if z.is_read]),
+                                        len([z for z in books if z.is_unread])),
+                             index.counts_at(dt))
+            dt += timedelta(days=9)
+
+    def test_changes(self):
+        index = AsOfIndex(MOCK_BOOKS)
+        state = {}
+        dates = [date(2018, 12, 31), date(2019, 1, 31), date(2019, 3, 31),
+                 date(2019, 6, 30)]
+        for dt, added, newly_read in index.changes(dates):
+            for bk in added:
+                state[bk.title] = BookAsOf(bk, dt).is_read
+            for bk in newly_read:
+                state[bk.title] = True
+            self.assertEqual(dict((z.title, z.is_read) for z in index.books_as_of(dt)),
+                             state)
+        self.assertEqual([['C'], ['A'], ['D', 'B'], ['E']],
+                         [[z.title for z in added]
+                          for _, added, _ in index.changes(dates)])
+
+
+def make_row(title, shelf, date_added, date_read, status):
+    return {
+        'Title': title, 'Author': 'Mick Mock', 'Additional Authors': '',
+        'Original Publication Year': '2001', 'Publisher': 'Mock Corp',
+        'Year Published': '2002', 'Number of Pages': '123',
+        'Binding': 'Paperback', 'Average Rating': '3.5', 'Book Id': str(ord(title)),
+        'ISBN': '=""', 'ISBN13': '=""', 'Exclusive Shelf': status,
+        'Bookshelves': shelf, 'My Rating': '0', 'Date Added': date_added,
+        'Date Read': date_read, 'Read Count': '1' if date_read else '0'
+    }
+
+MOCK_ROWS = [
+    make_row('A', 'sf', '2019/01/10', '2019/06/01', 'read'),
+    make_row('B', 'sf', '2019/03/01', '', 'to-read'),
+    make_row('C', 'fantasy', '2018/12/01', '2018/12/20', 'read'),
+    make_row('D', 'fantasy', '2019/02/01', '', 'read'),
+    make_row('E', 'fantasy', '2019/04/01', '', 'currently-reading'),
+    make_row('G', 'sf', '2019/01/05', '2019/05/01', 'to-read') # Being reread
+]
+
+
+class TestAsOfMatchesAsOfDate(unittest.TestCase):
+    """-D should give the same results as -d for each of the dates"""
+
+    def books_read_with_as_of_date(self, dt):
+        ret = []
+        for row in MOCK_ROWS:
+            try:
+                ret.append(Book(row, as_of_date=dt))
+            except NotOwnedAtSpecifiedDateError:
+                pass
+        return ret
+
+    def test_matches_as_of_date(self):
+        index = AsOfIndex(Book(z) for z in MOCK_ROWS)
+        dt = date(2018, 11, 15)
+        while dt < date(2019, 8, 1):
+            expected = self.books_read_with_as_of_date(dt)
+            actual = index.books_as_of(dt)
+            self.assertEqual([(z.title, z.is_read, z.is_unread, z.days_on_tbr_pile,
+                               z.shelves) for z in expected],
+                             [(z.title, z.is_read, z.is_unread, z.days_on_tbr_pile,
+                               z.shelves) for z in actual])
+            self.assertEqual(AsOfCounts(dt, len(expected),
+                                        len([z for z in expected if z.is_read]),
+                                        len([z for z in expected if z.is_unread])),
+                             index.counts_at(dt))
+            expected_report = ReadVsUnreadReport(expected, 'user_shelves',
+                                                 ignore_single_book_groups=False)
+            _, report = next(ReadVsUnreadReport.for_dates(
+                [Book(z) for z in MOCK_ROWS], 'user_shelves', [dt],
+                ignore_single_book_groups=False))
+            self.assertEqual(sorted(expected_report.process().stats),
+                             sorted(report.process().stats))
+            dt += timedelta(days=9)
+
+
+class TestReadVsUnreadReportForDates(unittest.TestCase):
+    def test_for_dates_matches_proxies(self):
+        dates = [date(2019, 1, 1), date(2019, 3, 1), date(2019, 7, 1)]
+        index = AsOfIndex(MOCK_BOOKS)
+        for dt, report in ReadVsUnreadReport.for_dates(MOCK_BOOKS, 'shelf', dates,
+                                                        ignore_single_book_groups=False):
+            expected = ReadVsUnreadReport(index.books_as_of(dt), 'shelf',
+                                          ignore_single_book_groups=False)
+            self.assertEqual(sorted(expected.process().stats),
+                             sorted(report.process().stats))
+            self.assertEqual(dict(expected.grouping_count),
+                             dict(report.grouping_count))
+
+    def test_structured_output(self):
+        records = []
+        def collector(item):
+            records.append(item)
+        collector.structured = True
+        dates = [date(2019, 1, 1), date(2019, 7, 1)]
+        read_vs_unread_report(MOCK_BOOKS, 'shelf', dates, output_function=collector,
+                              ignore_single_book_groups=False)
+        self.assertEqual([(date(2019, 1, 1), 'fantasy', 1, 0),
+                          (date(2019, 7, 1), 'sf', 1, 1),
+                          (date(2019, 7, 1), 'fantasy', 3, 0)],
+                         [(z['as_of_date'], z['key'], z['read_count'],
+                           z['unread_count']) for z in records])
+
+
+if __name__ == '__main__':
+    unittest.main()
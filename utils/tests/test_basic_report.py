@@ -4,7 +4,8 @@ import pdb
 import unittest
 
 
-from ..basic_report import GROUP_SEPARATOR, process_books, output_grouped_lists
+from ..basic_report import (GROUP_SEPARATOR, process_books, output_grouped_lists,
+                            safe_property, create_sort_key)
 
 class MockBookForBasicReport(object):
     def __init__(self, author, title):
@@ -34,6 +35,30 @@ MOCK_BOOKS = [
     MockBookForBasicReport('Dave Dump', 'Dung')
     ]
 
+class MockBookWithShelves(MockBookForBasicReport):
+    def __init__(self, author, title, series, user_shelves):
+        super().__init__(author, title)
+        self.series = series
+        self.user_shelves = user_shelves
+
+
+class TestSafeProperty(unittest.TestCase):
+    def test_nulls(self):
+        bk = MockBookWithShelves(None, 'Test', None, set())
+        self.assertEqual('<Unknown author>', safe_property(bk, 'author'))
+        # series is a str property, so shouldn't be compared as a number
+        self.assertEqual('', safe_property(bk, 'series'))
+
+    def test_sort_key(self):
+        books = [MockBookWithShelves('A', 'One', 'Zzz', {'b', 'c'}),
+                 MockBookWithShelves('A', 'Two', None, {'c', 'a'}),
+                 MockBookWithShelves('A', 'Three', 'Aaa', {'c', 'a'})]
+        sort_key = create_sort_key(['user_shelves', 'series'])
+        self.assertEqual([['a', 'c'], ''], sort_key(books[1]))
+        self.assertEqual(['Two', 'Three', 'One'],
+                         [z.title for z in sorted(books, key=sort_key)])
+
+
 class MockArgs(object):
     def __init__(self):
         self.sort_properties = None
@@ -79,6 +104,29 @@ class TestProcessBooks(unittest.TestCase):
             'Dung - Dave Dump'
             ], ret)
 
+    def test_with_external_sorting(self):
+        ret = []
+        args =  MockArgs()
+        args.sort_properties = ['author']
+        process_books(MOCK_BOOKS, args, ret.append)
+        expected = ret[:]
+        ret = []
+        args.sort_chunk_size = 3
+        args.enumerate_output = True
+        process_books(MOCK_BOOKS, args, ret.append)
+        self.assertEqual(['%d. %s' % (i + 1, z) for i, z in enumerate(expected)], ret)
+
+    def test_custom_format(self):
+        ret = []
+        args =  MockArgs()
+        args.enumerate_output = True
+        args.format = '{author}: {title!r}'
+        process_books(MOCK_BOOKS[3:5], args, ret.append)
+        self.assertEqual([
+            "1. Clive Custer: 'Codswallop'",
+            "2. Billy Brown: 'Book for Testing'"
+            ], ret)
+
     def test_inline_output(self):
         ret = []
         def collate_strings(txt):
@@ -26,6 +26,17 @@ class TestCompareBRStat(unittest.TestCase):
         self.assertTrue(compare_brstat(self.IDENTICAL_STAT, self.PRIMARY_STAT) == 0)
 
 
+class StructuredCollector(object):
+    """Mimics the output sinks that want records rather than text"""
+    structured = True
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, item):
+        self.records.append(item)
+
+
 class MockBookForReadVsUnreadReport(object):
     def __init__(self, keys, rating, pagination):
         self.keys = keys
@@ -88,3 +99,11 @@ class TestBestRankedReport(unittest.TestCase):
             'bar                            : 2.67    3',
             'foo                            : 2.50    2'
             ], ret)
+
+    def test_render_structured(self):
+        obj = BestRankedReport(MOCK_BOOKS, 'whatever')
+        obj.process()
+        sink = StructuredCollector()
+        obj.render(output_function=sink)
+        self.assertEqual(['baz', 'bar', 'foo'], [z.key for z in sink.records])
+        self.assertEqual(BestRankedStat('foo', 2.5, 2, 196), sink.records[-1])
@@ -4,7 +4,8 @@ from datetime import date
 from decimal import Decimal
 import unittest
 
-from ..book import Book, NotOwnedAtSpecifiedDateError
+from ..book import (Book, NotOwnedAtSpecifiedDateError, compile_custom_format,
+                    book_property, STORED, EXPENSIVE)
 
 class TestBook(unittest.TestCase):
 
@@ -237,5 +238,63 @@ class TestBook(unittest.TestCase):
         self.assertEqual(123, bk.pagination) # And this didn't match, so no patch
 
 
+class TestPropertyRegistry(unittest.TestCase):
+    def test_registry_covers_class_properties(self):
+        registry = Book.property_registry()
+        self.assertEqual(sorted(registry), list(registry))
+        for name, val in vars(Book).items():
+            if isinstance(val, property) and not name.startswith('_'):
+                self.assertIn(name, registry)
+                self.assertIsNotNone(registry[name].type, name)
+        self.assertNotIn('patch', registry)
+        self.assertNotIn('_series_and_volume', registry)
+        self.assertIs(registry, Book.property_registry())
+
+    def test_property_details(self):
+        self.assertEqual((int, False, True, STORED),
+                         book_property('pagination')[1:])
+        self.assertEqual((str, True, False, EXPENSIVE),
+                         book_property('user_shelves')[1:])
+        self.assertIsNone(book_property('no_such_property'))
+
+    def test_properties_without_instance(self):
+        names = Book._properties()
+        self.assertIn('days_on_tbr_pile', names)
+        self.assertIn('title', names)
+
+
+class MockBookForCustomFormat(object):
+    title = 'A Mock Book'
+    year = 2001
+    shelves = ['testing', 'mocking']
+    width = 15
+
+
+class TestCompileCustomFormat(unittest.TestCase):
+    def assertSameAsStrFormat(self, expected, fmt):
+        bk = MockBookForCustomFormat()
+        self.assertEqual(expected, compile_custom_format(fmt)(bk))
+        # The original implementation of Book.custom_format()
+        self.assertEqual(expected, fmt.replace('{', '{0.').format(bk))
+
+    def test_simple_fields(self):
+        self.assertSameAsStrFormat('A Mock Book (2001) A Mock Book',
+                                   '{title} ({year}) {title}')
+        self.assertSameAsStrFormat('No fields', 'No fields')
+
+    def test_conversions_and_format_specs(self):
+        self.assertSameAsStrFormat("'A Mock Book'   |02001",
+                                   '{title!r:<16}|{year:05d}')
+
+    def test_lookups_and_nested_specs(self):
+        self.assertSameAsStrFormat('mocking', '{shelves[1]}')
+        self.assertSameAsStrFormat('A Mock Book    |', '{title:{width}}|')
+
+    def test_escaped_braces(self):
+        # The original implementation mangled these
+        self.assertEqual('{A Mock Book}',
+                         compile_custom_format('{{{title}}}')(MockBookForCustomFormat()))
+
+
 if __name__ == '__main__':
     unittest.main()
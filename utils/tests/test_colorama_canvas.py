@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+from io import BytesIO
+import re
+import unittest
+
+from ..colorama_canvas import ColoramaCanvas, SparseColoramaCanvas, Style
+
+# Hardcoded, so that the tests don't depend on whether colorama is installed
+RESET_ALL = '\x1b[0m'
+BRIGHT = '\x1b[1m'
+FG_RED = '\x1b[31m'
+FG_GREEN = '\x1b[32m'
+BG_BLUE = '\x1b[44m'
+FG_RESET = '\x1b[39m'
+BG_RESET = '\x1b[49m'
+
+ESCAPE_CODE_REGEX = re.compile('(\x1b\\[[0-9;]*m)')
+
+
+def emulate_terminal(lines):
+    """
+    Return a list (one per line) of lists of (style, fg, bg, char) tuples,
+    representing how each character would appear on a terminal.
+    """
+    style, fg, bg = None, None, None
+    ret = []
+    for line in lines:
+        cells = []
+        for bit in ESCAPE_CODE_REGEX.split(line):
+            if ESCAPE_CODE_REGEX.match(bit):
+                code = int(bit[2:-1] or '0')
+                if code == 0:
+                    style, fg, bg = None, None, None
+                elif code == 1:
+                    style = code
+                elif 30 <= code < 40:
+                    fg = code
+                elif 40 <= code < 50:
+                    bg = code
+            else:
+                cells.extend((style, fg, bg, ch) for ch in bit)
+        ret.append(cells)
+    return ret
+
+
+def render_every_cell(canvas):
+    """
+    The original implementation of ColoramaCanvas.render(), which output the
+    escape codes for every character, for comparison purposes.
+    """
+    lines = []
+    for y in range(canvas.height):
+        bits = []
+        for x in range(canvas.width):
+            ch, style, fg, bg = canvas.get_cell(x, y)
+            bits.append('%s%s%s%s' % (style or Style.RESET_ALL, fg or '',
+                                      bg or '', ch))
+        lines.append(''.join(bits))
+    return lines
+
+
+def create_scatter_like_canvas(width=200, height=60, canvas_class=ColoramaCanvas,
+                               fill_background=True):
+    """A mostly blank canvas with a sprinkling of coloured dots"""
+    cc = canvas_class(width, height)
+    cc.current_style, cc.current_fg, cc.current_bg = RESET_ALL, FG_RESET, BG_RESET
+    if fill_background:
+        for y in range(height):
+            cc.print_at(0, y, ' ' * width)
+    for i in range(0, width * height, 89):
+        y, x = divmod(i, width)
+        cc.current_style = BRIGHT if i % 2 else RESET_ALL
+        cc.current_fg = FG_RED if i % 3 else FG_GREEN
+        cc.current_bg = BG_BLUE if i % 5 == 0 else BG_RESET
+        cc.print_at(x, y, '*')
+    return cc
+
+
+class TestColoramaCanvasStorage(unittest.TestCase):
+    def test_partial_attributes_are_merged(self):
+        cc = ColoramaCanvas(10, 3)
+        cc.current_fg = FG_RED
+        cc.print_at(0, 1, 'abcdef')
+        cc.current_fg = None
+        cc.current_bg = BG_BLUE
+        cc.print_at(3, 1, 'XYZ')
+        self.assertEqual(('c', Style.RESET_ALL, FG_RED, None), cc.get_cell(2, 1))
+        self.assertEqual(('X', Style.RESET_ALL, FG_RED, BG_BLUE), cc.get_cell(3, 1))
+        self.assertEqual((' ', Style.RESET_ALL, None, None), cc.get_cell(7, 1))
+
+    def test_palette_is_shared(self):
+        cc = create_scatter_like_canvas(50, 10)
+        # 2 styles x 2 fgs x 2 bgs, plus the initial blank and the reset ones
+        self.assertLessEqual(len(cc.palette), 10)
+        self.assertEqual(50 * 10, len(cc.attrs))
+
+    def test_print_outside_canvas(self):
+        cc = ColoramaCanvas(5, 2)
+        with self.assertLogs(level='ERROR'):
+            with self.assertRaises(IndexError):
+                cc.print_at(3, 0, 'abc')
+        with self.assertLogs(level='ERROR'):
+            with self.assertRaises(IndexError):
+                cc.print_at(0, 2, 'a')
+        # Negative rows count from the bottom, as with the old list-based storage
+        cc.print_at(0, -1, 'a')
+        self.assertEqual('a', cc.get_cell(0, 1)[0])
+
+
+class TestColoramaCanvasRender(unittest.TestCase):
+    def render_lines(self, canvas):
+        lines = []
+        canvas.output_function = lines.append
+        canvas.finish = lambda: None
+        canvas.render()
+        return lines
+
+    def test_render_matches_every_cell_rendering(self):
+        cc = create_scatter_like_canvas(50, 10)
+        cc.current_fg = FG_GREEN
+        cc.print_at(3, 3, 'Hello')
+        cc.current_bg = BG_BLUE
+        cc.print_at(10, 3, 'World')
+        self.assertEqual(emulate_terminal(render_every_cell(cc)),
+                         emulate_terminal(self.render_lines(cc)))
+
+    def test_render_plain_text(self):
+        cc = ColoramaCanvas(5, 2)
+        cc.print_at(1, 0, 'abc')
+        self.assertEqual([' abc ', '     '],
+                         [ESCAPE_CODE_REGEX.sub('', z) for z in self.render_lines(cc)])
+
+    def test_render_output_size(self):
+        """Benchmark of sorts - the output should be a fraction of the size"""
+        cc = create_scatter_like_canvas()
+        old_size = sum(len(z.encode('utf-8')) for z in render_every_cell(cc))
+        new_size = sum(len(z.encode('utf-8')) for z in self.render_lines(cc))
+        self.assertLess(new_size * 10, old_size)
+
+
+class CountingBytesIO(BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.write_count = 0
+
+    def write(self, data):
+        self.write_count += 1
+        return super().write(data)
+
+
+class TestColoramaCanvasStream(unittest.TestCase):
+    def test_render_to_stream(self):
+        stream = CountingBytesIO()
+        cc = ColoramaCanvas(20, 100, stream=stream, stream_chunk_size=500)
+        cc.print_at(1, 2, 'abc')
+        cc.current_fg = FG_RED
+        cc.print_at(4, 99, '\u2581x')
+        cc.render()
+        lines = stream.getvalue().decode('utf-8').split('\n')
+        # 100 rows, the reset line from finish(), and the final newline
+        self.assertEqual(102, len(lines))
+        self.assertEqual(' abc', ESCAPE_CODE_REGEX.sub('', lines[2]).rstrip())
+        self.assertEqual('    \u2581x', ESCAPE_CODE_REGEX.sub('', lines[99]).rstrip())
+        # The rows should have been written in a handful of chunks
+        self.assertLess(stream.write_count, 10)
+
+    def test_stream_matches_output_function(self):
+        stream = BytesIO()
+        cc = create_scatter_like_canvas(50, 10)
+        cc.stream = stream
+        cc.render()
+        lines = []
+        cc.stream = None
+        cc.output_function = lines.append
+        cc.finish = lambda: None
+        cc.render()
+        self.assertEqual(stream.getvalue().decode('utf-8').split('\n')[:10], lines)
+
+
+class TestSparseColoramaCanvas(unittest.TestCase):
+    def render_lines(self, canvas):
+        lines = []
+        canvas.output_function = lines.append
+        canvas.finish = lambda: None
+        canvas.render()
+        return lines
+
+    def test_sparse_matches_dense(self):
+        for fill_background in (False, True):
+            dense = create_scatter_like_canvas(50, 10, ColoramaCanvas, fill_background)
+            sparse = create_scatter_like_canvas(50, 10, SparseColoramaCanvas,
+                                                fill_background)
+            for cc in (dense, sparse):
+                cc.current_fg = FG_GREEN
+                cc.print_at(3, 3, 'Hello')
+                cc.current_fg = None
+                cc.current_bg = BG_BLUE
+                cc.print_at(5, 3, 'World')
+                cc.print_at(45, -1, 'end')
+            self.assertEqual(self.render_lines(dense), self.render_lines(sparse))
+            self.assertEqual(dense.get_cell(6, 3), sparse.get_cell(6, 3))
+
+    def test_sparse_only_stores_non_blank_cells(self):
+        cc = create_scatter_like_canvas(200, 60, SparseColoramaCanvas,
+                                        fill_background=False)
+        cc.current_style, cc.current_fg, cc.current_bg = None, None, None
+        cc.print_at(1, 0, '   ') # Blank - so shouldn't be stored
+        self.assertEqual(len(range(0, 200 * 60, 89)),
+                         sum(len(z) for z in cc.rows.values()))
+
+    def test_sparse_print_outside_canvas(self):
+        cc = SparseColoramaCanvas(5, 2)
+        with self.assertLogs(level='ERROR'):
+            with self.assertRaises(IndexError):
+                cc.print_at(4, 1, 'ab')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 
+from datetime import date
 import unittest
 
 from ..date_related import (monthstring, pad_month_list_as_tuples,
-                             pad_month_list_as_strings)
+                             pad_month_list_as_strings, month_end_dates)
 
 
 class TestMonthString(unittest.TestCase):
@@ -38,3 +39,14 @@ class TestMonthListStrings(unittest.TestCase):
         self.assertEqual(['2018-04', '2018-05', '2018-06', '2018-07'],
                          list(pad_month_list_as_strings(['2018-04', '2018-05', '2018-07'])))
 
+
+
+class TestMonthEndDates(unittest.TestCase):
+    def test_month_end_dates(self):
+        self.assertEqual([date(2019, 11, 30), date(2019, 12, 31), date(2020, 1, 31),
+                          date(2020, 2, 29), date(2020, 3, 10)],
+                         list(month_end_dates(date(2019, 11, 5), date(2020, 3, 10))))
+
+    def test_same_month(self):
+        self.assertEqual([date(2020, 3, 10)],
+                         list(month_end_dates(date(2020, 3, 1), date(2020, 3, 10))))
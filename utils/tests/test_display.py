@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+from io import StringIO
+import json
+import unittest
+
+from ..display import render_ratings_as_bar, ColourConfig, DEFAULT_CHAR
+
+MOCK_COLOUR_CONFIG = {
+    'categories': {
+        'shelves': {
+            'width': 2,
+            'mappings': [
+                ['favourites', {'ch': 'F '}],
+                ['science-fiction', {'ch': 'S ', 'fg': 'lightyellow'}],
+                ['fantasy', {'ch': 'f ', 'bg': 'green'}],
+                ['signed', {'st': 'bright', 'style': 'bright'}]
+            ]
+        }
+    }
+}
+
+
+class TestRenderRatingsAsBar(unittest.TestCase):
+    def test_plain_bar(self):
+        self.assertEqual('1111122222333334444455555',
+                         render_ratings_as_bar([None, 1, 1, 1, 1, 1], width=25,
+                                               use_unicode=False, use_colour=False))
+
+    def test_rounding_reaches_width(self):
+        # 10 * 1/3 each - the spare character goes to the first of the tied
+        # fractional parts
+        self.assertEqual('1111333444',
+                         render_ratings_as_bar([None, 1, 0, 1, 1, 0], width=10,
+                                               use_unicode=False, use_colour=False))
+        bar = render_ratings_as_bar([None, 3, 7, 2, 9, 1], width=17,
+                                    use_unicode=True, use_colour=False)
+        self.assertEqual(17, len(bar))
+
+    def test_accepts_any_sequence(self):
+        # Lists aren't hashable, but the result is cached on a tuple of them
+        ratings = [None, 0, 2, 0, 0, 2]
+        first = render_ratings_as_bar(ratings, width=4, use_unicode=False,
+                                      use_colour=False)
+        ratings[1] = 4
+        self.assertEqual('2255', first)
+        self.assertEqual('11112255',
+                         render_ratings_as_bar(ratings, width=8, use_unicode=False,
+                                               use_colour=False))
+
+
+class TestColourConfig(unittest.TestCase):
+    def setUp(self):
+        self.cfg = ColourConfig(StringIO(json.dumps(MOCK_COLOUR_CONFIG)), 'shelves')
+
+    def test_default(self):
+        self.assertEqual(DEFAULT_CHAR * 2,
+                         self.cfg.get_colour_bits(('to-read', 'owned'))[3])
+        self.assertEqual({'': self.cfg._blobbify(
+            self.cfg.get_colour_bits(('to-read',)))}, self.cfg.colour_guide)
+
+    def test_earlier_rules_take_priority(self):
+        self.assertEqual('S ', self.cfg.get_colour_bits(('fantasy',
+                                                         'science-fiction'))[3])
+        self.assertEqual('F ', self.cfg.get_colour_bits(('favourites', 'fantasy',
+                                                         'science-fiction'))[3])
+        self.assertEqual(['fantasy / favourites / science-fiction',
+                          'fantasy / science-fiction'],
+                         sorted(self.cfg.colour_guide))
+
+    def test_colour_guide_populated_from_cache(self):
+        shelves = ('signed', 'fantasy')
+        bits = self.cfg.get_colour_bits(shelves)
+        self.cfg.colour_guide.clear()
+        self.assertEqual(bits, self.cfg.get_colour_bits(shelves))
+        self.assertEqual(['fantasy / signed'], list(self.cfg.colour_guide))
+
+    def test_select_category_resets_cache(self):
+        self.cfg.get_colour_bits(('fantasy',))
+        self.cfg.colour_cfg['categories']['shelves']['mappings'][2][1]['ch'] = 'X '
+        self.assertEqual('f ', self.cfg.get_colour_bits(('fantasy',))[3])
+        self.cfg.select_category('shelves')
+        self.assertEqual('X ', self.cfg.get_colour_bits(('fantasy',))[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+import random
+import unittest
+
+from ..external_sort import ExternalSorter
+
+MockItem = namedtuple('MockItem', 'key, seq')
+
+
+class TestExternalSorter(unittest.TestCase):
+    def test_matches_sorted(self):
+        rnd = random.Random(1234)
+        items = [MockItem(rnd.randint(0, 50), i) for i in range(2500)]
+        for chunk_size in (1, 7, 1000, 5000):
+            sorter = ExternalSorter(iter(items), key=lambda z: z.key,
+                                    chunk_size=chunk_size)
+            self.assertEqual(2500, len(sorter))
+            # Equal keys should retain their original order
+            self.assertEqual(sorted(items, key=lambda z: z.key), list(sorter))
+
+    def test_spills_runs(self):
+        sorter = ExternalSorter(range(25), key=lambda z: -z, chunk_size=10)
+        self.assertEqual(2, len(sorter.run_files))
+        self.assertEqual(list(range(24, -1, -1)), list(sorter))
+
+    def test_empty(self):
+        sorter = ExternalSorter([], key=lambda z: z, chunk_size=10)
+        self.assertEqual(0, len(sorter))
+        self.assertEqual([], list(sorter))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+import random
+import statistics
+import unittest
+
+from ..group_by import GroupBy, MetricAccumulator
+
+MockBook = namedtuple('MockBook', 'title, decade, shelves, rating, pagination')
+
+BOOKS = [
+    MockBook('A', '1980s', ['sf', 'fantasy'], 4, 300),
+    MockBook('B', '1980s', ['sf'], 2, None),
+    MockBook('C', '1990s', [], 5, 500),
+    MockBook('D', None, ['fantasy'], None, 100),
+    MockBook('E', '1990s', ['sf'], 3, 200)
+]
+
+
+class TestMetricAccumulator(unittest.TestCase):
+    def test_matches_statistics(self):
+        rnd = random.Random(4321)
+        for qty in (1, 2, 7, 100):
+            vals = [rnd.randint(1, 5) for _ in range(qty)]
+            acc = MetricAccumulator(track_distribution=True)
+            for val in vals:
+                acc.add(val)
+            self.assertEqual(qty, acc.count)
+            self.assertEqual(sum(vals), acc.sum)
+            self.assertEqual(min(vals), acc.min)
+            self.assertEqual(max(vals), acc.max)
+            self.assertAlmostEqual(statistics.mean(vals), acc.mean)
+            self.assertAlmostEqual(statistics.pstdev(vals), acc.stddev)
+            self.assertEqual(statistics.median(vals), acc.median)
+
+    def test_empty(self):
+        acc = MetricAccumulator(track_distribution=True)
+        self.assertEqual(0, acc.count)
+        self.assertIsNone(acc.mean)
+        self.assertIsNone(acc.stddev)
+        self.assertIsNone(acc.median)
+
+    def test_median_needs_distribution(self):
+        acc = MetricAccumulator()
+        acc.add(1)
+        with self.assertRaises(ValueError):
+            acc.aggregate('median')
+
+    def test_unknown_aggregate(self):
+        with self.assertRaises(ValueError):
+            MetricAccumulator().aggregate('mode')
+
+
+class TestGroupBy(unittest.TestCase):
+    def test_scalar_key(self):
+        grouped = GroupBy('decade', ['rating']).add_all(BOOKS)
+        self.assertEqual({'1980s': 3, '1990s': 4}, grouped.aggregate('mean'))
+        self.assertEqual({'1980s': 2, '1990s': 2}, grouped.aggregate('count'))
+
+    def test_multi_valued_key(self):
+        grouped = GroupBy('shelves', ['pagination']).add_all(BOOKS)
+        self.assertEqual({'sf': 500, 'fantasy': 400}, grouped.aggregate('sum'))
+
+    def test_function_key(self):
+        grouped = GroupBy(lambda book: book.title.lower(),
+                          ['pagination']).add_all(BOOKS)
+        self.assertEqual(['a', 'c', 'd', 'e'], list(grouped.aggregate('max')))
+
+    def test_missing_values(self):
+        grouped = GroupBy('decade', ['pagination'],
+                          missing_value_key='*Missing*').add_all(BOOKS)
+        self.assertEqual({'1980s': 1, '*Missing*': 1, '1990s': 2, None: 1},
+                         grouped.aggregate('count'))
+        self.assertEqual(0, grouped.aggregate('sum')['*Missing*'])
+
+    def test_undefined_keys(self):
+        grouped = GroupBy('decade', ['pagination'],
+                          ignore_undefined_keys=True).add_all(BOOKS)
+        self.assertNotIn(None, grouped.aggregate('count'))
+
+    def test_secondary_metric(self):
+        grouped = GroupBy('decade', ['rating', 'pagination'],
+                          distributions=['rating']).add_all(BOOKS)
+        # Book B has no pagination, but its rating still counts
+        self.assertEqual({'1980s': 2, '1990s': 2}, grouped.aggregate('count'))
+        self.assertEqual({'1980s': 300, '1990s': 700},
+                         grouped.aggregate('sum', 'pagination'))
+        self.assertEqual({'1980s': 3, '1990s': 4}, grouped.aggregate('median'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from ..isfdb_authors import AuthorResolver
+
+
+class MockNormalizer(object):
+    """Stand-in for isfdb_tools' normalize_name(), that counts its calls"""
+    def __init__(self):
+        self.call_count = 0
+
+    def __call__(self, name):
+        self.call_count += 1
+        if name == 'Anne B. Author':
+            return 'Anne Author'
+        elif name == 'Bob J. Writer':
+            return 'Bob Writer'
+        return None
+
+
+class TestAuthorResolver(unittest.TestCase):
+    def setUp(self):
+        self.normalizer = MockNormalizer()
+        self.resolver = AuthorResolver(self.normalizer)
+
+    def test_normalize_is_memoized(self):
+        for _ in range(3):
+            self.assertEqual('Anne Author', self.resolver.normalize('Anne B. Author'))
+            self.assertIsNone(self.resolver.normalize('Nobody Relevant'))
+        self.assertEqual(2, self.normalizer.call_count)
+        self.assertEqual(4, self.resolver.stats[('normalize', 'hit')])
+        self.assertEqual(2, self.resolver.stats[('normalize', 'miss')])
+
+    def test_author_guesses(self):
+        # Unnormalizable names are only tried as-is
+        self.assertEqual(('Nobody Relevant',),
+                         self.resolver.author_guesses('Nobody Relevant'))
+        self.assertEqual(('Anne B. Author', 'Anne Author'),
+                         self.resolver.author_guesses('Anne B. Author'))
+        self.assertEqual(('Anne B. Author', 'Anne Author'),
+                         self.resolver.author_guesses('Anne B. Author'))
+        self.assertEqual(1, self.resolver.stats[('normalize', 'hit')])
+
+
+if __name__ == '__main__':
+    unittest.main()
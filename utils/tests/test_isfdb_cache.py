@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from ..isfdb_cache import LookupCache, cached_lookup
+
+
+class MockNotFoundError(Exception):
+    pass
+
+
+class MockLookup(object):
+    """Stand-in for an ISFDB lookup function, that counts how often it's called"""
+    def __init__(self, results):
+        self.results = results
+        self.call_count = 0
+
+    def __call__(self, conn, key):
+        self.call_count += 1
+        try:
+            return self.results[key]
+        except KeyError:
+            raise MockNotFoundError('%s not found' % (key,))
+
+
+class TestLookupCache(unittest.TestCase):
+    def setUp(self):
+        self.lookup = MockLookup({123: [{'title_id': 1, 'title_title': 'Foo'}],
+                                  456: None})
+
+    def test_found_is_cached(self):
+        cache = LookupCache(':memory:', MockNotFoundError)
+        for _ in range(3):
+            self.assertEqual([{'title_id': 1, 'title_title': 'Foo'}],
+                             cache.cached_call('gr', 123, self.lookup, None, 123))
+        self.assertEqual(1, self.lookup.call_count)
+        self.assertEqual(2, cache.stats[('gr', 'hit')])
+        self.assertEqual(1, cache.stats[('gr', 'miss')])
+
+    def test_not_found_is_cached(self):
+        cache = LookupCache(':memory:', MockNotFoundError)
+        for _ in range(3):
+            with self.assertRaises(MockNotFoundError):
+                cache.cached_call('gr', 789, self.lookup, None, 789)
+        self.assertEqual(1, self.lookup.call_count)
+
+    def test_empty_is_cached(self):
+        cache = LookupCache(':memory:', MockNotFoundError)
+        self.assertIsNone(cache.cached_call('gr', 456, self.lookup, None, 456))
+        self.assertIsNone(cache.cached_call('gr', 456, self.lookup, None, 456))
+        self.assertEqual(1, self.lookup.call_count)
+
+    def test_negative_results_expire(self):
+        cache = LookupCache(':memory:', MockNotFoundError, negative_ttl=-1)
+        for _ in range(2):
+            with self.assertRaises(MockNotFoundError):
+                cache.cached_call('gr', 789, self.lookup, None, 789)
+            self.assertIsNone(cache.cached_call('gr', 456, self.lookup, None, 456))
+        self.assertEqual(4, self.lookup.call_count)
+        # ... but found results don't
+        cache.cached_call('gr', 123, self.lookup, None, 123)
+        cache.cached_call('gr', 123, self.lookup, None, 123)
+        self.assertEqual(5, self.lookup.call_count)
+
+    def test_namespaces_are_separate(self):
+        cache = LookupCache(':memory:', MockNotFoundError)
+        cache.cached_call('gr', 123, self.lookup, None, 123)
+        cache.cached_call('isbn', 123, self.lookup, None, 123)
+        self.assertEqual(2, self.lookup.call_count)
+
+    def test_persistence_and_dump_version(self):
+        fd, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        try:
+            cache = LookupCache(filename, MockNotFoundError, dump_version='2020-01-01')
+            cache.cached_call('gr', 123, self.lookup, None, 123)
+            cache.close()
+
+            cache = LookupCache(filename, MockNotFoundError, dump_version='2020-01-01')
+            cache.cached_call('gr', 123, self.lookup, None, 123)
+            cache.close()
+            self.assertEqual(1, self.lookup.call_count)
+
+            cache = LookupCache(filename, MockNotFoundError, dump_version='2021-01-01')
+            cache.cached_call('gr', 123, self.lookup, None, 123)
+            cache.close()
+            self.assertEqual(2, self.lookup.call_count)
+        finally:
+            os.remove(filename)
+
+    def test_no_cache(self):
+        cached_lookup(None, 'gr', 123, self.lookup, None, 123)
+        cached_lookup(None, 'gr', 123, self.lookup, None, 123)
+        self.assertEqual(2, self.lookup.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
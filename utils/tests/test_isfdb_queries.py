@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import sqlite3
+import unittest
+
+from .. import isfdb_queries
+from ..isfdb_queries import (ResolvedTitle, batch_titles_for_goodreads_ids,
+                             batch_titles_for_isbns, isbn10_from_isbn13,
+                             resolve_book_batch, resolve_books_in_batches)
+
+# Just enough of the ISFDB schema for the batch queries
+MOCK_SCHEMA = """
+CREATE TABLE titles (title_id INTEGER PRIMARY KEY, title_title TEXT,
+                     title_ttype TEXT);
+CREATE TABLE pubs (pub_id INTEGER PRIMARY KEY, pub_title TEXT, pub_ctype TEXT,
+                   pub_isbn TEXT);
+CREATE TABLE pub_content (pubc_id INTEGER PRIMARY KEY, title_id INTEGER,
+                          pub_id INTEGER);
+CREATE TABLE identifier_types (identifier_type_id INTEGER PRIMARY KEY,
+                               identifier_type_name TEXT);
+CREATE TABLE identifiers (identifier_id INTEGER PRIMARY KEY,
+                          identifier_type_id INTEGER, identifier_value TEXT,
+                          pub_id INTEGER);
+
+INSERT INTO titles VALUES (1, 'Foo', 'NOVEL'), (2, 'Foo cover', 'COVERART'),
+                          (3, 'Bar', 'ANTHOLOGY'), (4, 'Bar story', 'SHORTFICTION'),
+                          (5, 'Baz', 'NOVEL');
+INSERT INTO pubs VALUES (10, 'Foo', 'NOVEL', '9780000000002'),
+                        (11, 'Foo', 'NOVEL', '0575000007'),
+                        (30, 'Bar', 'ANTHOLOGY', NULL),
+                        (50, 'Baz', 'NOVEL', '9781111111113');
+INSERT INTO pub_content (title_id, pub_id) VALUES (1, 10), (2, 10), (1, 11),
+                                                  (3, 30), (4, 30), (5, 50);
+INSERT INTO identifier_types VALUES (1, 'ASIN'), (2, 'Goodreads');
+INSERT INTO identifiers VALUES (100, 2, '333', 30), (101, 1, '555', 50),
+                               (102, 2, '111', 10), (103, 2, '111', 11);
+"""
+
+
+class MockBookForIsfdbQueries(object):
+    def __init__(self, book_id, isbn=None, isbn13=None):
+        self.book_id = book_id
+        self.isbn = isbn
+        self.isbn13 = isbn13
+
+
+def create_mock_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(MOCK_SCHEMA)
+    return conn
+
+
+class TestIsbnConversion(unittest.TestCase):
+    def test_isbn10_from_isbn13(self):
+        self.assertEqual('0575000007', isbn10_from_isbn13('9780575000001'))
+        self.assertEqual('080442957X', isbn10_from_isbn13('9780804429573'))
+        self.assertIsNone(isbn10_from_isbn13('9790000000001'))
+        self.assertIsNone(isbn10_from_isbn13(None))
+
+
+class TestBatchQueries(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_mock_db()
+
+    def test_goodreads_ids(self):
+        ret = batch_titles_for_goodreads_ids(self.conn, [111, 333, 555, 999])
+        self.assertEqual({111: [ResolvedTitle(1, 'Foo', 10),
+                                ResolvedTitle(1, 'Foo', 11)],
+                          333: [ResolvedTitle(3, 'Bar', 30)]},
+                         ret)
+
+    def test_isbns(self):
+        ret = batch_titles_for_isbns(self.conn, ['0575000007', '9781111111113',
+                                                 '1234567890'])
+        self.assertEqual({'0575000007': [ResolvedTitle(1, 'Foo', 11)],
+                          '9781111111113': [ResolvedTitle(5, 'Baz', 50)]},
+                         ret)
+
+    def test_chunking(self):
+        self.assertEqual([[1, 2], [3]], list(isfdb_queries.chunked([1, 2, 3], 2)))
+        # More ids than fit in a single IN-list
+        ret = batch_titles_for_goodreads_ids(self.conn,
+                                             [111] + list(range(1000, 2000)) + [333])
+        self.assertEqual([111, 333], sorted(ret.keys()))
+
+    def test_resolve_book_batch(self):
+        books = [MockBookForIsfdbQueries(333),
+                 MockBookForIsfdbQueries(444, isbn13='9781111111113'),
+                 # Only in ISFDB under the ISBN-10
+                 MockBookForIsfdbQueries(666, isbn13='9780575000001'),
+                 MockBookForIsfdbQueries(777, isbn='1234567890'),
+                 MockBookForIsfdbQueries(888)]
+        self.assertEqual([('goodreads_id', [ResolvedTitle(3, 'Bar', 30)]),
+                          ('isbn', [ResolvedTitle(5, 'Baz', 50)]),
+                          ('isbn', [ResolvedTitle(1, 'Foo', 11)]),
+                          (None, []),
+                          (None, [])],
+                         resolve_book_batch(self.conn, books))
+
+    def test_resolve_books_in_batches_preserves_order(self):
+        books = [MockBookForIsfdbQueries(z) for z in (999, 333, 111, 888, 333)]
+        ret = list(resolve_books_in_batches(self.conn, iter(books), batch_size=2))
+        self.assertEqual([999, 333, 111, 888, 333], [z[0].book_id for z in ret])
+        self.assertEqual([None, 'goodreads_id', 'goodreads_id', None, 'goodreads_id'],
+                         [z[1] for z in ret])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ..isfdb_authors import AuthorResolver
+from ..isfdb_queries import ResolvedTitle, resolve_book_batch
+from ..isfdb_snapshot import (extract_snapshot, find_reachable_ids, open_snapshot,
+                              create_engine)
+from .test_isfdb_queries import MOCK_SCHEMA
+
+# On top of the tables in MOCK_SCHEMA.  Author 3 is a pseudonym of author 2,
+# and title 7 is a variant of title 6.
+ADDITIONAL_MOCK_SCHEMA = """
+CREATE TABLE authors (author_id INTEGER PRIMARY KEY, author_canonical TEXT);
+CREATE TABLE canonical_author (ca_id INTEGER PRIMARY KEY, title_id INTEGER,
+                               author_id INTEGER);
+CREATE TABLE pub_authors (pa_id INTEGER PRIMARY KEY, pub_id INTEGER,
+                          author_id INTEGER);
+CREATE TABLE pseudonyms (pseudo_id INTEGER PRIMARY KEY, author_id INTEGER,
+                         pseudonym INTEGER);
+CREATE TABLE tags (tag_id INTEGER PRIMARY KEY, tag_name TEXT);
+CREATE TABLE tag_mapping (tagmap_id INTEGER PRIMARY KEY, tag_id INTEGER,
+                          title_id INTEGER);
+
+ALTER TABLE titles ADD COLUMN title_parent INTEGER DEFAULT 0;
+INSERT INTO titles (title_id, title_title, title_ttype, title_parent)
+            VALUES (6, 'Qux', 'NOVEL', 0), (7, 'Le Qux', 'NOVEL', 6),
+                   (8, 'Unrelated', 'NOVEL', 0);
+INSERT INTO pubs VALUES (60, 'Qux', 'NOVEL', NULL), (80, 'Unrelated', 'NOVEL', NULL);
+INSERT INTO pub_content (title_id, pub_id) VALUES (6, 60), (8, 80);
+
+INSERT INTO authors VALUES (1, 'Anne Author'), (2, 'Bob Writer'),
+                           (3, 'Robert Writer'), (4, 'Nobody Relevant');
+INSERT INTO canonical_author (title_id, author_id) VALUES (3, 1), (4, 2), (6, 3),
+                                                          (7, 3), (8, 4);
+INSERT INTO pub_authors (pub_id, author_id) VALUES (30, 1), (60, 3), (80, 4);
+INSERT INTO pseudonyms (author_id, pseudonym) VALUES (2, 3);
+INSERT INTO tags VALUES (1, 'science fiction'), (2, 'fantasy');
+INSERT INTO tag_mapping (tag_id, title_id) VALUES (1, 3), (2, 8);
+"""
+
+
+class MockBookForIsfdbSnapshot(object):
+    def __init__(self, book_id, author, isbn=None, isbn13=None):
+        self.book_id = book_id
+        self.all_authors = [author]
+        self.isbn = isbn
+        self.isbn13 = isbn13
+
+
+MOCK_BOOKS = [
+    MockBookForIsfdbSnapshot(333, 'Anne Author'), # anthology 3/pub 30 via GR id
+    MockBookForIsfdbSnapshot(999, 'Bob Writer') # no match, but is a known author
+]
+
+
+def create_mock_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(MOCK_SCHEMA)
+    conn.executescript(ADDITIONAL_MOCK_SCHEMA)
+    return conn
+
+
+class TestFindReachableIds(unittest.TestCase):
+    def test_find_reachable_ids(self):
+        reachable = find_reachable_ids(create_mock_db(), MOCK_BOOKS)
+        # Title 4 is by Bob Writer, and is in the anthology; title 6 is by
+        # his pseudonym, and has variant title 7.
+        self.assertEqual({3, 4, 6, 7}, reachable['title_id'])
+        self.assertEqual({30, 60}, reachable['pub_id'])
+        self.assertEqual({1, 2, 3}, reachable['author_id'])
+        self.assertEqual({1}, reachable['tag_id'])
+
+    def test_normalized_author_names(self):
+        books = [MockBookForIsfdbSnapshot(999, 'Bob J. Writer')]
+        # Without the normalized name, nothing by the author is found
+        self.assertEqual(set(), find_reachable_ids(create_mock_db(),
+                                                   books)['title_id'])
+        resolver = AuthorResolver(lambda name: name.replace(' J.', ''))
+        reachable = find_reachable_ids(create_mock_db(), books, resolver)
+        self.assertEqual({3, 4, 6, 7}, reachable['title_id'])
+        self.assertEqual({1, 2, 3}, reachable['author_id'])
+
+
+class TestExtractSnapshot(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_extract_snapshot(self):
+        src_conn = create_mock_db()
+        row_counts = extract_snapshot(src_conn, self.filename, MOCK_BOOKS)
+        self.assertEqual(4, row_counts['titles'])
+        self.assertEqual(2, row_counts['pubs'])
+        self.assertEqual(2, row_counts['identifier_types'])
+        self.assertEqual(1, row_counts['tags'])
+
+        snapshot_conn = sqlite3.connect(self.filename)
+        self.assertEqual([(1, 'science fiction')],
+                         snapshot_conn.execute('SELECT * FROM tags').fetchall())
+        # Queries against the snapshot give the same answers as the full DB
+        # for the books it was made from
+        self.assertEqual([('goodreads_id', [ResolvedTitle(3, 'Bar', 30)]),
+                          (None, [])],
+                         resolve_book_batch(snapshot_conn, MOCK_BOOKS))
+        indexes = snapshot_conn.execute("SELECT name FROM sqlite_master "
+                                        "WHERE type = 'index'").fetchall()
+        self.assertIn(('pubs_pub_isbn_idx',), indexes)
+        snapshot_conn.close()
+
+    @unittest.skipIf(create_engine is None, 'SQLAlchemy not installed')
+    def test_open_snapshot(self):
+        extract_snapshot(create_mock_db(), self.filename, MOCK_BOOKS)
+        conn = open_snapshot(self.filename)
+        self.assertEqual([('goodreads_id', [ResolvedTitle(3, 'Bar', 30)]),
+                          (None, [])],
+                         resolve_book_batch(conn, MOCK_BOOKS))
+        conn.close()
+
+    def test_open_missing_snapshot(self):
+        with self.assertRaises(FileNotFoundError):
+            open_snapshot(self.filename + '.missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
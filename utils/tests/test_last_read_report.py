@@ -37,6 +37,16 @@ class MockBookForTestLastReadReport(object):
         self.is_unread = not is_read
         self.date_read = date_read
         self.title = title
+        self.shelves = []
+
+    def property_as_sequence(self, property_name):
+        return getattr(self, property_name)
+
+
+def mock_book_on_shelves(is_read, date_read, title, shelves):
+    bk = MockBookForTestLastReadReport(is_read, date_read, title)
+    bk.shelves = shelves
+    return bk
 
 
 class TestLastReadReport(unittest.TestCase):
@@ -59,7 +69,17 @@ class TestLastReadReport(unittest.TestCase):
                           LastReadDetail('foo', 1006, 'Foo3', 1)],
                          sorted(lrr.data))
 
-
-
-
-
+    def test_last_read_report_from_books(self):
+        books = (z for z in [
+            mock_book_on_shelves(True, date(2010,1,1), 'Foo1', ['foo']),
+            mock_book_on_shelves(False, None, 'Foo2', ['foo', 'bar', '']),
+            mock_book_on_shelves(True, date(2011,1,1), 'Bar1', ['bar', 'foo', 'bar']),
+            mock_book_on_shelves(False, None, 'Baz1', ['baz']),
+            mock_book_on_shelves(True, date(2012,1,1), 'A title that is much too long to display',
+                                 ['bar'])])
+        lrr = LastReadReport(books, 'shelves')
+        lrr.process(as_of_date=date(2013,1,1))
+        self.assertEqual([LastReadDetail('bar', 366, 'A title that is much too long to...', 1),
+                          LastReadDetail('baz', 0, 'N/A', 1),
+                          LastReadDetail('foo', 731, 'Bar1', 1)],
+                         sorted(lrr.data))
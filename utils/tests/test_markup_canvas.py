@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+from io import BytesIO
+import unittest
+from unittest.mock import patch
+import xml.etree.ElementTree as ET
+
+from .. import markup_canvas
+from ..colorama_canvas import SparseColoramaCanvas
+from ..markup_canvas import (HtmlCanvas, SvgCanvas, MarkupCanvas, css_properties,
+                             add_canvas_arguments, canvas_class_from_args)
+
+# Hardcoded, so that the tests don't depend on whether colorama is installed
+FG_RED = '\x1b[31m'
+BG_BLUE = '\x1b[44m'
+BRIGHT = '\x1b[1m'
+
+MOCK_FG_NAMES = {FG_RED: 'RED'}
+MOCK_BG_NAMES = {BG_BLUE: 'BLUE'}
+MOCK_STYLE_NAMES = {BRIGHT: 'BRIGHT'}
+
+
+def draw_something(canvas):
+    canvas.print_at(0, 0, 'a<b')
+    canvas.current_fg = FG_RED
+    canvas.print_at(4, 0, 'red')
+    canvas.current_bg = BG_BLUE
+    canvas.current_style = BRIGHT
+    canvas.print_at(1, 1, 'X&Y')
+    return canvas
+
+
+@patch.dict(markup_canvas.FG_NAMES, MOCK_FG_NAMES)
+@patch.dict(markup_canvas.BG_NAMES, MOCK_BG_NAMES)
+@patch.dict(markup_canvas.STYLE_NAMES, MOCK_STYLE_NAMES)
+class TestMarkupCanvas(unittest.TestCase):
+    def test_css_properties(self):
+        self.assertEqual([('color', '#cd0000'), ('background-color', '#0000ee'),
+                          ('font-weight', 'bold')],
+                         css_properties(BRIGHT, FG_RED, BG_BLUE))
+        self.assertEqual([], css_properties(None, None, '\x1b[49m'))
+
+    def test_html_canvas(self):
+        output = []
+        cc = draw_something(HtmlCanvas(8, 2, output_function=output.append))
+        cc.render()
+        self.assertEqual(1, len(output))
+        self.assertEqual('<pre class="gr-chart">\n'
+                         'a&lt;b <span style="color:#cd0000">red</span> \n'
+                         ' <span style="color:#cd0000;background-color:#0000ee;'
+                         'font-weight:bold">X&amp;Y</span>    \n'
+                         '</pre>\n', output[0])
+
+    def test_svg_canvas(self):
+        stream = BytesIO()
+        cc = draw_something(SvgCanvas(8, 2, cell_width=10, cell_height=20,
+                                      stream=stream))
+        cc.render()
+        root = ET.fromstring(stream.getvalue())
+        ns = '{http://www.w3.org/2000/svg}'
+        self.assertEqual('80', root.get('width'))
+        texts = root.findall(ns + 'text')
+        self.assertEqual(['a<b', 'red', 'X&Y'], [z.text for z in texts])
+        self.assertEqual(('40', '16', '#cd0000'),
+                         (texts[1].get('x'), texts[1].get('y'), texts[1].get('fill')))
+        self.assertEqual('bold', texts[2].get('font-weight'))
+        rects = root.findall(ns + 'rect')
+        self.assertEqual([('10', '20', '30', '#0000ee')],
+                         [(z.get('x'), z.get('y'), z.get('width'), z.get('fill'))
+                          for z in rects])
+
+    def test_captions(self):
+        output = []
+        HtmlCanvas(4, 1, caption='2020-01-31',
+                   output_function=output.append).render()
+        self.assertTrue(output[0].startswith('<figure>\n'
+                                             '<figcaption>2020-01-31</figcaption>\n'
+                                             '<pre class="gr-chart">'))
+
+        stream = BytesIO()
+        cc = draw_something(SvgCanvas(8, 2, cell_width=10, cell_height=20,
+                                      caption='2020-01-31', stream=stream))
+        cc.render()
+        root = ET.fromstring(stream.getvalue())
+        ns = '{http://www.w3.org/2000/svg}'
+        self.assertEqual('60', root.get('height'))
+        self.assertEqual('2020-01-31', root.find(ns + 'title').text)
+        self.assertEqual('2020-01-31', root.find(ns + 'text').text)
+        self.assertEqual(['a<b', 'red', 'X&Y'],
+                         [z.text for z in root.find(ns + 'g').findall(ns + 'text')])
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            MarkupCanvas(8, 2)
+
+
+class TestCanvasArguments(unittest.TestCase):
+    def canvas_class(self, argv, **kwargs):
+        parser = ArgumentParser()
+        add_canvas_arguments(parser)
+        return canvas_class_from_args(parser.parse_args(argv), **kwargs)
+
+    def test_canvas_class_from_args(self):
+        self.assertIs(SvgCanvas, self.canvas_class(['-g', 'svg']))
+        self.assertIs(HtmlCanvas, self.canvas_class(['-g', 'html'],
+                                                    ansi_class=SparseColoramaCanvas))
+        self.assertIs(SparseColoramaCanvas,
+                      self.canvas_class([], ansi_class=SparseColoramaCanvas))
+
+
+if __name__ == '__main__':
+    unittest.main()
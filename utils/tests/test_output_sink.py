@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+import json
+import unittest
+
+from ..output_sink import create_output_sink, OutputSink, TextSink
+
+MockStat = namedtuple('MockStat', 'key, average, date, shelves')
+
+
+class CountingStringIO(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.write_count = 0
+
+    def write(self, data):
+        self.write_count += 1
+        return super().write(data)
+
+
+class BrokenStream(object):
+    def write(self, data):
+        raise BrokenPipeError()
+
+    def flush(self):
+        raise BrokenPipeError()
+
+
+class TestOutputSink(unittest.TestCase):
+    def test_text_is_buffered(self):
+        stream = CountingStringIO()
+        with TextSink(stream, buffer_size=1000) as sink:
+            for i in range(1000):
+                sink('Line %d' % (i))
+            sink()
+        lines = stream.getvalue().split('\n')
+        self.assertEqual(['Line 0', 'Line 1'], lines[:2])
+        self.assertEqual(['Line 999', '', ''], lines[-3:])
+        self.assertLess(stream.write_count, 20)
+
+    def test_jsonl(self):
+        stream = StringIO()
+        with create_output_sink('jsonl', stream) as sink:
+            sink(MockStat('sf', Decimal('3.5'), date(2020, 1, 2), {'b', 'a'}))
+            sink('') # Blank lines are dropped
+            sink('Some text')
+        self.assertEqual([{'key': 'sf', 'average': 3.5, 'date': '2020-01-02',
+                           'shelves': ['a', 'b']},
+                          {'text': 'Some text'}],
+                         [json.loads(z) for z in stream.getvalue().splitlines()])
+
+    def test_csv(self):
+        stream = StringIO()
+        with create_output_sink('csv', stream) as sink:
+            sink(MockStat('sf, fantasy', Decimal('3.5'), date(2020, 1, 2), {'b', 'a'}))
+            sink(MockStat('horror', 4, None, set()))
+        self.assertEqual(['key,average,date,shelves',
+                          '"sf, fantasy",3.5,2020-01-02,"a, b"',
+                          'horror,4,,'],
+                         stream.getvalue().splitlines())
+
+    def test_broken_pipe(self):
+        sink = TextSink(BrokenStream(), buffer_size=10)
+        with self.assertRaises(SystemExit):
+            sink('More than ten characters')
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            OutputSink(StringIO())
+
+    @unittest.skipIf(find_spec('pyarrow') is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        import pyarrow.ipc
+        stream = BytesIO()
+        with create_output_sink('arrow', stream) as sink:
+            sink(MockStat('sf', 3.5, date(2020, 1, 2), {'b', 'a'}))
+            sink(MockStat('horror', 4.0, None, set()))
+        stream.seek(0)
+        table = pyarrow.ipc.open_file(stream).read_all()
+        self.assertEqual(['sf', 'horror'], table.column('key').to_pylist())
+        self.assertEqual([['a', 'b'], []], table.column('shelves').to_pylist())
+
+    @unittest.skipIf(find_spec('pyarrow') is not None, 'pyarrow is installed')
+    def test_arrow_without_pyarrow(self):
+        with self.assertRaises(ImportError):
+            create_output_sink('arrow', BytesIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
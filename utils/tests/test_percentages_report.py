@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from ..transformers import count_books_by_key, percentages_report, PercentageStat
+
+
+class MockBookForPercentagesReport(object):
+    def __init__(self, book_id, shelves):
+        self.book_id = book_id
+        self.shelves = shelves
+
+    def property_as_sequence(self, property_name):
+        return getattr(self, property_name)
+
+
+MOCK_BOOKS = [
+    MockBookForPercentagesReport(1, ['sf', 'novel']),
+    MockBookForPercentagesReport(2, ['fantasy', 'novel', 'novel']),
+    MockBookForPercentagesReport(3, ['sf']),
+    MockBookForPercentagesReport(1, ['sf', 'novel']), # Duplicate, e.g. merged exports
+    MockBookForPercentagesReport(4, ['']), # Undefined, so ignored
+    MockBookForPercentagesReport(5, ['sf', 'short-story'])
+]
+
+
+class TestPercentagesReport(unittest.TestCase):
+    def test_count_books_by_key(self):
+        key_counts, total_books = count_books_by_key(iter(MOCK_BOOKS), 'shelves')
+        self.assertEqual({'sf': 3, 'novel': 2, 'fantasy': 1, 'short-story': 1},
+                         dict(key_counts))
+        self.assertEqual(4, total_books)
+
+    def test_text_output(self):
+        ret = []
+        percentages_report(iter(MOCK_BOOKS), 'shelves', ret.append)
+        self.assertEqual(['sf          :  3 (75%)',
+                          'novel       :  2 (50%)',
+                          'fantasy     :  1 (25%)',
+                          'short-story :  1 (25%)'], ret)
+
+    def test_limited_structured_output(self):
+        ret = []
+        def collector(item):
+            ret.append(item)
+        collector.structured = True
+        percentages_report(iter(MOCK_BOOKS), 'shelves', collector, limit=2)
+        self.assertEqual([PercentageStat('sf', 3, 75.0),
+                          PercentageStat('novel', 2, 50.0)], ret)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+from datetime import date
+import unittest
+
+from ..read_scatter_plot import (ScatterPlot, SPACE_FOR_PUBLICATION_YEAR_LABELS,
+                                 merge_years)
+
+MockBook = namedtuple('MockBook', 'year, date_read')
+
+MOCK_BOOKS = [
+    MockBook(1990, date(2010, 6, 1)),
+    MockBook(1965, date(2012, 1, 1)),
+    MockBook(1990, date(2010, 6, 2)), # Same cell as the first at narrow widths
+    MockBook(2005, date(2008, 3, 15)),
+    MockBook(1972, date(2011, 12, 31))
+]
+
+
+class TestScatterPlotLayout(unittest.TestCase):
+    def test_bounds(self):
+        sp = ScatterPlot(MOCK_BOOKS)
+        self.assertEqual((1965, 2005), (sp.min_year, sp.max_year))
+        self.assertEqual((date(2008, 3, 15), date(2012, 1, 1)),
+                         (sp.min_read_date, sp.max_read_date))
+        self.assertEqual((date(2008, 1, 1), date(2012, 12, 31)),
+                         (sp.min_chart_date, sp.max_chart_date))
+
+    def test_layout(self):
+        sp = ScatterPlot(MOCK_BOOKS).process(max_items_in_year_banding=2)
+        layout = sp.layout(4)
+        # First book is 882 days after the start of 2008
+        self.assertEqual(SPACE_FOR_PUBLICATION_YEAR_LABELS + int(882 * 4 / 365),
+                         layout.x_positions[0])
+        self.assertEqual(layout.x_positions[0], layout.x_positions[2])
+        self.assertEqual(layout.y_positions[0], layout.y_positions[2])
+        self.assertEqual(2, layout.cell_counts[(layout.x_positions[0],
+                                                layout.y_positions[0])])
+        self.assertEqual(5, sum(layout.cell_counts.values()))
+
+        # Cached, and the y positions don't depend on the width
+        self.assertIs(layout, sp.layout(4))
+        wide_layout = sp.layout(72)
+        self.assertEqual(layout.y_positions, wide_layout.y_positions)
+        self.assertEqual(5, len(wide_layout.cell_counts))
+
+    def test_render_density(self):
+        lines = []
+        class Canvas(object):
+            def __init__(self, width, height, stream=None):
+                self.cells = {}
+            def print_at(self, x, y, text):
+                self.cells[(x, y)] = text
+            def render(self):
+                lines.append(self.cells)
+        sp = ScatterPlot(MOCK_BOOKS).process(max_items_in_year_banding=2)
+        colour_function = lambda bk: (None, None, None, '*')
+        sp.render(colour_function, render_width=20, canvas_class=Canvas,
+                  show_density=True)
+        layout = sp.layout(4)
+        self.assertEqual('2', lines[0][(layout.x_positions[0], layout.y_positions[0])])
+        self.assertEqual('*', lines[0][(layout.x_positions[1], layout.y_positions[1])])
+
+
+class TestMergeYears(unittest.TestCase):
+    YEAR_COUNTS = {1953: 1, 1957: 2, 1960: 1, 1961: 1, 1969: 1, 1971: 1,
+                   1972: 1, 1974: 1, 1979: 1, 1984: 1, 1996: 1, 2004: 1,
+                   2007: 1, 2013: 1}
+
+    def test_merge_years(self):
+        year_counts = {1901: 3, 1950: 1, 1952: 2, 1958: 1, 1963: 4, 1991: 10}
+        ranges, year_to_ranges = merge_years(year_counts, 4)
+        self.assertEqual([(1900, 1949), (1950, 1959), (1960, 1969), (1990, 1994)],
+                         ranges)
+        self.assertEqual((1, 1950, 10), year_to_ranges[1955])
+        self.assertEqual((3, 1990, 5), year_to_ranges[1991])
+        self.assertNotIn(1970, year_to_ranges)
+        # The input isn't modified
+        self.assertEqual({1901: 3, 1950: 1, 1952: 2, 1958: 1, 1963: 4, 1991: 10},
+                         year_counts)
+
+    def test_merge_years_smallest_grouping_can_exceed_max(self):
+        ranges, _ = merge_years({2000: 10, 2001: 10}, 5)
+        self.assertEqual([(2000, 2004)], ranges)
+
+    def test_merge_years_optimal(self):
+        groupings = (5, 15, 40)
+        greedy_ranges, _ = merge_years(self.YEAR_COUNTS, 59, groupings)
+        self.assertEqual([(1920, 1959), (1960, 1964), (1965, 1979),
+                          (1980, 1994), (1995, 2009), (2010, 2024)], greedy_ranges)
+        optimal_ranges, year_to_ranges = merge_years(self.YEAR_COUNTS, 59, groupings,
+                                                     optimal=True)
+        # A 15 year band for 1960 would overlap the first band, but that
+        # doesn't rule out a 40 year one
+        self.assertEqual([(1920, 1959), (1960, 1999), (2000, 2039)], optimal_ranges)
+        self.assertEqual((0, 1920, 40), year_to_ranges[1953])
+
+    def test_merge_years_optimal_bands_dont_overlap(self):
+        for year_counts, groupings in (({1925: 5, 1950: 1, 1965: 1}, (5, 15, 40)),
+                                       ({1944: 1, 1955: 1, 1957: 1}, (5, 12))):
+            ranges, year_to_ranges = merge_years(year_counts, 5, groupings,
+                                                 optimal=True)
+            for (_, prev_end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertLess(prev_end, start)
+            for year in year_counts:
+                self.assertEqual(1, len([z for z in ranges if z[0] <= year <= z[1]]))
+                i, start, length = year_to_ranges[year]
+                self.assertEqual((start, start + length - 1), ranges[i])
+        self.assertEqual([(1920, 1934), (1950, 1964), (1965, 1979)],
+                         merge_years({1925: 5, 1950: 1, 1965: 1}, 5, (5, 15, 40),
+                                     optimal=True)[0])
+
+    def test_merge_years_returns_copies(self):
+        ranges, year_to_ranges = merge_years(self.YEAR_COUNTS, 10)
+        ranges.clear()
+        year_to_ranges.clear()
+        ranges, year_to_ranges = merge_years(dict(self.YEAR_COUNTS), 10)
+        self.assertTrue(ranges)
+        self.assertTrue(year_to_ranges)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 from collections import namedtuple
+from datetime import date
 
 import unittest
 from .. import tsundoku
@@ -53,6 +54,97 @@ class TestTsundokuSquashCalculation(unittest.TestCase):
         self.assertEquals([5, 4], tsundoku._squash_calculation(9, 5))
 
 
+class TestTsundokuCalculateLayout(unittest.TestCase):
+
+    def test_calculate_layout(self):
+        layout = tsundoku.calculate_layout({'a': 9, 'b': 2, 'c': 4}, max_height=5)
+        self.assertEqual([tsundoku.Count('a', 5), tsundoku.Count('a', 4),
+                          tsundoku.Count('c', 4), tsundoku.Count('b', 2)],
+                         layout.counts)
+        self.assertEqual(tsundoku.calculate_x_positions(layout.counts),
+                         list(layout.x_positions))
+        self.assertEqual(tsundoku.Aggregates(5, 4, 15), layout.aggregates)
+
+    def test_calculate_layout_empty(self):
+        layout = tsundoku.calculate_layout({})
+        self.assertEqual(tsundoku.Aggregates(0, 0, 0), layout.aggregates)
+
+    def test_layouts_are_cached(self):
+        class MockBook(namedtuple('MockBook', 'book_id, key, is_read')):
+            def property_as_hashable(self, property_name):
+                return self.key
+        t = tsundoku.Tsundoku(MockColourConfig())
+        t.process([MockBook(1, ('x',), False), MockBook(2, ('x',), False),
+                   MockBook(3, ('y',), True)])
+        t.postprocess(max_height=1)
+        self.assertEqual(tsundoku.Aggregates(1, 2, 2), t.unread_aggregates)
+        first_layout = t.unread_layout
+        t.postprocess(max_height=2)
+        self.assertEqual(tsundoku.Aggregates(2, 1, 2), t.unread_aggregates)
+        t.postprocess(max_height=1)
+        self.assertIs(first_layout, t.unread_layout)
+
+
+class MockBookWithDates(namedtuple('MockBookWithDates',
+                                   'book_id, key, date_added, date_read, is_read')):
+    def property_as_hashable(self, property_name):
+        return self.key
+
+    @property
+    def is_unread(self):
+        return not self.is_read
+
+
+class MockColourConfig(object):
+    def get_colour_bits(self, key):
+        return key
+
+
+class TestTsundokuProcessOverTime(unittest.TestCase):
+    BOOKS = [
+        MockBookWithDates(1, ('x',), date(2020, 1, 5), date(2020, 3, 1), True),
+        MockBookWithDates(2, ('x',), date(2020, 1, 20), None, False),
+        MockBookWithDates(3, ('y',), date(2020, 2, 2), date(2019, 12, 25), True),
+        MockBookWithDates(4, ('y',), date(2020, 3, 15), None, True), # No read date
+        MockBookWithDates(5, ('z',), None, None, False), # No add date
+        MockBookWithDates(6, ('z',), date(2020, 5, 1), None, False) # After the end
+    ]
+
+    def shelf_ids(self, shelves):
+        return dict((k, sorted(bk.book_id for bk in v)) for k, v in shelves.items())
+
+    def test_process_over_time(self):
+        t = tsundoku.Tsundoku(MockColourConfig())
+        frames = []
+        for frame_date in t.process_over_time(self.BOOKS, date(2020, 1, 1),
+                                              date(2020, 3, 20)):
+            frames.append((frame_date, self.shelf_ids(t.unread_shelves),
+                           self.shelf_ids(t.read_shelves)))
+        self.assertEqual([
+            (date(2020, 1, 31), {('x',): [1, 2]}, {}),
+            (date(2020, 2, 29), {('x',): [1, 2]}, {('y',): [3]}),
+            (date(2020, 3, 20), {('x',): [2]}, {('x',): [1], ('y',): [3, 4]})
+        ], frames)
+
+    def test_previous_processing_is_discarded(self):
+        t = tsundoku.Tsundoku(MockColourConfig())
+        t.process(self.BOOKS)
+        for frame_date in t.process_over_time(self.BOOKS, date(2020, 1, 1),
+                                              date(2020, 1, 31)):
+            pass
+        self.assertEqual({('x',): [1, 2]}, self.shelf_ids(t.unread_shelves))
+        self.assertEqual({}, self.shelf_ids(t.read_shelves))
+
+    def test_empty_piles_are_removed(self):
+        t = tsundoku.Tsundoku(MockColourConfig())
+        for frame_date in t.process_over_time(self.BOOKS[:1], date(2020, 1, 1),
+                                              date(2020, 3, 31)):
+            pass
+        self.assertEqual({}, dict(t.unread_shelves))
+        t.postprocess()
+        self.assertEqual(tsundoku.Aggregates(0, 0, 0), t.unread_aggregates)
+
+
 if __name__ == '__main__':
     unittest.main()
 
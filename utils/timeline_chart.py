@@ -36,9 +36,10 @@ class TimelineChart(object):
                                                    percentage)
         return self
 
-    def render(self, output_function=print, colour_function=generic_colour_function):
+    def render(self, output_function=print, colour_function=generic_colour_function,
+               stream=None, canvas_class=ColoramaCanvas):
         # self._render_stats(output_function)
-        self._render_canvas(output_function, colour_function)
+        self._render_canvas(output_function, colour_function, stream, canvas_class)
 
     def _render_stats(self, output_function):
         """
@@ -52,7 +53,8 @@ class TimelineChart(object):
                                                  stat.number_of_books_added,
                                                  stat.percentage_read))
 
-    def _render_canvas(self, output_function, colour_function):
+    def _render_canvas(self, output_function, colour_function, stream=None,
+                       canvas_class=ColoramaCanvas):
         # Note we skip first month - TODO: make this switchable
         # TODO2: do this more elegantly
         padded_months = list(pad_month_list_as_tuples(self.month2books.keys()))[1:]
@@ -61,9 +63,10 @@ class TimelineChart(object):
 
         width = len(padded_months)
         height = max([len(z) for z in self.month2books.values()]) + 4
-        cc = ColoramaCanvas(width + 5, # Extra bit added to account for year
-                            height,
-                            output_function=output_function)
+        cc = canvas_class(width + 5, # Extra bit added to account for year
+                          height,
+                          output_function=output_function,
+                          stream=stream)
 
         prev_y = None
         for i, (y, m) in enumerate(padded_months):
@@ -9,11 +9,15 @@ from __future__ import division
 from collections import defaultdict, namedtuple
 from datetime import date
 from functools import cmp_to_key
+import heapq
 import logging
 import math
 
+from utils.as_of import AsOfIndex
 from utils.display import render_ratings_as_bar
+from utils.group_by import GroupBy
 from utils.helpers import generate_enumeration_prefix_format
+from utils.output_sink import is_structured_output
 
 # TODO (maybe): ReadVsUnreadStats() and best_ranked_report() have different
 #               defaults for ignore_single_book_groups - this could be
@@ -56,6 +60,34 @@ class ReadVsUnreadReport(object):
                     else:
                         self.read_count[key] += 1
 
+    @classmethod
+    def for_dates(cls, books, key_attribute, dates, ignore_single_book_groups=True,
+                  ignore_undefined_book_groups=True):
+        """
+        Generator of (date, report) for each of dates, as if the books had
+        been read with each date as the as-of date (-d), but with the books
+        only grouped once.  books should have been read without an as-of
+        date, and key_attribute shouldn't depend on it e.g. use user_shelves
+        rather than shelves.
+        """
+        key_to_books = defaultdict(list)
+        for book in books:
+            for key in book.property_as_sequence(key_attribute):
+                if key or not ignore_undefined_book_groups:
+                    key_to_books[key].append(book)
+        key_to_index = dict((k, AsOfIndex(v)) for k, v in key_to_books.items())
+
+        for dt in dates:
+            report = cls([], key_attribute, ignore_single_book_groups,
+                         ignore_undefined_book_groups)
+            for key, index in key_to_index.items():
+                counts = index.counts_at(dt)
+                if counts.owned:
+                    report.grouping_count[key] = counts.owned
+                    report.unread_count[key] = counts.unread
+                    report.read_count[key] = counts.owned - counts.unread
+            yield dt, report
+
     def process(self):
         self.stats = []
         for key in self.grouping_count:
@@ -71,8 +103,20 @@ class ReadVsUnreadReport(object):
                 logging.warning('%s has %d read, %d unread' % (key, rd, ur))
         return self # For method chaining
 
+    def records(self):
+        """Return the stats in the order they are rendered"""
+        return sorted(self.stats, key=cmp_to_key(compare_rvustat))
+
     def render(self, output_function=print):
-        for stat in sorted(self.stats, key=cmp_to_key(compare_rvustat)):
+        """
+        If output_function is a structured output sink, the stats are output,
+        rather than the text that is derived from them
+        """
+        if is_structured_output(output_function):
+            for stat in self.records():
+                output_function(stat)
+            return
+        for stat in self.records():
             diff = stat.read_count - stat.unread_count
             output_function('%-30s : %5d%% %+4d %4d' %
                             (str(stat.key)[:30],
@@ -82,6 +126,30 @@ class ReadVsUnreadReport(object):
 
 
 
+def read_vs_unread_report(books, key_attribute, as_of_dates=None,
+                          output_function=print, **kwargs):
+    """
+    Render a ReadVsUnreadReport, or if as_of_dates are specified, one for each
+    of those dates (in which case books should have been read without an
+    as-of date).  kwargs are passed to the ReadVsUnreadReport constructor.
+    """
+    if as_of_dates:
+        for i, (dt, report) in enumerate(ReadVsUnreadReport.for_dates(
+                books, key_attribute, as_of_dates, **kwargs)):
+            report.process()
+            if is_structured_output(output_function):
+                for stat in report.records():
+                    output_function(dict(as_of_date=dt, **stat._asdict()))
+                continue
+            if i > 0:
+                output_function('')
+            output_function('== As of %s ==' % (dt))
+            report.render(output_function)
+    else:
+        ReadVsUnreadReport(books, key_attribute,
+                           **kwargs).process().render(output_function)
+
+
 BestRankedStat = namedtuple('BestRankedStat',
                             'key, average_rating, number_of_books_rated, number_of_pages')
 def compare_brstat(a, b):
@@ -98,25 +166,27 @@ class BestRankedReport(object):
                        ignore_undefined_book_groups=True):
         self.ignore_single_book_groups = ignore_single_book_groups
 
-        self.rated_count = defaultdict(int)
-        self.cumulative_rating = defaultdict(int)
-        self.page_count = defaultdict(int)
-        # TODO (maybe): could/should this be a namedtuple or class?
-        self.rating_groupings = defaultdict(lambda: [None, 0,0,0,0,0])
-
+        # Unrated (e.g. DNFed) books are ignored, and the rating
+        # distribution of each group is needed for the bars
+        grouped = GroupBy(lambda book: book.property_as_sequence(key_attribute),
+                          ['rating', 'pagination'], multi_valued=True,
+                          ignore_undefined_keys=ignore_undefined_book_groups,
+                          distributions=['rating'])
         for book in books:
-            br = book.rating
-            if br:
-                for key in book.property_as_sequence(key_attribute):
-                    if key or not ignore_undefined_book_groups:
-                        self.rated_count[key] += 1
-                        self.cumulative_rating[key] += br
-                        self.rating_groupings[key][br] += 1
-                        try:
-                            self.page_count[key] += book.pagination
-                        except TypeError as err:
-                            logging.error('No pagination defined for %s' %
-                                            (book.title))
+            if book.rating:
+                if book.pagination is None:
+                    logging.error('No pagination defined for %s' % (book.title))
+                grouped.add(book)
+
+        ratings = grouped.accumulators('rating')
+        pages = grouped.accumulators('pagination')
+        self.rated_count = dict((k, v.count) for k, v in ratings.items())
+        self.cumulative_rating = dict((k, v.sum) for k, v in ratings.items())
+        self.page_count = dict((k, v.sum) for k, v in pages.items())
+        # TODO (maybe): could/should this be a namedtuple or class?
+        self.rating_groupings = dict(
+            (k, [None] + [v.value_counts[z] for z in range(1, 6)])
+            for k, v in ratings.items())
 
     def process(self):
         # TODO (maybe): Should ignore_single_book_groups be an argument here,
@@ -136,6 +206,9 @@ class BestRankedReport(object):
         a rank number rather than a simple increment.  However they are
         conceptually similar enough that I think it's simpler to use the same
         name across all reports, especially from the end user UX point-of-view.
+
+        If output_function is a structured output sink, the stats are output,
+        in the same order, rather than the text that is derived from them.
         """
         biggest_first = False
         if sort_metric[0] in ('-', '~', '!'):
@@ -147,12 +220,18 @@ class BestRankedReport(object):
         else:
             # Sort by name order
             sorting_key = lambda z: getattr(z, sort_metric)
+        sorted_stats = sorted(self.stats, key=sorting_key, reverse=biggest_first)
+
+        if is_structured_output(output_function):
+            for stat in sorted_stats:
+                output_function(stat)
+            return
 
         prefix = ''
         rank_number = 1
         prev_rank_value = None
         prefix_format = generate_enumeration_prefix_format(self.stats)
-        for i, stat in enumerate(sorted(self.stats, key=sorting_key, reverse=biggest_first)):
+        for i, stat in enumerate(sorted_stats):
             # Standard deviation would be good too, to gauge (un)reliability
             if output_bars:
                 bars = ' ' + render_ratings_as_bar(self.rating_groupings[stat.key])
@@ -211,10 +290,49 @@ def last_read_detail_comparator(a, b):
     else:
         return b.days_ago - a.days_ago
 
+# Per-key running totals for LastReadReport - the most recently read book's
+# date and title (None if no dated reads so far), and the number unread
+LastReadAccumulator = namedtuple('LastReadAccumulator',
+                                 'date_read, title, num_unread')
+EMPTY_LAST_READ_ACCUMULATOR = LastReadAccumulator(None, None, 0)
+
 class LastReadReport(object):
 
     def __init__(self, books, key):
-        self.key2books = get_keys_to_books_dict(books, key)
+        """
+        The books are consumed in a single pass, only keeping the running
+        totals for each key, rather than the books themselves
+        """
+        self.accumulators = {}
+        for book in books:
+            # set() as a book should only count once per key, as it did when
+            # this was built on get_keys_to_books_dict()
+            for k in set(book.property_as_sequence(key)):
+                if k: # Ignore undefined groups
+                    self._accumulate(k, book)
+
+    def _accumulate(self, key, book):
+        acc = self.accumulators.get(key, EMPTY_LAST_READ_ACCUMULATOR)
+        if book.is_read and book.date_read is not None and \
+           (acc.date_read is None or book.date_read > acc.date_read):
+            acc = acc._replace(date_read=book.date_read, title=book.title)
+        if book.is_unread:
+            acc = acc._replace(num_unread=acc.num_unread + 1)
+        self.accumulators[key] = acc
+
+    def _set_key2books(self, key_to_books):
+        """
+        Replace the running totals with ones for a dict mapping keys to
+        iterables of books, as get_keys_to_books_dict() returns
+        """
+        self.accumulators = {}
+        for key, books in key_to_books.items():
+            self.accumulators[key] = EMPTY_LAST_READ_ACCUMULATOR
+            for book in books:
+                self._accumulate(key, book)
+
+    # Write-only, as the books themselves aren't retained
+    key2books = property(fset=_set_key2books)
 
     def process(self, as_of_date=None):
         if as_of_date is None:
@@ -222,26 +340,32 @@ class LastReadReport(object):
 
         self.data = []
 
-        for key, books in self.key2books.items():
-            read_books = [z for z in books if z.is_read and z.date_read is not None]
-            try:
-                most_recently_read_book = max(read_books, key=lambda z: z.date_read)
-                most_recent_title = most_recently_read_book.title
+        for key, acc in self.accumulators.items():
+            if acc.date_read is not None:
+                most_recent_title = acc.title
                 if len(most_recent_title) > 35:
                     most_recent_title = most_recent_title[:32] + '...'
-                days_ago = (as_of_date - most_recently_read_book.date_read).days
-            except ValueError:
+                days_ago = (as_of_date - acc.date_read).days
+            else:
                 # Presumably no books read
                 most_recent_title = 'N/A'
                 days_ago = 0 # Ugly, but avoids breaking the print formatting below
 
-            unread_books = [z for z in books if z.is_unread]
-            self.data.append(LastReadDetail(key, days_ago, most_recent_title, len(unread_books)))
+            self.data.append(LastReadDetail(key, days_ago, most_recent_title,
+                                            acc.num_unread))
         return self
 
+    def records(self):
+        """Return the details in the order they are rendered"""
+        return sorted(self.data, key=cmp_to_key(last_read_detail_comparator))
+
     def render(self, output_function=print):
+        if is_structured_output(output_function):
+            for details in self.records():
+                output_function(details)
+            return
         prev_title = prev_days = None
-        for details in sorted(self.data, key=cmp_to_key(last_read_detail_comparator)):
+        for details in self.records():
             prefix = '%s (%d unread)' % (details.key, details.num_unread)
             if prev_title == details.title and prev_days == details.days_ago:
                 output_function('%-40s:     "' % (prefix))
@@ -255,67 +379,95 @@ class LastReadReport(object):
             prev_title = details.title
             prev_days = details.days_ago
 
-def percentages_report(books, key_attribute, output_function=print):
-    data = get_keys_to_books_dict(books, key_attribute)
-    all_books = set()
-    stats = []
-    max_qty = 0
-    for key, books in data.items():
-        num_books = len(books)
-        stats.append((key, num_books))
-        all_books.update(books)
-        if num_books > max_qty:
-            max_qty = num_books
-    total_books = len(all_books)
-    max_key_length = max([len(str(z)) for z in data.keys()])
-    max_qty_length = math.ceil(math.log(max_qty, 10)) + 1
+PercentageStat = namedtuple('PercentageStat', 'key, count, percentage')
+
+def count_books_by_key(books, key_attribute, ignore_undefined_book_groups=True):
+    """
+    Return a tuple of (dict mapping keys to number of books, total number of
+    books with at least one key) from a single pass over books.  Books with
+    the same book_id (e.g. in merged exports) are only counted once.
+    """
+    key_counts = defaultdict(int)
+    seen_ids = set()
+    total_books = 0
+    for book in books:
+        book_id = getattr(book, 'book_id', None)
+        if book_id is not None:
+            if book_id in seen_ids:
+                continue
+            seen_ids.add(book_id)
+        # dict.fromkeys() as a book should only count once per key, but the
+        # order the keys were first seen in determines the order of ties
+        keys = [z for z in dict.fromkeys(book.property_as_sequence(key_attribute))
+                if z or not ignore_undefined_book_groups]
+        for key in keys:
+            key_counts[key] += 1
+        if keys:
+            total_books += 1
+    return key_counts, total_books
+
+
+def percentages_report(books, key_attribute, output_function=print, limit=None):
+    """
+    Output the number and percentage of books for each key, most common
+    first, optionally limited to the top N keys
+    """
+    key_counts, total_books = count_books_by_key(books, key_attribute)
+    if limit:
+        stats = heapq.nlargest(limit, key_counts.items(), key=lambda z: z[1])
+    else:
+        stats = sorted(key_counts.items(), key=lambda z: -z[1])
+
+    if is_structured_output(output_function):
+        for key, qty in stats:
+            output_function(PercentageStat(key, qty, 100 * (qty/total_books)))
+        return
+    if not stats:
+        return
+
+    max_key_length = max([len(str(z[0])) for z in stats])
+    max_qty_length = math.ceil(math.log(stats[0][1], 10)) + 1
 
     fmt = '%%-%ds : %%%dd (%%d%%%%)' % (max_key_length, max_qty_length)
-    for key, qty in sorted(stats, key=lambda z: -z[1]):
+    for key, qty in stats:
         output_function(fmt % (key, qty, 100 * (qty/total_books)))
 
 
-def calculate_average_metric(books, keys_func, metric,
+AverageMetricStat = namedtuple('AverageMetricStat', 'key, average, count')
+
+def calculate_grouped_metric(books, keys_func, metric, aggregate='mean',
                              include_missing_pagination=True):
     """
-    Calculate the average value of a particular metric (currently either
-    pagination or rating), grouped by a particular key/dimension.
+    Calculate an aggregate (one of group_by.AGGREGATES e.g. mean, median,
+    stddev) of a particular metric (e.g. pagination, rating,
+    days_on_tbr_pile), grouped by a particular key/dimension.
     * keys_func is either the name of a property to group by, or a function
       that takes a Book object as an argument and returns some value derived
       from it.  Note that these can either be scalar values or iterables,
       in the latter case all values in the iterable will be incremented
       accordingly (e.g. a list of shelves a book is on)
+    * Books with no value for the metric are counted with a value of zero
+      under a separate "bad/missing" key, if include_missing_pagination is
+      set, otherwise they are ignored.
+    Returns a list of AverageMetricStat (key, value, count) tuples.
     """
     ROGUE_KEY = '*Bad/missing %s*' % (metric)
 
-    book_count = defaultdict(int)
-    metric_count = defaultdict(int)
+    distributions = [metric] if aggregate == 'median' else []
+    grouped = GroupBy(keys_func, [metric], distributions=distributions,
+                      missing_value_key=ROGUE_KEY if include_missing_pagination else None)
+    grouped.add_all(books)
+    return [AverageMetricStat(k, acc.aggregate(aggregate), acc.count)
+            for k, acc in grouped.accumulators().items()]
 
-    for book in books:
-        val = getattr(book, metric)
-
-        # TODO: I think this keys related code can be simplied using the
-        # Book.property_as_*() methods?
-        try:
-            # Try keys_func as a property of a book object
-            keys = getattr(book, keys_func)
-        except TypeError:
-            # Otherwise assume it's a function
-            keys = keys_func(book)
-        if val is not None: # Ignore books with no/undefined value
-            try:
-                book_count[keys] += 1
-                metric_count[keys] += val
-            except TypeError:
-                # Assume a list (or iterable) of keys
-                for subkey in keys:
-                    book_count[subkey] += 1
-                    metric_count[subkey] += val
-        elif include_missing_pagination:
-            book_count[ROGUE_KEY] += 1
-            metric_count[ROGUE_KEY] += 0
-    avgs = []
-    for k, numerator in metric_count.items():
-        avgs.append((k,  numerator / book_count[k], book_count[k]))
-
-    return avgs
+
+def calculate_average_metric(books, keys_func, metric,
+                             include_missing_pagination=True):
+    """
+    Calculate the average value of a particular metric (currently either
+    pagination or rating), grouped by a particular key/dimension - see
+    calculate_grouped_metric() for details.
+    Returns a list of AverageMetricStat (key, average, count) tuples.
+    """
+    return calculate_grouped_metric(books, keys_func, metric, 'mean',
+                                    include_missing_pagination)
@@ -6,17 +6,61 @@ and/or your read books
 
 from __future__ import division
 
+from array import array
 from collections import defaultdict, namedtuple
 import pdb
 import sys
 
 from utils.arguments import parse_args
+from utils.as_of import AsOfIndex, BookAsOf
 from utils.colorama_canvas import ColoramaCanvas, Fore, Back, Style
+from utils.date_related import month_end_dates
 
 GROUP_BY_COLOURS = True
 
 Count = namedtuple('Count', 'key, count')
 Aggregates = namedtuple('Aggregates', 'max_count, num_columns, total')
+# counts is a list of Counts, x_positions an array of the column for each
+TsundokuLayout = namedtuple('TsundokuLayout', 'counts, x_positions, aggregates')
+
+
+class _MountainPositioner(object):
+    """
+    Allocates x positions one column at a time, for calculate_x_positions()
+    and calculate_layout().  The positions returned by next_position() are
+    relative to the first column, and may be negative; finalize() converts
+    them to start at 0 (plus an optional offset).
+    """
+
+    def __init__(self):
+        self.right = 1
+        self.left = 0
+        self.currently_going_right = False
+        self.prev_key = None
+        # The on_first_key related code is a cosmetic thing to ensure any
+        # 'peak' in the highest columns is roughly in the centre, rather than
+        # on an edge.
+        self.on_first_key = True
+
+    def next_position(self, k):
+        if k == self.prev_key:
+            if self.on_first_key:
+                self.currently_going_right = not self.currently_going_right
+        else:
+            if self.prev_key:
+                self.on_first_key = False
+            self.currently_going_right = not self.currently_going_right
+        self.prev_key = k
+        if self.currently_going_right:
+            self.right += 1
+            return self.right - 1
+        else:
+            self.left -= 1
+            return self.left + 1
+
+    def finalize(self, positions, offset=0):
+        adjustment = offset - self.left - 1
+        return array('l', [z + adjustment for z in positions])
 
 
 def calculate_x_positions(count_data, offset=0):
@@ -33,37 +77,9 @@ def calculate_x_positions(count_data, offset=0):
     [4, 3, 5]
 
     """
-    right = 1
-    left = 0
-    currently_going_right = False
-    prev_key = None
-
-    temp_positions = []
-    # The on_first_key related code is a cosmetic thing to ensure any 'peak'
-    # in the highest columns is roughly in the centre, rather than on an edge.
-    on_first_key = True
-    for k, _  in count_data:
-        if k == prev_key:
-            if on_first_key:
-                currently_going_right = not currently_going_right
-            if currently_going_right:
-                temp_positions.append(right)
-                right += 1
-            else:
-                temp_positions.append(left)
-                left -= 1
-        else:
-            if prev_key:
-                on_first_key = False
-            currently_going_right = not currently_going_right
-            if currently_going_right:
-                temp_positions.append(right)
-                right += 1
-            else:
-                temp_positions.append(left)
-                left -= 1
-        prev_key = k
-    return [z - left -1 + offset for z in temp_positions]
+    positioner = _MountainPositioner()
+    temp_positions = [positioner.next_position(k) for k, _ in count_data]
+    return list(positioner.finalize(temp_positions, offset))
 
 
 def _squash_calculation(number, target):
@@ -97,6 +113,48 @@ def _squash_calculation(number, target):
             vals[i] += 1
         return vals
 
+def _default_max_height(counts):
+    """
+    Return a - hopefully - reasonable value for squash()'s max_height, given
+    a list of the unsquashed counts
+    """
+    # This seems to be a reasonable heuristic using the test data I
+    # currently have.
+    if len(counts) < 10:
+        return int(sum(counts) / len(counts))
+    else:
+        return int(2 * sum(counts) / len(counts))
+
+
+def calculate_layout(key_to_count_dict, max_height=None):
+    """
+    Given a dict of keys->number of books, return a TsundokuLayout, with the
+    squashed counts (see squash()), their x positions (see
+    calculate_x_positions(), without any offset) and aggregates for them,
+    all worked out in a single pass.
+    """
+    if not key_to_count_dict:
+        return TsundokuLayout([], array('l'), Aggregates(0, 0, 0))
+    if max_height is None:
+        max_height = _default_max_height(list(key_to_count_dict.values()))
+
+    sorted_counts = sorted(key_to_count_dict.items(), key=lambda z: -z[1])
+    squashed_counts = []
+    positioner = _MountainPositioner()
+    temp_positions = []
+    max_count = 0
+    total = 0
+    for k, count in sorted_counts:
+        total += count
+        for v in _squash_calculation(count, max_height):
+            squashed_counts.append(Count(k, v))
+            temp_positions.append(positioner.next_position(k))
+            if v > max_count:
+                max_count = v
+    return TsundokuLayout(squashed_counts, positioner.finalize(temp_positions),
+                          Aggregates(max_count, len(squashed_counts), total))
+
+
 def squash(key_to_books_dict, max_height=None):
     """
     Given a dict of keys->set(Book), split up the larger ones so that no value
@@ -110,23 +168,8 @@ def squash(key_to_books_dict, max_height=None):
                      could render the individual book covers, have tooltips etc
                      for web rendering or similar.
     """
-    counts = [Count(k, len(v)) for k, v in key_to_books_dict.items()]
-
-    if max_height is None:
-        num_counts = len(counts)
-        # This seems to be a reasonable heuristic using the test data I
-        # currently have.
-        if num_counts < 10:
-            max_height = int(sum([z[1] for z in counts]) / len(counts))
-        else:
-            max_height = int(2 * sum([z[1] for z in counts]) / len(counts))
-
-    sorted_counts = sorted(counts, key=lambda z: -z.count)
-    squashed_counts = []
-    for c in sorted_counts:
-        for v in _squash_calculation(c.count, max_height):
-            squashed_counts.append(Count(c.key, v))
-    return squashed_counts
+    return calculate_layout(dict((k, len(v)) for k, v in key_to_books_dict.items()),
+                            max_height).counts
 
 
 
@@ -137,32 +180,88 @@ class Tsundoku(object):
 
         self.unread_shelves = defaultdict(set)
         self.read_shelves = defaultdict(set)
+        # (max_height, whether read) => TsundokuLayout
+        self._layouts = {}
+
+    def _composite_key(self, bk):
+        # composite_key = tuple(sorted(bk.user_shelves))
+        # composite_key = (bk.decade,)
+        composite_key = bk.property_as_hashable(self.group_by)
+        if GROUP_BY_COLOURS:
+            composite_key = self.col_cfg.get_colour_bits(composite_key)
+        return composite_key
 
     def process(self, books):
+        self._layouts = {}
         for bk in books:
-            # composite_key = tuple(sorted(bk.user_shelves))
-            # composite_key = (bk.decade,)
-            composite_key = bk.property_as_hashable(self.group_by)
-            if GROUP_BY_COLOURS:
-                composite_key = self.col_cfg.get_colour_bits(composite_key)
+            composite_key = self._composite_key(bk)
             if bk.is_read:
                 self.read_shelves[composite_key].add(bk)
             else:
                 self.unread_shelves[composite_key].add(bk)
 
+    def process_over_time(self, books, start_date, end_date):
+        """
+        Generator that yields the date of the end of every month from
+        start_date to end_date (and then end_date itself), having updated
+        this object to the state of the tsundoku at that date, i.e. the same
+        as if process() had been called with books read with that as-of date
+        (-d).  postprocess() and render() can then be called as usual, before
+        moving on to the next date.  Anything from previous process*() calls
+        is discarded.
+
+        Rather than re-processing every book for every date, the books that
+        were added or read since the previous date are taken from an
+        AsOfIndex.  books should have been read without an as-of date.
+        """
+        self.unread_shelves = defaultdict(set)
+        self.read_shelves = defaultdict(set)
+        composite_keys = {}
+        index = AsOfIndex(books)
+        for frame_date, added, newly_read in index.changes(
+                month_end_dates(start_date, end_date)):
+            for bk in added:
+                composite_keys[id(bk)] = key = self._composite_key(bk)
+                if BookAsOf(bk, frame_date).is_read:
+                    self.read_shelves[key].add(bk)
+                else:
+                    self.unread_shelves[key].add(bk)
+            for bk in newly_read:
+                # Move from the unread to the read pile, if not already there
+                key = composite_keys[id(bk)]
+                unread = self.unread_shelves.get(key)
+                if unread is not None:
+                    unread.discard(bk)
+                    if not unread:
+                        del self.unread_shelves[key]
+                self.read_shelves[key].add(bk)
+            self._layouts = {}
+            yield frame_date
+
+    def _layout(self, shelves, is_read, max_height):
+        """
+        Return the (cached) TsundokuLayout for shelves i.e. either
+        self.read_shelves or self.unread_shelves
+        """
+        try:
+            return self._layouts[(max_height, is_read)]
+        except KeyError:
+            layout = calculate_layout(dict((k, len(v)) for k, v in shelves.items()),
+                                      max_height)
+            self._layouts[(max_height, is_read)] = layout
+            return layout
+
     def postprocess(self, max_height=None):
-        self.unread_counts = squash(self.unread_shelves, max_height=max_height)
-        self.read_counts = squash(self.read_shelves, max_height=max_height)
-        self.unread_aggregates = Aggregates(
-            max([z.count for z in self.unread_counts]),
-            len(self.unread_counts),
-            sum([z.count for z in self.unread_counts]),
-        )
-        self.read_aggregates = Aggregates(
-            max([z.count for z in self.read_counts]),
-            len(self.read_counts),
-            sum([z.count for z in self.read_counts])
-        )
+        """
+        This can be called again with a different max_height without
+        reprocessing the books; layouts for previously used values are cached.
+        """
+        self.unread_layout = self._layout(self.unread_shelves, False, max_height)
+        self.read_layout = self._layout(self.read_shelves, True, max_height)
+        self.unread_counts = self.unread_layout.counts
+        self.read_counts = self.read_layout.counts
+        self.unread_aggregates = self.unread_layout.aggregates
+        self.read_aggregates = self.read_layout.aggregates
 
     def _render_ground_line(self, offset_for_y_axis_label,
                             ground_level, width,
@@ -183,7 +282,12 @@ class Tsundoku(object):
         self.cc.print_at(width - len(r_str), ground_level, r_str)
 
 
-    def render(self):
+    def render(self, canvas_class=ColoramaCanvas, caption=None):
+        """
+        canvas_class can be any ColoramaCanvas-compatible class, e.g. one of
+        those in utils.markup_canvas.  caption is only supported by the
+        latter.
+        """
         # This might be useful for debugging, so leaving commented out for now..
         OLD_CODE = """
         for label, data in [('Unread', self.unread_counts),
@@ -201,7 +305,8 @@ class Tsundoku(object):
         ground_level = self.unread_aggregates.max_count + 1 # This is like the x-axis of a graph
 
         # TODO: work out if/why we really need these extra bodge values
-        self.cc = ColoramaCanvas(width + 3, height + 1)
+        canvas_kwargs = {'caption': caption} if caption is not None else {}
+        self.cc = canvas_class(width + 3, height + 1, **canvas_kwargs)
 
         self._render_ground_line(offset_for_y_axis_label, ground_level, width,
                                  self.unread_aggregates.total,
@@ -218,13 +323,13 @@ class Tsundoku(object):
             read_x_offset = offset_for_symmetry + offset_for_y_axis_label
             unread_x_offset = offset_for_y_axis_label
 
-        x_positions = calculate_x_positions(self.unread_counts, unread_x_offset)
+        x_positions = [z + unread_x_offset for z in self.unread_layout.x_positions]
         self._render_half_mountain(self.unread_counts, x_positions, ground_level,
                                    offset_for_y_axis_label,
                                    max_count=self.unread_aggregates.max_count,
                                    going_up=True)
 
-        x_positions = calculate_x_positions(self.read_counts, read_x_offset)
+        x_positions = [z + read_x_offset for z in self.read_layout.x_positions]
         self._render_half_mountain(self.read_counts, x_positions, ground_level,
                                    offset_for_y_axis_label,
                                    max_count=self.read_aggregates.max_count,